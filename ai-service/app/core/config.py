@@ -4,9 +4,136 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
 class Settings(BaseModel):
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
+    GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
     PROJECT_NAME: str = "Agentic Contract ERP AI"
     VERSION: str = "0.1.0"
 
+    # Startup: "background" warms LLM/KB after the server is up, "blocking" before it accepts
+    # traffic, "off" leaves everything to the first request.
+    WARMUP_MODE: str = os.getenv("WARMUP_MODE", "background").lower()
+
+    # Contract analysis worker pool
+    ANALYSIS_MAX_CONCURRENCY: int = int(os.getenv("ANALYSIS_MAX_CONCURRENCY", "2"))
+    ANALYSIS_QUEUE_DEPTH: int = int(os.getenv("ANALYSIS_QUEUE_DEPTH", "16"))
+    ANALYSIS_JOB_TTL_SECONDS: int = int(os.getenv("ANALYSIS_JOB_TTL_SECONDS", "3600"))
+
+    # Extraction result cache (memory LRU + SQLite on disk; empty path disables the disk tier)
+    RESULT_CACHE_ENABLED: bool = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_MEMORY_ENTRIES: int = int(os.getenv("RESULT_CACHE_MEMORY_ENTRIES", "256"))
+    RESULT_CACHE_DISK_ENTRIES: int = int(os.getenv("RESULT_CACHE_DISK_ENTRIES", "5000"))
+    RESULT_CACHE_TTL_SECONDS: int = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    RESULT_CACHE_PATH: str = os.getenv("RESULT_CACHE_PATH", os.path.join(DATA_DIR, "cache", "contract_results.sqlite3"))
+
+    # PDF extraction (PDF_WORKERS=0 means one worker per CPU; PDF_MAX_*=0 disables that limit)
+    PDF_WORKERS: int = int(os.getenv("PDF_WORKERS", "0"))
+    PDF_PAGES_PER_TASK: int = int(os.getenv("PDF_PAGES_PER_TASK", "25"))
+    PDF_PARALLEL_MIN_PAGES: int = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+    PDF_MAX_PAGES: int = int(os.getenv("PDF_MAX_PAGES", "2000"))
+    PDF_MAX_BYTES: int = int(os.getenv("PDF_MAX_BYTES", str(100 * 1024 * 1024)))
+
+    # Knowledge base sync
+    KB_SYNC_BATCH_SIZE: int = int(os.getenv("KB_SYNC_BATCH_SIZE", "100"))
+
+    # Contract -> knowledge base retrieval (clause windows + MMR)
+    RETRIEVAL_WINDOW_CHARS: int = int(os.getenv("RETRIEVAL_WINDOW_CHARS", "1500"))
+    RETRIEVAL_MAX_WINDOWS: int = int(os.getenv("RETRIEVAL_MAX_WINDOWS", "32"))
+    RETRIEVAL_RESULTS_PER_WINDOW: int = int(os.getenv("RETRIEVAL_RESULTS_PER_WINDOW", "4"))
+    RETRIEVAL_MAX_RESULTS: int = int(os.getenv("RETRIEVAL_MAX_RESULTS", "8"))
+    RETRIEVAL_CONTEXT_TOKENS: int = int(os.getenv("RETRIEVAL_CONTEXT_TOKENS", "1500"))
+    RETRIEVAL_MMR_LAMBDA: float = float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.7"))
+
+    # Master-data index used to validate/correct ERP fields after extraction
+    MASTER_DATA_RELOAD_INTERVAL_SECONDS: float = float(os.getenv("MASTER_DATA_RELOAD_INTERVAL_SECONDS", "5"))
+    MASTER_DATA_MIN_MATCH_SCORE: float = float(os.getenv("MASTER_DATA_MIN_MATCH_SCORE", "0.6"))
+
+    # Prompt-size reduction before the LLM (repeated headers/footers, hyphenation, duplicate clauses)
+    PREPROCESS_ENABLED: bool = os.getenv("PREPROCESS_ENABLED", "true").lower() == "true"
+    PREPROCESS_EDGE_LINES: int = int(os.getenv("PREPROCESS_EDGE_LINES", "3"))
+    PREPROCESS_MIN_REPEAT_PAGES: int = int(os.getenv("PREPROCESS_MIN_REPEAT_PAGES", "3"))
+    PREPROCESS_REPEAT_RATIO: float = float(os.getenv("PREPROCESS_REPEAT_RATIO", "0.5"))
+    PREPROCESS_MIN_DUPLICATE_CHARS: int = int(os.getenv("PREPROCESS_MIN_DUPLICATE_CHARS", "200"))
+
+    # Map-reduce extraction for contracts longer than MAP_REDUCE_THRESHOLD_CHARS
+    MAP_REDUCE_ENABLED: bool = os.getenv("MAP_REDUCE_ENABLED", "true").lower() == "true"
+    MAP_REDUCE_THRESHOLD_CHARS: int = int(os.getenv("MAP_REDUCE_THRESHOLD_CHARS", "60000"))
+    MAP_REDUCE_SECTION_CHARS: int = int(os.getenv("MAP_REDUCE_SECTION_CHARS", "20000"))
+    MAP_REDUCE_CONCURRENCY: int = int(os.getenv("MAP_REDUCE_CONCURRENCY", "4"))
+    MAP_REDUCE_AUDIT_CHARS: int = int(os.getenv("MAP_REDUCE_AUDIT_CHARS", "12000"))
+
+    # Bulk analysis (/analyze-contract/batch)
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", "4"))
+    BATCH_MAX_FILES: int = int(os.getenv("BATCH_MAX_FILES", "500"))
+
+    # Server-side contract store used by /check-milestone; empty keeps contracts in memory only
+    CONTRACT_STORE_DIR: str = os.getenv("CONTRACT_STORE_DIR", "")
+    # Max evidence items per /check-milestones request
+    MILESTONE_BATCH_MAX_ITEMS: int = int(os.getenv("MILESTONE_BATCH_MAX_ITEMS", "200"))
+    # Neon/PostgreSQL (postgresql://..., needs psycopg) or a local SQLite stand-in (sqlite:///path);
+    # empty disables writes to the contracts/milestones tables
+    DATABASE_URL: str = os.getenv("DATABASE_URL", "")
+    DATABASE_POOL_SIZE: int = int(os.getenv("DATABASE_POOL_SIZE", "4"))
+    # Write every analyzed contract to the database (otherwise only via POST /contracts/{id}/persist)
+    PERSIST_ANALYZED_CONTRACTS: bool = os.getenv("PERSIST_ANALYZED_CONTRACTS", "false").lower() == "true"
+    # Commits per contract whose JSON Patch is kept for diff-mode responses (known_version)
+    CONTRACT_HISTORY_VERSIONS: int = int(os.getenv("CONTRACT_HISTORY_VERSIONS", "50"))
+    # Amendments (POST /contracts/{id}/revisions): minimum description similarity for a
+    # re-extracted action to keep the id, status and evidence of the action it replaces
+    REVISION_MATCH_THRESHOLD: float = float(os.getenv("REVISION_MATCH_THRESHOLD", "0.6"))
+
+    # Evidence evaluator: local matcher first, Gemini only below this confidence
+    EVIDENCE_LLM_ENABLED: bool = os.getenv("EVIDENCE_LLM_ENABLED", "true").lower() == "true"
+    EVIDENCE_ESCALATION_THRESHOLD: float = float(os.getenv("EVIDENCE_ESCALATION_THRESHOLD", "0.6"))
+    EVIDENCE_LLM_CONCURRENCY: int = int(os.getenv("EVIDENCE_LLM_CONCURRENCY", "4"))
+    EVIDENCE_CACHE_ENTRIES: int = int(os.getenv("EVIDENCE_CACHE_ENTRIES", "4096"))
+    EVIDENCE_CACHE_TTL_SECONDS: int = int(os.getenv("EVIDENCE_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+    # Knowledge base serving: "chroma" (each process opens chroma_db) or "snapshot" (multi-worker:
+    # one builder under a file lock publishes versioned snapshots that every worker memory-maps)
+    KB_MODE: str = os.getenv("KB_MODE", "chroma").lower()
+    KB_SNAPSHOT_DIR: str = os.getenv("KB_SNAPSHOT_DIR", os.path.join(DATA_DIR, "kb_snapshots"))
+    KB_SNAPSHOT_POLL_SECONDS: float = float(os.getenv("KB_SNAPSHOT_POLL_SECONDS", "10"))
+    KB_SNAPSHOT_KEEP: int = int(os.getenv("KB_SNAPSHOT_KEEP", "3"))
+
+    # Embeddings: backend ("google" or "local" hashing embedder, no network) and the cache in front of it
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "google").lower()
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "models/text-embedding-004")
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "cache", "embeddings.sqlite3"))
+    EMBEDDING_CACHE_MEMORY_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "10000"))
+    LOCAL_EMBEDDING_DIMENSIONS: int = int(os.getenv("LOCAL_EMBEDDING_DIMENSIONS", "384"))
+
+    # LLM gateway: shared quota budget for every Gemini call (chat + embeddings)
+    LLM_RATE_PER_MINUTE: float = float(os.getenv("LLM_RATE_PER_MINUTE", "60"))
+    LLM_BURST: int = int(os.getenv("LLM_BURST", "10"))
+    LLM_MAX_IN_FLIGHT: int = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "4"))
+    LLM_BACKOFF_BASE_SECONDS: float = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+    LLM_BACKOFF_MAX_SECONDS: float = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+    LLM_CALL_DEADLINE_SECONDS: float = float(os.getenv("LLM_CALL_DEADLINE_SECONDS", "180"))
+    LLM_REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "120"))
+    EMBEDDING_RATE_PER_MINUTE: float = float(os.getenv("EMBEDDING_RATE_PER_MINUTE", "1500"))
+    EMBEDDING_MAX_IN_FLIGHT: int = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "8"))
+
+    # Debug traces (prompt/response/exception per request id), written off the request path
+    TRACE_ENABLED: bool = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+    TRACE_DIR: str = os.getenv("TRACE_DIR", os.path.join(DATA_DIR, "traces"))
+    TRACE_MAX_BYTES: int = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+    TRACE_BACKUPS: int = int(os.getenv("TRACE_BACKUPS", "3"))
+    TRACE_QUEUE_SIZE: int = int(os.getenv("TRACE_QUEUE_SIZE", "1000"))
+    TRACE_MAX_FIELD_CHARS: int = int(os.getenv("TRACE_MAX_FIELD_CHARS", "20000"))
+
+    # Response compression (brotli when the package is installed, else gzip) above this size
+    RESPONSE_COMPRESSION_MIN_BYTES: int = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1000"))
+    RESPONSE_GZIP_LEVEL: int = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+    RESPONSE_BROTLI_QUALITY: int = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+
+    # Admin endpoints (/admin/*) require the X-Admin-Token header when this is set
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+
 settings = Settings()
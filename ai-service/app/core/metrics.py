@@ -0,0 +1,312 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Minimal Prometheus text-format instrumentation (counters, gauges, histograms with labels).
+# Kept dependency-free: every metric is a dict of label values -> numbers behind one lock.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+COUNT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2000)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(self._values.values())
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}" for key, value in items]
+
+class Gauge(_Metric):
+    """
+    Settable gauge. `set_function` makes it read a live value at scrape time instead.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def value(self, **labels) -> float:
+        if self._function is not None:
+            return self._function()
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        if self._function is not None:
+            return self._function()
+        with self._lock:
+            return sum(self._values.values())
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                return [f"{self.name} {_format_number(self._function())}"]
+            except Exception:
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}" for key, value in items]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def summary(self, **labels) -> dict:
+        """
+        Count, mean and bucket-interpolated p50/p95 for one label set (used by /agent-status).
+        """
+        key = self._key(labels)
+        with self._lock:
+            counts = list(self._counts.get(key, []))
+            total_sum = self._sums.get(key, 0.0)
+        count = sum(counts)
+        if not count:
+            return {"count": 0, "avg": 0.0, "p50": 0.0, "p95": 0.0}
+        return {
+            "count": count,
+            "avg": round(total_sum / count, 4),
+            "p50": round(self._quantile(counts, count, 0.5), 4),
+            "p95": round(self._quantile(counts, count, 0.95), 4),
+        }
+
+    def _quantile(self, counts: List[int], count: int, q: float) -> float:
+        rank = q * count
+        seen = 0
+        for i, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        lines = []
+        for key, counts, total_sum in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = _format_number(bound) if bound != float("inf") else "+Inf"
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_number(total_sum)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# --- Application metrics --------------------------------------------------------
+
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being served.")
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ["method", "route", "status"]
+)
+UPLOAD_BYTES = registry.histogram("contract_upload_bytes", "Size of uploaded contract files.", buckets=SIZE_BUCKETS)
+DOCUMENT_PAGES = registry.histogram("contract_document_pages", "Pages per uploaded document.", buckets=COUNT_BUCKETS)
+STAGE_DURATION = registry.histogram(
+    "pipeline_stage_duration_seconds",
+    "Latency of each analysis stage (pdf_extraction, preprocess, kb_query, retrieval, llm_extraction, merge, validation, master_data, persist).",
+    ["stage"],
+)
+PROMPT_CHARS = registry.histogram(
+    "llm_prompt_chars", "Prompt size in characters (context + contract text).", ["mode"], buckets=SIZE_BUCKETS
+)
+PROMPT_TOKENS = registry.histogram(
+    "llm_prompt_tokens", "Estimated prompt size in tokens (chars/4).", ["mode"],
+    buckets=(1e3, 5e3, 1e4, 2.5e4, 5e4, 1e5, 2.5e5, 5e5, 1e6),
+)
+PREPROCESS_TOKENS_SAVED = registry.histogram(
+    "preprocess_tokens_saved", "Estimated input tokens removed per document by preprocessing.",
+    buckets=(100, 500, 1e3, 5e3, 1e4, 5e4, 1e5, 5e5),
+)
+PREPROCESS_SAVED_RATIO = registry.histogram(
+    "preprocess_saved_ratio", "Fraction of input tokens removed per document by preprocessing.",
+    buckets=(0.01, 0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.75),
+)
+LLM_CALL_DURATION = registry.histogram(
+    "llm_call_duration_seconds", "Upstream Gemini call latency per attempt.", ["gateway", "outcome"]
+)
+EXTRACTIONS = registry.counter("contract_extractions_total", "Contract extractions by outcome.", ["outcome"])
+MASTER_DATA_RESOLUTIONS = registry.counter(
+    "master_data_corrections_total", "ERP fields corrected from master data after extraction.", ["field", "method"]
+)
+EMBEDDING_LOOKUPS = registry.counter(
+    "embedding_cache_lookups_total", "Embedding cache lookups by result (memory, disk, miss).", ["result"]
+)
+EMBEDDING_BATCH_DURATION = registry.histogram(
+    "embedding_batch_duration_seconds", "Latency of one embedding backend call (cache misses only).", ["backend"]
+)
+GRAPH_NODE_DURATION = registry.histogram(
+    "graph_node_duration_seconds", "Milestone graph node latency.", ["node"]
+)
+ANALYSES_IN_FLIGHT = registry.gauge("analysis_jobs_in_flight", "Analysis jobs running or queued.")
+MILESTONE_CHECKS_IN_FLIGHT = registry.gauge("milestone_checks_in_flight", "Milestone graph runs in progress.")
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: in-flight gauge and latency per route template. Written at the ASGI level
+    so streamed responses (SSE, NDJSON) are timed until their last byte, not their headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start_time = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start_time,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status["code"],
+            )
@@ -0,0 +1,91 @@
+import re
+from typing import Any, Optional
+import brotli
+import orjson
+from pydantic import BaseModel
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder, IdentityResponder
+from fastapi.responses import JSONResponse
+
+# Response encoding: orjson serialization (pydantic models dumped without FastAPI's
+# jsonable_encoder pass) and negotiated brotli/gzip compression.
+
+ENCODING = re.compile(r"\s*([a-z*]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?", re.IGNORECASE)
+
+def _default(value: Any):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson. Returning it directly from an endpoint also skips
+    FastAPI's jsonable_encoder, which walks every field of a large contract in Python.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def accepted_encodings(header: Optional[str]) -> dict:
+    """
+    Accept-Encoding -> {encoding: q}, e.g. "br;q=1.0, gzip;q=0.8" -> {"br": 1.0, "gzip": 0.8}.
+    """
+    accepted = {}
+    for part in (header or "").split(","):
+        match = ENCODING.fullmatch(part.strip()) if part.strip() else None
+        if match is None:
+            continue
+        try:
+            accepted[match.group(1).lower()] = float(match.group(2)) if match.group(2) is not None else 1.0
+        except ValueError:
+            continue
+    return accepted
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size: int, quality: int = 4, **kwargs):
+        super().__init__(app, minimum_size, **kwargs)
+        self.quality = quality
+        self._compressor = None
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(quality=self.quality)
+        if more_body:
+            # Flush per chunk so NDJSON streams still arrive line by line
+            return self._compressor.process(body) + self._compressor.flush()
+        return self._compressor.process(body) + self._compressor.finish()
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Starlette's GZipMiddleware plus brotli, picked by the client's Accept-Encoding q-values.
+    SSE (text/event-stream) is never compressed, so progress events are not buffered.
+    """
+
+    def __init__(self, app, minimum_size: int = 1000, compresslevel: int = 6, brotli_quality: int = 4):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accepted = accepted_encodings(Headers(scope=scope).get("Accept-Encoding"))
+        wildcard = accepted.get("*", 0.0)
+        br_q = accepted.get("br", wildcard)
+        gzip_q = accepted.get("gzip", wildcard)
+        if br_q > 0 and br_q >= gzip_q:
+            responder = BrotliResponder(
+                self.app, self.minimum_size, quality=self.brotli_quality, exclude_content_types=self.exclude_content_types,
+            )
+        elif gzip_q > 0:
+            responder = GZipResponder(
+                self.app, self.minimum_size, compresslevel=self.compresslevel,
+                thread_minimum_size=self.thread_minimum_size, exclude_content_types=self.exclude_content_types,
+            )
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size, exclude_content_types=self.exclude_content_types)
+        await responder(scope, receive, send)
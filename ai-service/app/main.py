@@ -1,12 +1,58 @@
+import asyncio
+import functools
+import hmac
 import logging
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from app.models import ContractSchema, ActionItem, Phase
-from app.services.extractor import extract_contract_data
-from app.services.graph import app_graph
+import time
+from typing import List, Optional
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header
+from contextlib import asynccontextmanager
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from app.core.config import settings
+from app.core.responses import CompressionMiddleware, FastJSONResponse
+from app.core.metrics import (
+    EXTRACTIONS, HTTP_REQUESTS_IN_FLIGHT, LLM_CALL_DURATION, MILESTONE_CHECKS_IN_FLIGHT,
+    STAGE_DURATION, MetricsMiddleware, registry,
+)
+from app.models import ContractSchema, ActionItem, Phase, AnalysisJob, ProgressEvent, RevisionReport
+from app.services.graph import get_app_graph, get_batch_graph
+from app.services.batch import BatchItem, BatchTooLargeError, analyze_batch, check_batch_count, discard_items, expand_upload
+from app.services.cache import result_cache
+from app.services.contract_store import VersionConflict, contract_store
+from app.services.evidence_evaluator import evidence_evaluator
+from app.services.llm_gateway import embedding_gateway, llm_gateway
+from app.services.kb_snapshot import kb_snapshots
+from app.services.kb_sync import sync_knowledge_base
+from app.services.jobs import job_manager, JobQueueFull
+from app.services.pdf_extractor import DocumentTooLargeError, shutdown_pdf_pool
+from app.services.pipeline import analyze_spooled_document, revise_spooled_document, spool_upload, EmptyDocumentError
+from app.services.progress import format_sse, progress_subscriber, report_progress
+from app.services.embeddings import embedding_cache
+from app.services.master_data import master_data_index
+from app.services.portfolio import portfolio
+from app.services.persistence import PersistenceNotConfigured, contract_repository
+from app.services.revisions import RevisionConflict, UnknownContractError
+from app.services.tracing import RequestIdMiddleware, trace_sink
+from app.services.warmup import readiness, start_background_warmup, warm_up
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import shutil
 
-app = FastAPI(title="Agentic Contract ERP AI", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Heavy resources are never built at import time; WARMUP_MODE decides when they are.
+    if settings.WARMUP_MODE == "blocking":
+        await run_in_threadpool(warm_up)
+    elif settings.WARMUP_MODE == "background":
+        start_background_warmup()
+    yield
+    job_manager.shutdown()
+    shutdown_pdf_pool()
+    contract_repository.close()
+    trace_sink.flush()
+
+app = FastAPI(
+    title="Agentic Contract ERP AI", version="0.1.0", lifespan=lifespan, default_response_class=FastJSONResponse,
+)
 
 from fastapi.middleware.cors import CORSMiddleware
 import os
@@ -22,89 +68,574 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES,
+    compresslevel=settings.RESPONSE_GZIP_LEVEL,
+    brotli_quality=settings.RESPONSE_BROTLI_QUALITY,
+)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
 class MilestoneCheckRequest(BaseModel):
-    contract: ContractSchema
+    # Send contract_id for a contract the server already holds; sending the full
+    # contract is still accepted and (re)stores it before checking.
+    contract_id: Optional[str] = None
+    contract: Optional[ContractSchema] = None
+    action_id: str
+    evidence_text: str
+    expected_version: Optional[int] = None
+    # Diff mode: the version of the client's copy (see the ETag header); the response then
+    # carries a JSON Patch from that version instead of the action and phase progress
+    known_version: Optional[int] = None
+
+class PersistContractRequest(BaseModel):
+    project_manager_id: Optional[str] = None
+    pdf_url: Optional[str] = None
+
+class MilestoneEvidence(BaseModel):
     action_id: str
     evidence_text: str
 
+class MilestoneBatchRequest(BaseModel):
+    contract_id: Optional[str] = None
+    contract: Optional[ContractSchema] = None
+    items: List[MilestoneEvidence]
+    expected_version: Optional[int] = None
+    known_version: Optional[int] = None
+
 @app.get("/")
 def read_root():
     return {"status": "AI Microservice Online", "service": "Agentic ERP"}
 
 logger = logging.getLogger("uvicorn.error")
 
+@app.get("/ready")
+def ready():
+    """
+    Readiness probe: 200 once the LLM client and knowledge base are warm, 503 before.
+    `/` stays a pure liveness check.
+    """
+    state = readiness()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
 @app.post("/analyze-contract", response_model=ContractSchema)
 async def analyze_contract(file: UploadFile = File(...)):
     """
     Ingests a PDF contract, extracts structure using LLM, and returns JSON.
+    The pipeline runs on the analysis worker pool so the event loop stays free.
     """
+    job = await _submit_analysis(file)
     try:
-        logger.info(f"\n--- 📥 Receiving File: {file.filename} ---")
-        content = await file.read()
-        
-        # Determine file type (basic check)
-        if file.filename.endswith(".pdf"):
-            from app.services.extractor import extract_text_from_pdf_bytes
-            logger.info(f"📄 Processing PDF...")
-            text = extract_text_from_pdf_bytes(content)
-        else:
-            # Assume text/md
-            text = content.decode("utf-8")
-        
-        if not text.strip():
-            raise HTTPException(status_code=400, detail="Could not extract text from file.")
-            
-        logger.info(f"✅ Text Extracted ({len(text)} chars). Sending to Gemini...")
-        logger.info(f"📝 Preview: {text[:200]}...\n")
-
-        contract_data = extract_contract_data(text)
-        logger.info(f"🤖 Gemini Analysis Complete. ID: {contract_data.contract_id}")
-        return contract_data
+        return await asyncio.wrap_future(job_manager.future(job.job_id))
+    except EmptyDocumentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DocumentTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Error during analysis: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/analyze-contract/jobs", response_model=AnalysisJob, status_code=202)
+async def submit_analysis_job(file: UploadFile = File(...)):
+    """
+    Queues a contract for analysis and returns the job id right away.
+    Poll GET /analyze-contract/jobs/{job_id} for status and result.
+    """
+    return await _submit_analysis(file)
+
+@app.get("/analyze-contract/jobs/{job_id}", response_model=AnalysisJob)
+async def get_analysis_job(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@app.post("/analyze-contract/stream")
+async def analyze_contract_stream(file: UploadFile = File(...)):
+    """
+    Same analysis as /analyze-contract, streamed as server-sent events:
+    queued -> received -> pages_extracted -> context_retrieved -> llm_started
+    -> (section_extracted)* -> phase_parsed* -> done -> result (or error).
+    """
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def publish(event: Optional[ProgressEvent]):
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    def run(filename: str, path: str) -> ContractSchema:
+        try:
+            with progress_subscriber(publish):
+                try:
+                    result = analyze_spooled_document(filename, path)
+                except Exception as e:
+                    report_progress("error", str(e), error_type=type(e).__name__)
+                    raise
+                report_progress("result", "Final contract", contract=result.model_dump(mode="json"))
+                return result
+        finally:
+            publish(None)
+
+    job = await _submit_analysis(file, run)
+    # Queued before any worker event: those arrive through call_soon_threadsafe callbacks.
+    events.put_nowait(ProgressEvent(stage="queued", data={"job_id": job.job_id}, timestamp=time.time()))
+
+    async def stream():
+        while True:
+            try:
+                event = await asyncio.wait_for(events.get(), timeout=15)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                return
+            yield format_sse(event)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/analyze-contract/batch")
+async def analyze_contract_batch(files: List[UploadFile] = File(...)):
+    """
+    Analyzes many contracts (PDF/text files and/or zip archives) with bounded concurrency.
+    Streams one NDJSON line per contract as soon as it finishes; per-file errors don't abort the batch.
+    """
+    items: List[BatchItem] = []
+    try:
+        for file in files:
+            try:
+                path = await run_in_threadpool(spool_upload, file.file, file.filename)
+            except DocumentTooLargeError as e:
+                items.append(BatchItem(file.filename, error=str(e)))
+            else:
+                items.extend(await run_in_threadpool(expand_upload, file.filename, path, len(items)))
+            check_batch_count(len(items))
+    except BatchTooLargeError as e:
+        discard_items(items)
+        raise HTTPException(status_code=413, detail=str(e))
+
+    return StreamingResponse(analyze_batch(items), media_type="application/x-ndjson")
+
+async def _submit_analysis(file: UploadFile, pipeline=analyze_spooled_document) -> AnalysisJob:
+    # Spool to disk (bounded by PDF_MAX_BYTES) instead of holding the upload in memory.
+    try:
+        path = await run_in_threadpool(spool_upload, file.file, file.filename)
+    except DocumentTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    try:
+        return job_manager.submit(pipeline, file.filename, path, filename=file.filename)
+    except JobQueueFull as e:
+        os.unlink(path)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+async def _resolve_contract(contract_id: Optional[str], contract: Optional[ContractSchema], expected_version: Optional[int]):
+    if contract is not None:
+        # Checked by the store before anything is replaced; a known id needs its current version
+        try:
+            return await run_in_threadpool(contract_store.put, contract, None, expected_version)
+        except VersionConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    elif contract_id:
+        stored = await run_in_threadpool(contract_store.get, contract_id)
+        if stored is None:
+            raise HTTPException(status_code=404, detail="Contract not found")
+    else:
+        raise HTTPException(status_code=400, detail="Either contract_id or contract is required")
+
+    if expected_version is not None and expected_version != stored.version:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Contract is at version {stored.version}, expected {expected_version}",
+        )
+    return stored
+
+def _etag(contract_id: str, version: int) -> str:
+    return f'"{contract_id}:{version}"'
+
+def _etag_version(header: Optional[str], contract_id: str) -> Optional[int]:
+    # If-None-Match: "<contract_id>:<version>" (weak or list forms accepted)
+    for tag in (header or "").split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        owner, _, version = tag.strip('"').rpartition(":")
+        if owner == contract_id and version.isdigit():
+            return int(version)
+    return None
+
+def _apply_diff(response: dict, result: dict, known_version: int, full_fields: List[str]):
+    """
+    Diff mode: swaps the full-state fields of a response for the patch from known_version.
+    When the history no longer covers that version the whole contract is sent instead (patch: null).
+    """
+    for field in full_fields:
+        response.pop(field, None)
+    response["base_version"] = known_version
+    response["patch"] = result["patch"]
+    if result["patch"] is None:
+        response["contract"] = result["contract"]
+
 @app.post("/check-milestone")
 async def check_milestone(request: MilestoneCheckRequest):
     """
     Agentic node: Checks if a milestone is met based on evidence.
     Returns updated Contract status and Agent response.
     """
+    stored = await _resolve_contract(request.contract_id, request.contract, request.expected_version)
+
     try:
-        # Find the action in the contract
-        # (In real app, we might fetch from DB, here we expect full state passed in or just ID)
-        # We assume the 'contract' passed in the body is the current state.
-        
-        current_action = None
-        for phase in request.contract.phases:
-            for action in phase.actions:
-                if action.id == request.action_id:
-                    current_action = action
-                    break
-        
-        if not current_action:
-            raise HTTPException(status_code=404, detail="Action ID not found in contract")
+        with MILESTONE_CHECKS_IN_FLIGHT.track_inprogress():
+            result = await run_in_threadpool(
+                _check_stored_milestone, stored, request.action_id, request.evidence_text,
+                request.contract is not None, request.known_version,
+            )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Action ID not found in contract")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    response = {
+        "status": "success",
+        "agent_response": result["agent_response"],
+        "verdict": result["verdict"],
+        "contract_id": stored.contract.contract_id,
+        "version": result["version"],
+        "action": result["action"],
+        "current_phase": result["current_phase"],
+        "phases": result["phases"],
+    }
+    if request.contract is not None:
+        # Legacy callers read the whole contract back
+        response["updated_contract"] = result["contract"]
+    elif request.known_version is not None:
+        _apply_diff(response, result, request.known_version, ["action", "current_phase", "phases"])
+    # Returning the response class directly skips jsonable_encoder; orjson dumps the models
+    return FastJSONResponse(response, headers={"ETag": _etag(response["contract_id"], result["version"])})
+
+def _check_stored_milestone(stored, action_id: str, evidence_text: str, include_contract: bool = False,
+                            known_version: Optional[int] = None) -> dict:
+    """
+    Runs the milestone graph against a stored contract under its lock and commits the change.
+    With known_version, also returns the JSON Patch from that version to the new one.
+    Raises KeyError if the action id is unknown.
+    """
+    with stored.lock:
+        located = stored.locate(action_id)
+        if located is None:
+            raise KeyError(action_id)
+        phase, current_action = located
 
         # Invoke LangGraph
         initial_state = {
-            "contract": request.contract,
+            "contract": stored.contract,
             "current_action": current_action,
-            "latest_evidence": request.evidence_text,
-            "agent_response": None
+            "latest_evidence": evidence_text,
+            "agent_response": None,
+            "action_phase": phase.name,
+            "phase_progress": dict(stored.completed),
+        }
+
+        before = stored.capture([action_id])
+        result = get_app_graph().invoke(initial_state)
+
+        stored.completed = result.get("phase_progress") or stored.completed
+        contract_store.commit(stored, stored.changes_since(before))
+        patch = stored.patch_since(known_version) if known_version is not None else None
+        return {
+            "agent_response": result["agent_response"],
+            "verdict": result.get("verdict"),
+            "version": stored.version,
+            "action": current_action.model_copy(),
+            "current_phase": stored.contract.current_phase,
+            "phases": stored.phase_progress(),
+            "patch": patch,
+            # Only legacy callers (and diff clients too far behind) get the whole contract; copying it is O(actions)
+            "contract": stored.contract.model_copy(deep=True) if include_contract or (known_version is not None and patch is None) else None,
+        }
+
+@app.post("/check-milestones")
+async def check_milestones(request: MilestoneBatchRequest):
+    """
+    Batch version of /check-milestone: evaluates many evidence items against one contract
+    in a single graph run, then checks the phase transition once.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(request.items) > settings.MILESTONE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.MILESTONE_BATCH_MAX_ITEMS} items per batch")
+    stored = await _resolve_contract(request.contract_id, request.contract, request.expected_version)
+
+    try:
+        with MILESTONE_CHECKS_IN_FLIGHT.track_inprogress():
+            result = await run_in_threadpool(
+                _check_stored_milestones, stored, request.items, request.contract is not None, request.known_version,
+            )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    response = {
+        "status": "success",
+        "agent_response": result["agent_response"],
+        "contract_id": stored.contract.contract_id,
+        "version": result["version"],
+        "results": result["results"],
+        "current_phase": result["current_phase"],
+        "phases": result["phases"],
+    }
+    if request.contract is not None:
+        response["updated_contract"] = result["contract"]
+    elif request.known_version is not None:
+        # Per-item verdicts stay; the updated actions travel in the patch
+        for r in response["results"]:
+            r.pop("action", None)
+        _apply_diff(response, result, request.known_version, ["current_phase", "phases"])
+    return FastJSONResponse(response, headers={"ETag": _etag(response["contract_id"], result["version"])})
+
+def _check_stored_milestones(stored, items: List[MilestoneEvidence], include_contract: bool = False,
+                             known_version: Optional[int] = None) -> dict:
+    """
+    Runs the batch graph against a stored contract under its lock; one commit for the whole batch.
+    Unknown action ids are reported per item instead of failing the batch.
+    """
+    with stored.lock:
+        batch, results = [], []
+        for item in items:
+            located = stored.locate(item.action_id)
+            if located is None:
+                results.append({"action_id": item.action_id, "met": False, "agent_response": "Action ID not found in contract"})
+                continue
+            phase, action = located
+            batch.append({"action": action, "phase": phase.name, "evidence": item.evidence_text})
+            results.append(None)
+
+        before = stored.capture(b["action"].id for b in batch)
+        initial_state = {
+            "contract": stored.contract,
+            "current_action": None,
+            "latest_evidence": None,
+            "agent_response": None,
+            "phase_progress": dict(stored.completed),
+            "batch": batch,
+            "batch_results": None,
         }
-        
-        result = app_graph.invoke(initial_state)
-        
+        result = get_batch_graph().invoke(initial_state)
+
+        # Slot graph results back into request order, next to the not-found entries
+        evaluated = iter(result.get("batch_results") or [])
+        results = [r if r is not None else next(evaluated) for r in results]
+        for r in results:
+            located = stored.locate(r["action_id"])
+            r["action"] = located[1].model_copy() if located else None
+
+        stored.completed = result.get("phase_progress") or stored.completed
+        if batch:
+            contract_store.commit(stored, stored.changes_since(before))
+        patch = stored.patch_since(known_version) if known_version is not None else None
         return {
-            "status": "success", 
             "agent_response": result["agent_response"],
-            "updated_contract": result["contract"]
+            "version": stored.version,
+            "results": results,
+            "current_phase": stored.contract.current_phase,
+            "phases": stored.phase_progress(),
+            "patch": patch,
+            "contract": stored.contract.model_copy(deep=True) if include_contract or (known_version is not None and patch is None) else None,
         }
-        
+
+@app.get("/contracts/{contract_id}")
+async def get_contract(contract_id: str, if_none_match: Optional[str] = Header(None)):
+    """
+    Full contract with an ETag. A client sending its ETag back in If-None-Match gets 304 when
+    it is current, or a JSON Patch from its version while the history still covers it.
+    """
+    stored = await run_in_threadpool(contract_store.get, contract_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Contract not found")
+    known_version = _etag_version(if_none_match, contract_id)
+    # The lock can be held for a whole milestone check; wait for it off the event loop
+    return await run_in_threadpool(_render_stored_contract, stored, contract_id, known_version)
+
+def _render_stored_contract(stored, contract_id: str, known_version: Optional[int]) -> Response:
+    """
+    304, JSON Patch from known_version, or the full contract, rendered under the contract's lock
+    (so the contract needs no deep copy).
+    """
+    with stored.lock:
+        etag = _etag(contract_id, stored.version)
+        if known_version == stored.version:
+            return Response(status_code=304, headers={"ETag": etag})
+        patch = stored.patch_since(known_version) if known_version is not None else None
+        response = {"contract_id": contract_id, "version": stored.version, "phases": stored.phase_progress()}
+        if patch is not None:
+            response.update(base_version=known_version, patch=patch)
+        else:
+            response["contract"] = stored.contract
+        return FastJSONResponse(response, headers={"ETag": etag})
+
+@app.post("/contracts/{contract_id}/persist")
+async def persist_contract(contract_id: str, request: Optional[PersistContractRequest] = None):
+    """
+    Writes a stored contract and its milestones to the database (upsert, one transaction).
+    """
+    stored = await run_in_threadpool(contract_store.get, contract_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Contract not found")
+    request = request or PersistContractRequest()
+    try:
+        with STAGE_DURATION.time(stage="persist"):
+            return await run_in_threadpool(_persist_stored_contract, stored, request.project_manager_id, request.pdf_url)
+    except PersistenceNotConfigured as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to persist contract {contract_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _persist_stored_contract(stored, project_manager_id: Optional[str], pdf_url: Optional[str]) -> dict:
+    """
+    Copies the contract under its lock (which a milestone check can hold for a while, so never
+    on the event loop) and writes the copy without it.
+    """
+    with stored.lock:
+        contract = stored.contract.model_copy(deep=True)
+    return contract_repository.save_contract(contract, project_manager_id, pdf_url)
+
+@app.post("/contracts/{contract_id}/revisions")
+async def revise_contract(contract_id: str, file: UploadFile = File(...), include_contract: bool = False):
+    """
+    Amendment ("otrosí") of an analyzed contract. Only the clauses that changed since the stored
+    version are re-extracted; the report lists the milestones added, changed and removed.
+    `include_contract=true` also returns the updated contract.
+    """
+    if await run_in_threadpool(contract_store.get, contract_id) is None:
+        raise HTTPException(status_code=404, detail="Contract not found")
+    job = await _submit_analysis(file, pipeline=functools.partial(revise_spooled_document, contract_id))
+    try:
+        result = await asyncio.wrap_future(job_manager.future(job.job_id))
+    except UnknownContractError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RevisionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except EmptyDocumentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DocumentTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        logger.error(f"❌ Error during revision of {contract_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    headers = {"ETag": _etag(contract_id, result.version)}
+    if not include_contract:
+        return FastJSONResponse(result, headers=headers)
+    stored = await run_in_threadpool(contract_store.get, contract_id)
+    return await run_in_threadpool(_render_revised_contract, stored, contract_id, result)
+
+def _render_revised_contract(stored, contract_id: str, result: RevisionReport) -> Response:
+    """
+    Revision report plus the current contract, rendered under its lock: a milestone check may have
+    landed since the revision, so the contract and ETag are of the current version.
+    """
+    with stored.lock:
+        return FastJSONResponse(
+            {**result.model_dump(mode="json"), "version": stored.version, "contract": stored.contract},
+            headers={"ETag": _etag(contract_id, stored.version)},
+        )
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return result_cache.stats()
+
+@app.get("/gateway/stats")
+async def gateway_stats():
+    return {"llm": llm_gateway.stats(), "embeddings": embedding_gateway.stats()}
+
+@app.get("/evaluator/stats")
+async def evaluator_stats():
+    return evidence_evaluator.stats()
+
+@app.get("/kb/stats")
+async def kb_stats():
+    return kb_snapshots.stats()
+
+@app.get("/embeddings/stats")
+async def embeddings_stats():
+    return await run_in_threadpool(embedding_cache.stats)
+
+@app.get("/persistence/stats")
+async def persistence_stats():
+    return contract_repository.stats()
+
+@app.get("/master-data/stats")
+async def master_data_stats():
+    return await run_in_threadpool(master_data_index.stats)
+
+def _require_admin(token: Optional[str]):
+    # No token configured means no admin access at all, never open access
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not hmac.compare_digest((token or "").encode("utf-8"), settings.ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/traces/{request_id}")
+async def get_traces(request_id: str, x_admin_token: Optional[str] = Header(None)):
+    """
+    Prompt / response / exception traces recorded while serving a request (see X-Request-ID).
+    Traces hold full prompts and contract text: without ADMIN_TOKEN the endpoint doesn't exist.
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    _require_admin(x_admin_token)
+    traces = await run_in_threadpool(trace_sink.get, request_id)
+    if not traces:
+        raise HTTPException(status_code=404, detail="No traces for this request (not sampled or rotated out)")
+    return {"request_id": request_id, "traces": traces, "sink": trace_sink.stats()}
+
+@app.post("/admin/kb/sync")
+async def admin_kb_sync(dry_run: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """
+    Re-syncs the knowledge base with bari_master_data.json / bari_policies.txt.
+    Only new or changed documents are embedded. In snapshot mode a new snapshot is published
+    and every worker swaps to it on its next poll.
+    """
+    _require_admin(x_admin_token)
+    try:
+        if settings.KB_MODE == "snapshot":
+            return await run_in_threadpool(kb_snapshots.sync, dry_run)
+        return await run_in_threadpool(sync_knowledge_base, None, dry_run)
     except Exception as e:
+        logger.error(f"❌ KB sync failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/agent-status")
 async def agent_status():
-    return {"state": "Idle", "agents_active": 0}
+    """
+    Live view of the agents, from the same instrumentation as /metrics, plus portfolio
+    aggregates maintained incrementally by the contract store (O(1) in contracts and milestones).
+    """
+    jobs = job_manager.stats()
+    llm = llm_gateway.stats()
+    checks = int(MILESTONE_CHECKS_IN_FLIGHT.total())
+    active = jobs["outstanding"] + checks
+    return {
+        "state": "Busy" if active else "Idle",
+        "agents_active": active,
+        "analyses": jobs,
+        "milestone_checks_in_flight": checks,
+        "requests_in_flight": int(HTTP_REQUESTS_IN_FLIGHT.total()),
+        "llm_calls_in_flight": llm["in_flight"],
+        "extractions": {
+            outcome: int(EXTRACTIONS.value(outcome=outcome)) for outcome in ("success", "cache_hit", "fallback")
+        },
+        "latency_s": {
+            "llm_call": LLM_CALL_DURATION.summary(gateway=llm_gateway.name, outcome="ok"),
+            "llm_extraction": STAGE_DURATION.summary(stage="llm_extraction"),
+            "pdf_extraction": STAGE_DURATION.summary(stage="pdf_extraction"),
+            "kb_query": STAGE_DURATION.summary(stage="kb_query"),
+        },
+        "portfolio": portfolio.snapshot(),
+    }
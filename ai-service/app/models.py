@@ -1,5 +1,5 @@
-from typing import List, Optional, Literal
-from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional, Literal
+from pydantic import BaseModel, Field, create_model
 
 class Evidence(BaseModel):
     description: str
@@ -57,3 +57,84 @@ class ContractSchema(BaseModel):
     risk_level: Literal["bajo", "medio", "alto"] = Field(..., description="Nivel de riesgo determinado por la auditoría.")
     project_manager_id: str = Field("1", description="ID del Project Manager asignado.")
     pdf_url: Optional[str] = Field(None, description="URL del archivo en Cloudinary.")
+
+# Map-reduce extraction: each section yields phases/actions, and a final audit pass fills
+# every other ContractSchema field (same names, types and descriptions).
+class SectionExtraction(BaseModel):
+    phases: List[Phase] = Field(..., description="Fases (INICIO, EJECUCION, CIERRE) con las tareas encontradas en esta sección del contrato.")
+
+ContractOverview = create_model(
+    "ContractOverview",
+    **{
+        name: (field.annotation, field)
+        for name, field in ContractSchema.model_fields.items()
+        if name not in ("phases", "current_phase")
+    },
+)
+
+ProgressStage = Literal[
+    "queued", "received", "pages_extracted", "cache_hit", "context_retrieved", "llm_started",
+    "section_extracted", "phase_parsed", "fallback", "done", "result", "error",
+]
+
+class ProgressEvent(BaseModel):
+    stage: ProgressStage
+    message: str = ""
+    data: Dict[str, Any] = Field(default_factory=dict)
+    timestamp: float
+
+class ClauseCounts(BaseModel):
+    total: int
+    unchanged: int
+    removed: int
+    added: int
+
+class MilestoneChange(BaseModel):
+    id: str
+    fields: List[str]
+
+class MilestoneChanges(BaseModel):
+    added: List[str] = Field(default_factory=list)
+    changed: List[MilestoneChange] = Field(default_factory=list)
+    removed: List[str] = Field(default_factory=list)
+    reopened: List[str] = Field(default_factory=list)
+    reweighted: bool = False
+    unchanged: int = 0
+
+class RevisionTokens(BaseModel):
+    revision: int
+    document: int
+
+class RevisionReport(BaseModel):
+    """
+    Outcome of an amendment (POST /contracts/{id}/revisions): clause diff, milestones touched
+    and the tokens sent to the model against those of the whole document.
+    """
+    contract_id: str
+    base_version: int
+    version: int
+    clauses: ClauseCounts
+    milestones: MilestoneChanges
+    tokens: RevisionTokens
+
+class AnalysisJob(BaseModel):
+    job_id: str
+    status: Literal["queued", "running", "completed", "failed"] = "queued"
+    stage: Optional[ProgressStage] = None
+    filename: Optional[str] = None
+    request_id: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    result: Optional[ContractSchema] = None
+    # Set instead of `result` by revision jobs
+    revision: Optional[RevisionReport] = None
+
+class EvidenceAssessment(BaseModel):
+    met: bool = Field(..., description="True si la evidencia demuestra que se cumple el criterio de la tarea.")
+    confidence: float = Field(..., description="Confianza del veredicto entre 0 y 1.")
+    reason: str = Field(..., description="Justificación breve del veredicto.")
+
+class EvidenceVerdict(EvidenceAssessment):
+    tier: Literal["local", "llm", "cache"] = "local"
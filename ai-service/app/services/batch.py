@@ -0,0 +1,132 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import zipfile
+from concurrent.futures import Future
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+from app.core.config import settings
+from app.services.jobs import JobQueueFull, job_manager
+from app.services.pdf_extractor import spool_to_tempfile
+from app.services.pipeline import analyze_spooled_document
+
+logger = logging.getLogger("uvicorn.error")
+
+SUPPORTED_SUFFIXES = (".pdf", ".txt", ".md")
+# How long a batch waits before offering an item again while the shared analysis queue is full
+QUEUE_RETRY_SECONDS = 0.5
+
+class BatchItem(NamedTuple):
+    filename: str
+    path: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchTooLargeError(ValueError):
+    """
+    Raised when a batch holds more than BATCH_MAX_FILES contracts.
+    """
+
+def expand_upload(filename: str, path: str, already: int = 0) -> List[BatchItem]:
+    """
+    Turns one spooled upload into batch items. Zip archives are unpacked member by member
+    (each member spooled with the same size limit as a direct upload); anything else passes through.
+    `already` is the number of items the batch holds so far: an archive that would take it past
+    BATCH_MAX_FILES raises BatchTooLargeError from its directory alone, before anything is spooled.
+    """
+    if not (filename or "").lower().endswith(".zip"):
+        return [BatchItem(filename, path)]
+
+    items: List[BatchItem] = []
+    try:
+        with zipfile.ZipFile(path) as archive:
+            members = [
+                info for info in archive.infolist()
+                if not (info.is_dir() or info.filename.startswith("__MACOSX/") or os.path.basename(info.filename).startswith("."))
+            ]
+            check_batch_count(already + len(members))
+            for info in members:
+                name = info.filename
+                suffix = os.path.splitext(name)[1].lower()
+                if suffix not in SUPPORTED_SUFFIXES:
+                    items.append(BatchItem(name, error=f"Unsupported file type: {suffix or 'none'}"))
+                    continue
+                if settings.PDF_MAX_BYTES and info.file_size > settings.PDF_MAX_BYTES:
+                    items.append(BatchItem(name, error=f"File exceeds {settings.PDF_MAX_BYTES} bytes."))
+                    continue
+                try:
+                    with archive.open(info) as member:
+                        items.append(BatchItem(name, spool_to_tempfile(member, suffix=suffix)))
+                except Exception as e:
+                    items.append(BatchItem(name, error=str(e)))
+    except zipfile.BadZipFile as e:
+        items.append(BatchItem(filename, error=f"Invalid zip archive: {e}"))
+    finally:
+        os.unlink(path)
+    return items
+
+def check_batch_count(count: int):
+    if settings.BATCH_MAX_FILES and count > settings.BATCH_MAX_FILES:
+        raise BatchTooLargeError(f"Batch has {count} files; the limit is {settings.BATCH_MAX_FILES}.")
+
+def discard_items(items: List[BatchItem]):
+    for item in items:
+        if item.path:
+            _unlink(item.path)
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+async def analyze_batch(items: List[BatchItem]) -> AsyncIterator[str]:
+    """
+    Runs every item through the shared analysis job pool (ANALYSIS_MAX_CONCURRENCY across all
+    requests, visible in /agent-status) with at most BATCH_CONCURRENCY of this batch submitted
+    at once, and yields one NDJSON line per contract, in completion order. A failing file only
+    produces an error line; it never aborts the rest of the batch.
+    """
+    semaphore = asyncio.Semaphore(max(1, settings.BATCH_CONCURRENCY))
+    # Index -> job future; a submitted job owns its spooled file (the pipeline deletes it)
+    submitted: Dict[int, Future] = {}
+
+    async def submit(index: int, item: BatchItem) -> Future:
+        while True:
+            try:
+                job = job_manager.submit(analyze_spooled_document, item.filename, item.path, filename=item.filename)
+            except JobQueueFull:
+                # Other requests hold the queue; wait for room instead of failing the item
+                await asyncio.sleep(QUEUE_RETRY_SECONDS)
+                continue
+            future = job_manager.future(job.job_id)
+            submitted[index] = future
+            return future
+
+    async def run(index: int, item: BatchItem) -> dict:
+        line = {"index": index, "filename": item.filename}
+        if item.error:
+            return {**line, "status": "error", "error": item.error}
+        async with semaphore:
+            start_time = time.time()
+            try:
+                result = await asyncio.wrap_future(await submit(index, item))
+                return {**line, "status": "ok", "elapsed_s": round(time.time() - start_time, 3),
+                        "result": result.model_dump(mode="json")}
+            except Exception as e:
+                logger.error(f"❌ Batch item {item.filename} failed: {e}")
+                return {**line, "status": "error", "elapsed_s": round(time.time() - start_time, 3), "error": str(e)}
+
+    tasks = [asyncio.create_task(run(i, item)) for i, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done, ensure_ascii=False) + "\n"
+    finally:
+        # Client went away: stop this batch's queued work. Jobs already running can't be stopped and
+        # still own their files; only files of items that never started are deleted here.
+        for task in tasks:
+            task.cancel()
+        for index, item in enumerate(items):
+            future = submitted.get(index)
+            if item.path and (future is None or future.cancel()):
+                _unlink(item.path)
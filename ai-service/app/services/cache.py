@@ -0,0 +1,208 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Optional
+from app.core.config import settings
+from app.core.metrics import STAGE_DURATION
+from app.models import ContractSchema
+
+logger = logging.getLogger("uvicorn.error")
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU with optional TTL (seconds, 0 = no expiry).
+    """
+
+    def __init__(self, max_entries: int, ttl: float = 0):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, stored_at = item
+            if self.ttl and time.time() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class DiskCache:
+    """
+    SQLite-backed key/value tier that survives restarts.
+    Entries expire after `ttl` seconds; beyond `max_entries` the least recently used are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl: float = 0):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries(accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return value
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            if self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                " SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form used for hashing: NFC unicode, collapsed whitespace.
+    Re-extractions of the same PDF differ only in whitespace, so they share a key.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def contract_cache_key(text: str, prompt_version: str, model_name: str) -> str:
+    digest = hashlib.sha256()
+    for part in (prompt_version, model_name, normalize_text(text)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class ContractResultCache:
+    """
+    Two-tier (memory LRU + SQLite) cache of extracted ContractSchema results.
+    """
+
+    def __init__(self, memory_entries: int, disk_path: Optional[str], disk_entries: int, ttl: float):
+        self.memory = LRUCache(memory_entries, ttl)
+        self.disk = None
+        if disk_path:
+            try:
+                self.disk = DiskCache(disk_path, disk_entries, ttl)
+            except Exception as e:
+                logger.error(f"Failed to open result cache at {disk_path}: {e}")
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def get(self, key: str) -> Optional[ContractSchema]:
+        cached = self.memory.get(key)
+        if cached is not None:
+            self._count("memory_hits")
+            # Callers mutate the contract (statuses, phases); never hand out the cached instance.
+            return cached.model_copy(deep=True)
+
+        if self.disk is not None:
+            raw = self.disk.get(key)
+            if raw is not None:
+                try:
+                    with STAGE_DURATION.time(stage="validation"):
+                        result = ContractSchema.model_validate_json(raw)
+                except Exception as e:
+                    logger.warning(f"Discarding unreadable cache entry {key[:12]}: {e}")
+                else:
+                    self.memory.set(key, result)
+                    self._count("disk_hits")
+                    return result.model_copy(deep=True)
+
+        self._count("misses")
+        return None
+
+    def set(self, key: str, result: ContractSchema):
+        self.memory.set(key, result.model_copy(deep=True))
+        if self.disk is not None:
+            try:
+                self.disk.set(key, result.model_dump_json())
+            except Exception as e:
+                logger.error(f"Failed to persist cache entry {key[:12]}: {e}")
+        self._count("stores")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "disk_entries": len(self.disk) if self.disk is not None else 0,
+            }
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+result_cache = ContractResultCache(
+    memory_entries=settings.RESULT_CACHE_MEMORY_ENTRIES,
+    disk_path=settings.RESULT_CACHE_PATH or None,
+    disk_entries=settings.RESULT_CACHE_DISK_ENTRIES,
+    ttl=settings.RESULT_CACHE_TTL_SECONDS,
+)
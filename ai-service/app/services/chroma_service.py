@@ -1,95 +1,189 @@
 import os
-import chromadb
-from chromadb.utils import embedding_functions
+import threading
+from typing import List
 from app.core.config import settings
-import json
+from app.core.metrics import STAGE_DURATION
+from app.services.llm_gateway import embedding_gateway, request_key
 
 # Setup Client
 # Persist data in a local folder
 CHROMA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "chroma_db")
+COLLECTION_NAME = "bari_knowledge_base"
+
+# Process-wide handles. Opening the SQLite/HNSW store is expensive, so the client,
+# embedding function and collection are created once and shared by every thread.
+_client = None
+_embedding_fn = None
+_collection = None
+_lock = threading.RLock()
 
 def get_chroma_client():
-    return chromadb.PersistentClient(path=CHROMA_PATH)
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                # Imported lazily: chromadb adds ~0.5s to cold start.
+                import chromadb
+                _client = chromadb.PersistentClient(path=CHROMA_PATH)
+    return _client
 
 def get_embedding_fn():
-    # Using Google Gemini Embeddings
-    # Note: Requires google-generativeai installed
-    return embedding_functions.GoogleGenerativeAiEmbeddingFunction(
-        api_key=settings.GOOGLE_API_KEY,
-        task_type="RETRIEVAL_DOCUMENT",
-        model_name="models/text-embedding-004"
-    )
+    global _embedding_fn
+    if _embedding_fn is None:
+        with _lock:
+            if _embedding_fn is None:
+                from app.services.embeddings import build_embedding_backend
+
+                # EMBEDDING_BACKEND: "google" (Gemini embeddings, needs google-generativeai) or "local"
+                backend, remote = build_embedding_backend(settings.EMBEDDING_BACKEND)
+                _embedding_fn = wrap_embedding_fn(backend, remote)
+    return _embedding_fn
+
+def wrap_embedding_fn(inner, remote: bool = True):
+    """
+    Remote backends go through embedding_gateway; every backend sits behind the embedding cache
+    (so cache hits never spend gateway quota).
+    """
+    from app.services.embeddings import cached_embedding_fn
+
+    fn = gateway_embedding_fn(inner) if remote else inner
+    return cached_embedding_fn(fn) if settings.EMBEDDING_CACHE_ENABLED else fn
+
+def gateway_embedding_fn(inner):
+    """
+    Wraps a Chroma embedding function so every upstream call goes through embedding_gateway.
+    Name and config are delegated, so collections created with `inner` still accept it.
+    """
+    from chromadb.api.types import EmbeddingFunction
+
+    class GatewayEmbeddingFunction(EmbeddingFunction):
+        def __init__(self, wrapped):
+            self.wrapped = wrapped
+
+        def __call__(self, input):
+            return embedding_gateway.call(self.wrapped, input, key=request_key("embed", self.wrapped.name(), list(input)))
+
+        def embed_query(self, input):
+            return embedding_gateway.call(self.wrapped.embed_query, input, key=request_key("query", self.wrapped.name(), list(input)))
+
+        def name(self):
+            return self.wrapped.name()
+
+        def get_config(self):
+            return self.wrapped.get_config()
+
+        def is_legacy(self):
+            return self.wrapped.is_legacy()
+
+        def default_space(self):
+            return self.wrapped.default_space()
+
+        def supported_spaces(self):
+            return self.wrapped.supported_spaces()
+
+    return GatewayEmbeddingFunction(inner)
+
+def get_collection():
+    """
+    Shared handle to the knowledge base collection (created on first use).
+    """
+    global _collection
+    if _collection is None:
+        with _lock:
+            if _collection is None:
+                _collection = get_chroma_client().get_or_create_collection(
+                    name=collection_name(),
+                    embedding_function=get_embedding_fn()
+                )
+    return _collection
+
+def collection_name() -> str:
+    # Vectors from different backends live in different spaces, so each backend gets its own collection
+    if settings.EMBEDDING_BACKEND == "google":
+        return COLLECTION_NAME
+    return f"{COLLECTION_NAME}_{settings.EMBEDDING_BACKEND}"
+
+def is_collection_ready() -> bool:
+    if settings.KB_MODE == "snapshot":
+        from app.services.kb_snapshot import kb_snapshots
+
+        return kb_snapshots.is_ready()
+    return _collection is not None
+
+def set_embedding_fn(embedding_fn):
+    """
+    Replaces the embedding function (e.g. with a fake for benchmarks); it still goes through the
+    gateway and the embedding cache. The collection handle is dropped so it is reopened with the new function.
+    """
+    global _embedding_fn, _collection
+    with _lock:
+        _embedding_fn = wrap_embedding_fn(embedding_fn) if embedding_fn is not None else None
+        _collection = None
+
+def reset_chroma():
+    """
+    Drops the cached handles so the next call reopens the store.
+    """
+    global _client, _embedding_fn, _collection
+    with _lock:
+        _client = None
+        _embedding_fn = None
+        _collection = None
 
 def initialize_knowledge_base():
     """
-    Ingests Master Data and Policies into ChromaDB.
-    """
-    client = get_chroma_client()
-    embedding_fn = get_embedding_fn()
-    
-    # Create or Get Collection
-    collection = client.get_or_create_collection(
-        name="bari_knowledge_base",
-        embedding_function=embedding_fn
-    )
-    
+    Makes sure the knowledge base is populated. Cheap when it already is:
+    picking up changes to the source files is the job of `python -m app.services.kb_sync`
+    (or POST /admin/kb/sync), not of every startup.
+    In snapshot mode only one process builds; the others open the published snapshot.
+    """
+    if settings.KB_MODE == "snapshot":
+        from app.services.kb_snapshot import kb_snapshots
+
+        manifest = kb_snapshots.ensure()
+        print(f"Knowledge base snapshot {manifest['name']} ready with {manifest['count']} entries.")
+        return
+
+    collection = get_collection()
+
     # Check if we already have data
     if collection.count() > 0:
         print("Knowledge base already initialized.")
         return
 
     print("🚀 Initializing BARI Knowledge Base in ChromaDB...")
-    
-    # 1. Ingest Master Data (from JSON)
-    master_data_path = os.path.join(os.path.dirname(__file__), "..", "data", "bari_master_data.json")
-    with open(master_data_path, "r", encoding="utf-8") as f:
-        master_data = json.load(f)
-    
-    # Ingest Vendors as separate documents
-    for vendor in master_data["vendors"]:
-        text = f"Vendor: {vendor['name']} (ID: {vendor['id']}). Category: {vendor['category']}. specialty: {vendor.get('specialty', 'N/A')}. Rating: {vendor.get('rating', 'N/A')}"
-        collection.add(
-            ids=[f"vendor_{vendor['id']}"],
-            documents=[text],
-            metadatas=[{"type": "vendor", "id": vendor['id'], "name": vendor['name']}]
-        )
-    
-    # Ingest Cost Centers
-    for cc in master_data["cost_centers"]:
-        text = f"Cost Center: {cc['description']} (ID: {cc['id']}). Area: {cc['area']}"
-        collection.add(
-            ids=[f"cc_{cc['id']}"],
-            documents=[text],
-            metadatas=[{"type": "cost_center", "id": cc['id'], "desc": cc['description']}]
-        )
-
-    # 2. Ingest Policies (from TXT)
-    policies_path = os.path.join(os.path.dirname(__file__), "..", "data", "bari_policies.txt")
-    with open(policies_path, "r", encoding="utf-8") as f:
-        policies_text = f.read()
-    
-    # Simple split by sections (Double Newlines)
-    sections = policies_text.split("\n\n")
-    for i, section in enumerate(sections):
-        if section.strip():
-            collection.add(
-                ids=[f"policy_{i}"],
-                documents=[section.strip()],
-                metadatas=[{"type": "policy", "source": "bari_policies.txt"}]
-            )
-            
+    from app.services.kb_sync import sync_knowledge_base
+    sync_knowledge_base(collection)
     print(f"✅ Knowledge Base ready with {collection.count()} entries.")
 
+def query_kb_many(query_texts: List[str], n_results=3) -> List[List[str]]:
+    """
+    Searches the knowledge base for several queries in one round trip
+    (one batched embedding call, one collection query). Returns one document list per query.
+    """
+    if not query_texts:
+        return []
+    with STAGE_DURATION.time(stage="kb_query"):
+        results = _query(query_texts, n_results, ["documents"])
+    return results["documents"]
+
+def query_kb_hits(query_texts: List[str], n_results=3) -> dict:
+    """
+    Like query_kb_many, but returns the raw Chroma result (ids, documents,
+    distances and embeddings) for callers that rank or dedupe hits themselves.
+    """
+    with STAGE_DURATION.time(stage="kb_query"):
+        return _query(query_texts, n_results, ["documents", "distances", "embeddings"])
+
+def _query(query_texts: List[str], n_results: int, include: List[str]) -> dict:
+    if settings.KB_MODE == "snapshot":
+        from app.services.kb_snapshot import kb_snapshots
+
+        return kb_snapshots.query(query_texts, n_results, include)
+    return get_collection().query(query_texts=query_texts, n_results=n_results, include=include)
+
 def query_kb(query_text: str, n_results=3):
     """
     Searches the knowledge base for relevant context.
     """
-    client = get_chroma_client()
-    embedding_fn = get_embedding_fn()
-    collection = client.get_collection(name="bari_knowledge_base", embedding_function=embedding_fn)
-    
-    results = collection.query(
-        query_texts=[query_text],
-        n_results=n_results
-    )
-    return results["documents"][0]
+    return query_kb_many([query_text], n_results)[0]
@@ -0,0 +1,317 @@
+import contextlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.core.config import settings
+from app.models import ActionItem, ContractSchema, Phase
+from app.services.portfolio import portfolio
+
+logger = logging.getLogger("uvicorn.error")
+
+def is_completed(status: Optional[str]) -> bool:
+    return (status or "").lower() == "completed"
+
+class VersionConflict(RuntimeError):
+    """
+    Raised when a client-sent contract would replace a stored one it was not based on.
+    """
+
+    def __init__(self, message: str, version: int):
+        super().__init__(message)
+        self.version = version
+
+class StoredContract:
+    """
+    One contract plus the derived state /check-milestone needs in O(1):
+    an action id -> (phase index, action index) map and completed-action counters per phase.
+    `history` keeps the JSON Patch of the last CONTRACT_HISTORY_VERSIONS commits (in memory only);
+    `baseline` is the clause fingerprint a revision is diffed against (app/services/revisions.py).
+    Hold `lock` while reading or mutating the contract.
+    """
+
+    def __init__(self, contract: ContractSchema, version: int, baseline: Optional[dict] = None):
+        self.contract = contract
+        self.version = version
+        self.baseline = baseline
+        self.lock = threading.RLock()
+        self.action_index: Dict[str, Tuple[int, int]] = {}
+        self.completed: Dict[str, int] = {}
+        self.history: deque = deque(maxlen=max(0, settings.CONTRACT_HISTORY_VERSIONS))
+        self.reindex()
+
+    def reindex(self):
+        self.action_index = {}
+        self.completed = {}
+        for p, phase in enumerate(self.contract.phases):
+            self.completed[phase.name] = self.completed.get(phase.name, 0)
+            for a, action in enumerate(phase.actions):
+                self.action_index[action.id] = (p, a)
+                if is_completed(action.status):
+                    self.completed[phase.name] += 1
+
+    def locate(self, action_id: str) -> Optional[Tuple[Phase, ActionItem]]:
+        location = self.action_index.get(action_id)
+        if location is None:
+            return None
+        phase = self.contract.phases[location[0]]
+        return phase, phase.actions[location[1]]
+
+    def set_action_status(self, action_id: str, status: str) -> bool:
+        """
+        Changes one action's status and keeps the phase counter in sync. Returns False if the id is unknown.
+        """
+        located = self.locate(action_id)
+        if located is None:
+            return False
+        phase, action = located
+        delta = int(is_completed(status)) - int(is_completed(action.status))
+        action.status = status
+        self.completed[phase.name] = self.completed.get(phase.name, 0) + delta
+        return True
+
+    def phase_progress(self) -> Dict[str, dict]:
+        return {
+            phase.name: {"status": phase.status, "completed": self.completed.get(phase.name, 0), "total": len(phase.actions)}
+            for phase in self.contract.phases
+        }
+
+    def capture(self, action_ids: Iterable[str]) -> dict:
+        """
+        The parts of the contract a milestone check can change: the given actions,
+        every phase status and current_phase. Pass the result to `changes_since`.
+        """
+        actions = {}
+        for action_id in action_ids:
+            located = self.locate(action_id)
+            if located is not None:
+                actions[action_id] = located[1].model_dump(mode="json")
+        return {
+            "actions": actions,
+            "phases": [phase.status for phase in self.contract.phases],
+            "current_phase": self.contract.current_phase,
+        }
+
+    def changes_since(self, before: dict) -> List[dict]:
+        """
+        JSON Patch (RFC 6902) replace ops, relative to the contract document, for what changed since `capture`.
+        """
+        ops = []
+        for action_id, previous in before["actions"].items():
+            p, a = self.action_index[action_id]
+            for field, value in self.contract.phases[p].actions[a].model_dump(mode="json").items():
+                if previous.get(field) != value:
+                    ops.append({"op": "replace", "path": f"/phases/{p}/actions/{a}/{field}", "value": value})
+        for p, (phase, status) in enumerate(zip(self.contract.phases, before["phases"])):
+            if phase.status != status:
+                ops.append({"op": "replace", "path": f"/phases/{p}/status", "value": phase.status})
+        if self.contract.current_phase != before["current_phase"]:
+            ops.append({"op": "replace", "path": "/current_phase", "value": self.contract.current_phase})
+        return ops
+
+    def report(self, action_ids: Optional[Iterable[str]] = None):
+        """
+        Sends this contract's numbers to the portfolio aggregates: every action when `action_ids`
+        is None (O(actions), once per analysis), otherwise only those actions (O(phases)).
+        """
+        if action_ids is None:
+            actions = [action for phase in self.contract.phases for action in phase.actions]
+        else:
+            actions = [located[1] for located in map(self.locate, action_ids) if located is not None]
+        portfolio.update(
+            self.contract.contract_id,
+            risk_level=self.contract.risk_level,
+            health=self.contract.health,
+            current_phase=self.contract.current_phase,
+            phases={phase.name: (self.completed.get(phase.name, 0), len(phase.actions)) for phase in self.contract.phases},
+            due={action.id: None if is_completed(action.status) else action.due_date for action in actions},
+            full=action_ids is None,
+        )
+
+    def touched_actions(self, changes: List[dict]) -> List[str]:
+        # Action ids behind "/phases/{p}/actions/{a}/..." patch paths
+        touched = []
+        for op in changes:
+            parts = op["path"].split("/")
+            if len(parts) > 4 and parts[1] == "phases" and parts[3] == "actions":
+                touched.append(self.contract.phases[int(parts[2])].actions[int(parts[4])].id)
+        return list(dict.fromkeys(touched))
+
+    def patch_since(self, version: int) -> Optional[List[dict]]:
+        """
+        Ops that bring a client copy at `version` up to the current one, or None when the
+        history no longer covers it (the client must re-fetch the whole contract).
+        """
+        if version == self.version:
+            return []
+        missing = self.version - version
+        if missing < 0 or missing > len(self.history):
+            return None
+        ops = []
+        for _, changes in list(self.history)[-missing:]:
+            if changes is None:
+                return None
+            ops.extend(changes)
+        return ops
+
+class ContractStore:
+    """
+    In-process store of analyzed contracts keyed by contract_id, with version numbers.
+    When CONTRACT_STORE_DIR is set every committed version is also written to disk
+    (one JSON file per contract) and reloaded lazily after a restart.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or None
+        self._contracts: Dict[str, StoredContract] = {}
+        self._lock = threading.Lock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def put(self, contract: ContractSchema, baseline: Optional[dict] = None,
+            expected_version: Optional[int] = None) -> StoredContract:
+        """
+        Stores (or replaces) a contract sent by a client. Replacing requires `expected_version` to
+        be the stored version (raises VersionConflict and leaves the store untouched otherwise), so
+        a stale copy never overwrites changes made by id. Replacing bumps the version; the previous
+        `baseline` is kept unless a new one is given. New analyses go through `add`.
+        """
+        contract_id = contract.contract_id
+        previous = self.get(contract_id)
+        # Same order as every other writer (contract lock, then store lock): no commit can land
+        # between the version check and the replacement
+        with previous.lock if previous is not None else contextlib.nullcontext():
+            with self._lock:
+                current = self._contracts.get(contract_id)
+                if current is not previous:
+                    raise VersionConflict(f"Contract {contract_id} changed while it was being replaced", current.version)
+                if previous is not None and expected_version != previous.version:
+                    raise VersionConflict(
+                        f"Contract is at version {previous.version}, expected {expected_version}", previous.version,
+                    )
+                if baseline is None and previous is not None:
+                    baseline = previous.baseline
+                stored = StoredContract(contract, version=(previous.version + 1) if previous else 1, baseline=baseline)
+                self._contracts[contract_id] = stored
+        with stored.lock:
+            stored.report()
+        self._persist(stored)
+        return stored
+
+    def add(self, contract: ContractSchema, baseline: Optional[dict] = None) -> Tuple[StoredContract, bool]:
+        """
+        Stores a newly analyzed contract without ever replacing another one; returns (stored, created).
+        The model picks contract_id, so the same id can come back for a re-upload (result cache) or
+        for an unrelated document. A re-upload of the same text (same clause fingerprints) returns
+        the stored contract, statuses recorded since included; anything else gets "<id>-2", "<id>-3"...
+        """
+        clauses = baseline.get("clauses") if baseline else None
+        with self._lock:
+            base_id, number = contract.contract_id, 1
+            while True:
+                contract_id = base_id if number == 1 else f"{base_id}-{number}"
+                existing = self._contracts.get(contract_id) or self._load(contract_id)
+                if existing is None:
+                    break
+                if clauses is not None and existing.baseline and existing.baseline.get("clauses") == clauses:
+                    if contract_id not in self._contracts:
+                        self._contracts[contract_id] = existing
+                        existing.report()
+                    return existing, False
+                number += 1
+            if contract_id != base_id:
+                logger.warning(f"⚠️ Contract id {base_id} already used by another document; storing as {contract_id}")
+                contract.contract_id = contract_id
+            stored = StoredContract(contract, version=1, baseline=baseline)
+            self._contracts[contract_id] = stored
+        with stored.lock:
+            stored.report()
+        self._persist(stored)
+        return stored, True
+
+    def get(self, contract_id: str) -> Optional[StoredContract]:
+        with self._lock:
+            stored = self._contracts.get(contract_id)
+            if stored is None:
+                stored = self._load(contract_id)
+                if stored is not None:
+                    self._contracts[contract_id] = stored
+                    stored.report()
+            return stored
+
+    def commit(self, stored: StoredContract, changes: Optional[List[dict]] = None):
+        """
+        Records an in-place change to `stored.contract`: bumps the version and persists it.
+        `changes` is the JSON Patch of the change (see StoredContract.changes_since); without it
+        clients older than this version can no longer be served a diff.
+        """
+        with stored.lock:
+            stored.version += 1
+            stored.history.append((stored.version, changes))
+            stored.report(stored.touched_actions(changes) if changes is not None else None)
+        self._persist(stored)
+
+    def load_all(self) -> int:
+        """
+        Loads every persisted contract (startup), so the portfolio aggregates cover them all.
+        """
+        if not self.directory:
+            return 0
+        loaded = 0
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            stored = self._read(os.path.join(self.directory, name))
+            if stored is None:
+                continue
+            with self._lock:
+                if stored.contract.contract_id in self._contracts:
+                    continue
+                self._contracts[stored.contract.contract_id] = stored
+                stored.report()
+            loaded += 1
+        return loaded
+
+    def _path(self, contract_id: str) -> str:
+        safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", contract_id)
+        return os.path.join(self.directory, f"{safe_id}.json")
+
+    def _load(self, contract_id: str) -> Optional[StoredContract]:
+        if not self.directory:
+            return None
+        path = self._path(contract_id)
+        if not os.path.exists(path):
+            return None
+        return self._read(path)
+
+    def _read(self, path: str) -> Optional[StoredContract]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            return StoredContract(
+                ContractSchema.model_validate(payload["contract"]), version=payload["version"], baseline=payload.get("baseline"),
+            )
+        except Exception as e:
+            logger.error(f"Failed to load stored contract {os.path.basename(path)}: {e}")
+            return None
+
+    def _persist(self, stored: StoredContract):
+        if not self.directory:
+            return
+        with stored.lock:
+            payload = json.dumps(
+                {"version": stored.version, "contract": stored.contract.model_dump(mode="json"), "baseline": stored.baseline},
+                ensure_ascii=False,
+            )
+            path = self._path(stored.contract.contract_id)
+        # Write-then-rename so a crash never leaves a half-written contract behind.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+contract_store = ContractStore(settings.CONTRACT_STORE_DIR)
@@ -0,0 +1,315 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.core.config import settings
+from app.core.metrics import EMBEDDING_BATCH_DURATION, EMBEDDING_LOOKUPS
+from app.services.cache import LRUCache
+
+logger = logging.getLogger("uvicorn.error")
+
+# Embedding layer under ChromaDB: pluggable backends (Google or a local hashing embedder) behind a
+# two-tier cache (memory LRU + SQLite) keyed by (model, task, text hash). Only cache misses reach
+# the backend, in batches of EMBEDDING_BATCH_SIZE. chromadb and numpy are imported lazily, as in
+# chroma_service, so importing this module stays cheap.
+
+TASK_DOCUMENT = "document"
+TASK_QUERY = "query"
+WORD = re.compile(r"\w+")
+
+def embedding_key(model: str, task: str, text: str) -> str:
+    digest = hashlib.sha256()
+    for part in (model, task, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+def model_id(embedding_fn) -> str:
+    """
+    Stable identity of an embedding function for cache keys: its name plus the config fields
+    that change the vectors (credentials and the default task are left out).
+    """
+    try:
+        config = embedding_fn.get_config()
+    except Exception:
+        config = {}
+    if not isinstance(config, dict):
+        config = {}
+    relevant = {k: v for k, v in config.items() if k not in ("api_key_env_var", "task_type")}
+    return f"{embedding_fn.name()}:{json.dumps(relevant, sort_keys=True, default=str)}"
+
+class EmbeddingCache:
+    """
+    Memory LRU in front of a SQLite table of float32 vectors. The database is opened on first use.
+    """
+
+    def __init__(self, path: str, memory_entries: int):
+        self.path = path
+        self.memory = LRUCache(memory_entries)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.backend_calls = 0
+        self.texts_embedded = 0
+        self.embed_seconds = 0.0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and self.path:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, task TEXT NOT NULL,"
+                " dimensions INTEGER NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, list]:
+        import numpy as np
+
+        found: Dict[str, list] = {}
+        pending = []
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+            else:
+                pending.append(key)
+        memory_hits = len(found)
+        if pending:
+            with self._lock:
+                conn = self._connection()
+                if conn is not None:
+                    # SQLite caps bound parameters per statement
+                    for i in range(0, len(pending), 500):
+                        chunk = pending[i:i + 500]
+                        rows = conn.execute(
+                            f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                        ).fetchall()
+                        for key, blob in rows:
+                            vector = np.frombuffer(blob, dtype=np.float32).copy()
+                            found[key] = vector
+                            self.memory.set(key, vector)
+        disk_hits = len(found) - memory_hits
+        misses = len(keys) - len(found)
+        with self._lock:
+            self.memory_hits += memory_hits
+            self.disk_hits += disk_hits
+            self.misses += misses
+        EMBEDDING_LOOKUPS.inc(memory_hits, result="memory")
+        EMBEDDING_LOOKUPS.inc(disk_hits, result="disk")
+        EMBEDDING_LOOKUPS.inc(misses, result="miss")
+        return found
+
+    def set_many(self, model: str, task: str, items: List[Tuple[str, object]]):
+        import numpy as np
+
+        now = time.time()
+        rows = []
+        for key, vector in items:
+            array = np.asarray(vector, dtype=np.float32)
+            self.memory.set(key, array)
+            rows.append((key, model, task, int(array.shape[0]), array.tobytes(), now))
+        with self._lock:
+            conn = self._connection()
+            if conn is not None and rows:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, task, dimensions, vector, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)", rows,
+                )
+                conn.commit()
+
+    def record_batch(self, backend: str, texts: int, elapsed_s: float):
+        EMBEDDING_BATCH_DURATION.observe(elapsed_s, backend=backend)
+        with self._lock:
+            self.backend_calls += 1
+            self.texts_embedded += texts
+            self.embed_seconds += elapsed_s
+
+    def clear(self):
+        self.memory.clear()
+        with self._lock:
+            conn = self._connection()
+            if conn is not None:
+                conn.execute("DELETE FROM embeddings")
+                conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connection()
+            entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] if conn is not None else 0
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "backend": settings.EMBEDDING_BACKEND,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "memory_entries": len(self.memory),
+                "backend_calls": self.backend_calls,
+                "texts_embedded": self.texts_embedded,
+                "embed_seconds": round(self.embed_seconds, 3),
+                "texts_per_s": round(self.texts_embedded / self.embed_seconds, 1) if self.embed_seconds else 0.0,
+            }
+
+embedding_cache = EmbeddingCache(
+    settings.EMBEDDING_CACHE_PATH if settings.EMBEDDING_CACHE_ENABLED else "",
+    settings.EMBEDDING_CACHE_MEMORY_ENTRIES,
+)
+
+def hashing_embed(texts: Sequence[str], dimensions: int) -> list:
+    """
+    Feature-hashing embedder: words and their character trigrams, signed buckets, sublinear
+    weights, unit length. Deterministic across processes (crc32, not hash()).
+    """
+    import numpy as np
+
+    vectors = []
+    for text in texts:
+        normalized = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii").lower()
+        vector = np.zeros(dimensions, dtype=np.float32)
+        for word in WORD.findall(normalized):
+            features = [(f"w:{word}", 1.0)]
+            padded = f"<{word}>"
+            features += [(padded[i:i + 3], 0.5) for i in range(len(padded) - 2)]
+            for feature, weight in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                vector[h % dimensions] += weight if h & 0x80000000 else -weight
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = float(np.linalg.norm(vector))
+        vectors.append(vector / norm if norm else vector)
+    return vectors
+
+def build_embedding_backend(backend: str):
+    """
+    Returns (embedding_function, remote). Remote backends go through the embedding gateway.
+    """
+    from chromadb.api.types import EmbeddingFunction
+
+    if backend == "local":
+        class LocalHashingEmbeddingFunction(EmbeddingFunction):
+            """
+            No network, no model download: KB builds and tests run offline at CPU speed.
+            """
+
+            def __init__(self, dimensions: int = 384):
+                self.dimensions = dimensions
+
+            def __call__(self, input):
+                return hashing_embed(input, self.dimensions)
+
+            @staticmethod
+            def name() -> str:
+                return "bari_local_hashing"
+
+            def default_space(self):
+                return "cosine"
+
+            def get_config(self) -> dict:
+                return {"dimensions": self.dimensions}
+
+            @staticmethod
+            def build_from_config(config: dict):
+                return LocalHashingEmbeddingFunction(config.get("dimensions", 384))
+
+        return LocalHashingEmbeddingFunction(settings.LOCAL_EMBEDDING_DIMENSIONS), False
+
+    if backend == "google":
+        from chromadb.utils.embedding_functions import GoogleGenerativeAiEmbeddingFunction
+
+        class BatchedGoogleEmbeddingFunction(GoogleGenerativeAiEmbeddingFunction):
+            """
+            Same name/config as Chroma's Google function (existing collections keep working), but
+            one batch request per call instead of one request per text, and queries embedded with
+            the RETRIEVAL_QUERY task.
+            """
+
+            def _embed(self, input, task_type: str):
+                import numpy as np
+
+                kwargs = {"model": self.model_name, "content": list(input), "task_type": task_type}
+                if self.dimension is not None:
+                    kwargs["output_dimensionality"] = self.dimension
+                result = self._genai.embed_content(**kwargs)
+                return [np.array(vector, dtype=np.float32) for vector in result["embedding"]]
+
+            def __call__(self, input):
+                return self._embed(input, self.task_type)
+
+            def embed_query(self, input):
+                return self._embed(input, "RETRIEVAL_QUERY")
+
+        return BatchedGoogleEmbeddingFunction(
+            api_key=settings.GOOGLE_API_KEY, task_type="RETRIEVAL_DOCUMENT", model_name=settings.EMBEDDING_MODEL,
+        ), True
+
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend!r} (expected 'google' or 'local')")
+
+def cached_embedding_fn(inner, cache: EmbeddingCache = embedding_cache):
+    """
+    Wraps a Chroma embedding function with the embedding cache. Name and config are delegated,
+    so collections created with `inner` still accept it.
+    """
+    from chromadb.api.types import EmbeddingFunction
+
+    model = model_id(inner)
+    backend_name = inner.name()
+
+    class CachedEmbeddingFunction(EmbeddingFunction):
+        def __init__(self, wrapped):
+            self.wrapped = wrapped
+
+        def _embed(self, input, task: str, embed):
+            texts = list(input)
+            keys = [embedding_key(model, task, text) for text in texts]
+            found = cache.get_many(keys)
+            missing: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key not in found:
+                    missing.setdefault(key, text)
+            items = list(missing.items())
+            batch_size = max(1, settings.EMBEDDING_BATCH_SIZE)
+            for i in range(0, len(items), batch_size):
+                batch = items[i:i + batch_size]
+                start_time = time.perf_counter()
+                vectors = embed([text for _, text in batch])
+                cache.record_batch(backend_name, len(batch), time.perf_counter() - start_time)
+                cache.set_many(model, task, [(key, vector) for (key, _), vector in zip(batch, vectors)])
+                found.update((key, vector) for (key, _), vector in zip(batch, vectors))
+            return [found[key] for key in keys]
+
+        def __call__(self, input):
+            return self._embed(input, TASK_DOCUMENT, self.wrapped)
+
+        def embed_query(self, input):
+            return self._embed(input, TASK_QUERY, self.wrapped.embed_query)
+
+        def name(self):
+            return self.wrapped.name()
+
+        def get_config(self):
+            return self.wrapped.get_config()
+
+        def is_legacy(self):
+            return self.wrapped.is_legacy()
+
+        def default_space(self):
+            return self.wrapped.default_space()
+
+        def supported_spaces(self):
+            return self.wrapped.supported_spaces()
+
+    return CachedEmbeddingFunction(inner)
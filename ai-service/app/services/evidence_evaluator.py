@@ -0,0 +1,259 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.core.config import settings
+from app.models import ActionItem, EvidenceAssessment, EvidenceVerdict
+from app.services.cache import LRUCache
+from app.services.llm_gateway import llm_gateway, request_key
+from app.services.tracing import trace_sink
+
+logger = logging.getLogger("uvicorn.error")
+
+# Tier 1 (local): compiled once at import. Accents are stripped before matching.
+POSITIVE_PATTERN = re.compile(
+    r"\b(done|complet[oa]d?[oa]?s?|finalizad[oa]s?|terminad[oa]s?|aprobad[oa]s?|firmad[oa]s?|"
+    r"entregad[oa]s?|cumplid[oa]s?|radicad[oa]s?|recibid[oa]s?|approved|signed|delivered|completed|finished)\b"
+)
+NEGATIVE_PATTERN = re.compile(
+    r"\b(no\s+(se\s+)?(ha|han|fue|fueron|esta|estan|hay)|sin\s+(firma|aprobar|entregar)|pendientes?|incomplet[oa]s?|"
+    r"faltan?|rechazad[oa]s?|en\s+proceso|en\s+tramite|not|pending|missing|rejected)\b"
+)
+URL_PATTERN = re.compile(r"https?://\S+")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a al con de del el en es la las lo los o para por que se su sus un una y "
+    "the of and to for in on with is are be".split()
+)
+# Cheap stemming: "realizada" / "realizo" / "realizacion" share a prefix.
+STEM_CHARS = 5
+
+# Local score; met at DECISION_SCORE and above, confidence grows with the distance from it. A
+# completion keyword or a link to the deliverable decides on its own ("done", a bare URL), a
+# negation overrides both, and criteria/deliverable overlap only adds up to a decision together:
+# evidence with partial overlap and no keyword lands near the boundary and is escalated.
+WEIGHTS = {"positive": 1.0, "link": 0.9, "criteria": 0.5, "deliverables": 0.5, "negative": -2.5}
+DECISION_SCORE = 0.5
+# What .env.example ships with: present, but not a key Gemini accepts
+PLACEHOLDER_API_KEYS = frozenset({"your-gemini-api-key-here"})
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return text.lower()
+
+def _stems(text: str) -> set:
+    return {token[:STEM_CHARS] for token in TOKEN_PATTERN.findall(_fold(text)) if token not in STOPWORDS and len(token) > 2}
+
+def _coverage(expected: set, found: set) -> float:
+    return len(expected & found) / len(expected) if expected else 0.0
+
+def local_assessment(action: ActionItem, evidence: str) -> EvidenceVerdict:
+    """
+    Scores evidence against the action's criteria and deliverables without any network call.
+    Returns a verdict whose confidence says how far the score is from the decision boundary.
+    """
+    folded = _fold(evidence)
+    evidence_stems = _stems(evidence)
+
+    positive = bool(POSITIVE_PATTERN.search(folded))
+    negative = bool(NEGATIVE_PATTERN.search(folded))
+    has_url = bool(URL_PATTERN.search(evidence or ""))
+    criteria_overlap = _coverage(_stems(action.criteria), evidence_stems)
+    deliverable_stems = [_stems(d) for d in action.deliverables or []]
+    deliverables_covered = (
+        sum(1 for stems in deliverable_stems if stems and _coverage(stems, evidence_stems) >= 0.5) / len(deliverable_stems)
+        if deliverable_stems else 0.0
+    )
+
+    score = (
+        WEIGHTS["positive"] * positive + WEIGHTS["link"] * has_url + WEIGHTS["criteria"] * criteria_overlap
+        + WEIGHTS["deliverables"] * deliverables_covered + WEIGHTS["negative"] * negative
+    )
+    met = score >= DECISION_SCORE
+    confidence = round(min(1.0, abs(score - DECISION_SCORE) / DECISION_SCORE), 3)
+
+    signals = []
+    if positive:
+        signals.append("completion keyword")
+    if has_url:
+        signals.append("link")
+    if negative:
+        signals.append("negation/pending keyword")
+    signals.append(f"criteria overlap {criteria_overlap:.0%}")
+    if deliverable_stems:
+        signals.append(f"deliverables covered {deliverables_covered:.0%}")
+    return EvidenceVerdict(met=met, confidence=confidence, reason=", ".join(signals), tier="local")
+
+def llm_configured() -> bool:
+    key = settings.GOOGLE_API_KEY.strip()
+    return bool(key) and key not in PLACEHOLDER_API_KEYS
+
+def verdict_cache_key(action: ActionItem, evidence: str) -> str:
+    digest = hashlib.sha256()
+    for part in (action.criteria, "\x1f".join(action.deliverables or []), " ".join(_fold(evidence).split())):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+def get_evidence_prompt():
+    from langchain_core.prompts import ChatPromptTemplate
+
+    return ChatPromptTemplate.from_messages([
+        ("system", """
+Eres el Auditor de Hitos de BARI Infraestructuras. Decide si la evidencia aportada demuestra que se cumplió la tarea.
+Sé estricto: una evidencia vaga, una promesa o un trámite en curso NO cumplen el criterio.
+Responde con `met`, una `confidence` entre 0 y 1 y una `reason` breve en español.
+"""),
+        ("human", "Tarea: {description}\nCriterio: {criteria}\nEntregables: {deliverables}\n\nEvidencia:\n{evidence}"),
+    ])
+
+class EvidenceEvaluator:
+    """
+    Tiered milestone evidence evaluator:
+    cache -> local matcher -> Gemini, the last only when the local confidence is below `threshold`
+    and a Gemini key is configured (without one the local verdict stands). Keeps per-tier counters and latencies so the threshold can be tuned.
+    """
+
+    def __init__(self, threshold: float, llm_enabled: bool, llm_concurrency: int, cache: LRUCache):
+        self.threshold = threshold
+        self.llm_enabled = llm_enabled
+        self.llm_concurrency = max(1, llm_concurrency)
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self.escalations = 0
+        self.escalations_skipped = 0
+        self.llm_errors = 0
+
+    def evaluate(self, action: ActionItem, evidence: str) -> EvidenceVerdict:
+        return self.evaluate_many([(action, evidence)])[0]
+
+    def evaluate_many(self, items: Sequence[Tuple[ActionItem, str]]) -> List[EvidenceVerdict]:
+        """
+        Evaluates a batch; ambiguous items go to Gemini together (bounded by `llm_concurrency`).
+        """
+        verdicts: List[Optional[EvidenceVerdict]] = [None] * len(items)
+        escalate: List[int] = []
+        keys = [verdict_cache_key(action, evidence) for action, evidence in items]
+        escalating = self.llm_enabled and llm_configured()
+
+        for i, (action, evidence) in enumerate(items):
+            start_time = time.perf_counter()
+            cached = self.cache.get(keys[i])
+            if cached is not None:
+                verdicts[i] = cached.model_copy(update={"tier": "cache"})
+                self._record("cache", start_time)
+                continue
+
+            verdict = local_assessment(action, evidence)
+            self._record("local", start_time)
+            verdicts[i] = verdict
+            if verdict.confidence >= self.threshold:
+                self.cache.set(keys[i], verdict)
+            elif escalating:
+                escalate.append(i)
+            elif self.llm_enabled:
+                # Not cached: once a key is configured the item is escalated as usual
+                with self._lock:
+                    self.escalations_skipped += 1
+            else:
+                self.cache.set(keys[i], verdict)
+
+        if escalate:
+            with self._lock:
+                self.escalations += len(escalate)
+            # Identical (criteria, evidence) pairs within a batch share one Gemini call
+            pending: Dict[str, List[int]] = {}
+            for i in escalate:
+                pending.setdefault(keys[i], []).append(i)
+            groups = list(pending.values())
+            for group, verdict in zip(groups, self._ask_llm([items[group[0]] for group in groups])):
+                # A failed escalation keeps the local verdict but isn't cached, so it is retried next time.
+                if verdict is None:
+                    continue
+                self.cache.set(keys[group[0]], verdict)
+                for i in group:
+                    verdicts[i] = verdict
+        return verdicts
+
+    def _ask_llm(self, items: Sequence[Tuple[ActionItem, str]]) -> List[Optional[EvidenceVerdict]]:
+        from app.services.extractor import get_structured_llm
+
+        start_time = time.perf_counter()
+        inputs = [
+            {
+                "description": action.description,
+                "criteria": action.criteria,
+                "deliverables": "; ".join(action.deliverables or []) or "-",
+                "evidence": evidence,
+            }
+            for action, evidence in items
+        ]
+        try:
+            from langchain_core.runnables import RunnableLambda
+
+            chain = get_evidence_prompt() | get_structured_llm(EvidenceAssessment)
+            gated = RunnableLambda(lambda x: llm_gateway.call(
+                chain.invoke, x, key=request_key("evidence", settings.GEMINI_MODEL, x),
+            ))
+            results = gated.batch(inputs, config={"max_concurrency": self.llm_concurrency}, return_exceptions=True)
+        except Exception as e:
+            results = [e] * len(items)
+
+        verdicts = []
+        for inputs_item, result in zip(inputs, results):
+            if isinstance(result, EvidenceAssessment):
+                verdicts.append(EvidenceVerdict(**result.model_dump(), tier="llm"))
+                trace_sink.record("evidence_escalation", prompt=inputs_item, response=result)
+            else:
+                logger.error(f"⚠️ Evidence escalation failed, keeping local verdict: {result}")
+                with self._lock:
+                    self.llm_errors += 1
+                verdicts.append(None)
+                trace_sink.record("evidence_escalation_error", force=True, prompt=inputs_item, error=str(result))
+        self._record("llm", start_time, count=len(items))
+        return verdicts
+
+    def _record(self, tier: str, start_time: float, count: int = 1):
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        with self._lock:
+            stats = self._stats.setdefault(tier, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["count"] += count
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def stats(self) -> dict:
+        with self._lock:
+            tiers = {
+                tier: {
+                    "count": int(s["count"]),
+                    "avg_ms": round(s["total_ms"] / s["count"], 3) if s["count"] else 0.0,
+                    "max_ms": round(s["max_ms"], 3),
+                }
+                for tier, s in self._stats.items()
+            }
+            evaluated = tiers.get("local", {}).get("count", 0)
+            total = evaluated + tiers.get("cache", {}).get("count", 0)
+            return {
+                "threshold": self.threshold,
+                "llm_enabled": self.llm_enabled,
+                "llm_configured": llm_configured(),
+                "evaluations": total,
+                "escalations": self.escalations,
+                "escalation_rate": round(self.escalations / evaluated, 4) if evaluated else 0.0,
+                "escalations_skipped": self.escalations_skipped,
+                "llm_errors": self.llm_errors,
+                "cache_entries": len(self.cache),
+                "tiers": tiers,
+            }
+
+evidence_evaluator = EvidenceEvaluator(
+    threshold=settings.EVIDENCE_ESCALATION_THRESHOLD,
+    llm_enabled=settings.EVIDENCE_LLM_ENABLED,
+    llm_concurrency=settings.EVIDENCE_LLM_CONCURRENCY,
+    cache=LRUCache(settings.EVIDENCE_CACHE_ENTRIES, settings.EVIDENCE_CACHE_TTL_SECONDS),
+)
@@ -1,77 +1,101 @@
+import asyncio
+import contextvars
+import hashlib
 import logging
-import io
+import re
+import sys
+import threading
 import time
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
-from app.models import ContractSchema, Phase, ActionItem
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional
+from app.models import ContractSchema, Phase, ActionItem, SectionExtraction, ContractOverview
 from app.core.config import settings
+from app.core.metrics import EXTRACTIONS, PROMPT_CHARS, PROMPT_TOKENS, STAGE_DURATION
+from app.services.cache import result_cache, contract_cache_key
+from app.services.llm_gateway import llm_gateway, request_key
+from app.services.master_data import master_data_index
+from app.services.tracing import trace_sink
 from pydantic import ValidationError
-from pypdf import PdfReader
+from app.services.pdf_extractor import extract_text_from_pdf_bytes  # noqa: F401 (re-exported)
 
 # Setup Logger
 logger = logging.getLogger("uvicorn.error")
 
-# Load Master Data (Mock RAG)
+from app.services.progress import report_progress
+from app.services.retrieval import retrieve_context, split_into_windows
+
+# Heavy resources (LangChain/Gemini client, master data) are created on first use or by the
+# startup warm-up (app/services/warmup.py), never at import time: Cloud Run scale-out
+# instances must be able to answer / before any of this is loaded.
+
 def load_master_data():
-    try:
-        path = "app/data/bari_master_data.json"
-        import json
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"Failed to load master data: {e}")
-        return {}
+    # Raw master data from the hot-reloaded index (app/services/master_data.py)
+    return master_data_index.current().raw
 
-master_data = load_master_data()
+_llm = None
+_structured_llms = {}
+_llm_lock = threading.RLock()
 
-def extract_text_from_pdf_bytes(pdf_bytes: bytes) -> str:
+def get_llm():
     """
-    Extracts text from a PDF file provided as bytes.
+    Shared Gemini chat model, constructed on first use.
     """
-    try:
-        logger.info(f"   --> Starting PDF Extraction. Bytes: {len(pdf_bytes)}")
-        reader = PdfReader(io.BytesIO(pdf_bytes))
-        logger.info(f"   --> PDF Loaded. Pages: {len(reader.pages)}")
-        text = ""
-        for i, page in enumerate(reader.pages):
-            page_text = page.extract_text()
-            logger.info(f"   --> Page {i+1} extracted: {len(page_text)} chars")
-            text += page_text + "\n"
-        
-        logger.info(f"   --> Total Text: {len(text)} chars")
-        
-        if len(text.strip()) < 50:
-            logger.warning("   ⚠️ PDF text is very short or empty. Is it a scanned image?")
-            # We can raise a warning or just let it pass, but logging is key.
-            
-        return text
-    except Exception as e:
-        logger.error(f"❌ Error reading PDF: {e}")
-        import traceback
-        traceback.print_exc()
-        return ""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_google_genai import ChatGoogleGenerativeAI
 
+                # Initialize LLM (Gemini)
+                if not settings.GOOGLE_API_KEY:
+                    print("Warning: GOOGLE_API_KEY not found in settings.")
 
-# Initialize LLM (Gemini)
-if not settings.GOOGLE_API_KEY:
-    print("Warning: GOOGLE_API_KEY not found in settings.")
+                # One attempt per call (HttpRetryOptions(attempts=1)): retries are owned by the
+                # gateway (app/services/llm_gateway.py) so they respect the shared quota budget
+                _llm = ChatGoogleGenerativeAI(
+                    model=settings.GEMINI_MODEL,
+                    google_api_key=settings.GOOGLE_API_KEY,
+                    temperature=0,
+                    max_retries=1,
+                    timeout=settings.LLM_REQUEST_TIMEOUT_SECONDS,
+                )
+    return _llm
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    google_api_key=settings.GOOGLE_API_KEY,
-    temperature=0
-)
+def get_structured_llm(schema):
+    """
+    `get_llm().with_structured_output(schema)`, built once per schema.
+    """
+    with _llm_lock:
+        runnable = _structured_llms.get(schema)
+        if runnable is None:
+            runnable = get_llm().with_structured_output(schema)
+            _structured_llms[schema] = runnable
+        return runnable
+
+def set_llm(llm):
+    """
+    Replaces the chat model (e.g. with a fake for benchmarks). Pass None to go back to Gemini.
+    """
+    global _llm
+    with _llm_lock:
+        _llm = llm
+        _structured_llms.clear()
+
+def is_llm_ready() -> bool:
+    return _llm is not None
 
-from app.services.chroma_service import query_kb, initialize_knowledge_base
+# Demo contract returned when extraction fails; it must never be stored, counted or persisted
+FALLBACK_CONTRACT_ID = "MOCK-SAP-001"
 
-# Initialize Knowledge Base once at startup
-try:
-    initialize_knowledge_base()
-except Exception as e:
-    logger.error(f"Failed to init ChromaDB: {e}")
+def is_fallback(contract: ContractSchema) -> bool:
+    return contract.contract_id == FALLBACK_CONTRACT_ID
 
 # Definir el Prompt del Agente Auditor BARI
 def get_prompt(context_data: str):
+    from langchain_core.prompts import ChatPromptTemplate
+
     system_instructions = f"""
 Eres el Arquitecto Legal y Auditor Senior de BARI Infraestructuras. Tu objetivo es realizar un análisis EXHAUSTIVO, TÉCNICO y OPERATIVO del contrato.
 
@@ -104,50 +128,336 @@ SALIDA: JSON válido siguiendo el esquema ContractSchema.
         ("human", "Analiza el siguiente texto legal y genera el informe de auditoría detallado en JSON:\n\n{text}")
     ])
 
-# Create the structured output chain
-structured_llm = llm.with_structured_output(ContractSchema)
+@lru_cache(maxsize=1)
+def get_prompt_version() -> str:
+    """
+    Short fingerprint of the prompt template. Editing get_prompt changes it,
+    which invalidates every cached extraction made with the old wording.
+    """
+    templates = [get_prompt(""), get_section_prompt(), get_audit_prompt()]
+    raw = "\n".join(message.prompt.template for template in templates for message in template.messages)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+# --- MAP-REDUCE MODE (very large contracts) ---------------------------------
+
+PHASE_ORDER = ["INICIO", "EJECUCION", "CIERRE"]
+
+def get_section_prompt():
+    from langchain_core.prompts import ChatPromptTemplate
+
+    system_instructions = """
+Eres el Arquitecto Legal y Auditor Senior de BARI Infraestructuras. Recibirás UNA SECCIÓN de un contrato extenso.
+
+CONTEXTO DE BARI (Políticas Internas y Datos Maestros SAP):
+{context}
+
+TAREA:
+- Extrae TODAS las obligaciones, hitos, pólizas, actas y pruebas técnicas que aparezcan en ESTA sección. No resumas ni inventes tareas de otras secciones.
+- Clasifica cada tarea en la fase INICIO, EJECUCION o CIERRE. Omite las fases sin tareas.
+- Cada tarea (`ActionItem`) debe tener: `id` provisional (M[Fase]-C[Nro]), `description`, `criteria`, un `insight` experto, una `citation` EXACTA del texto de la sección, `due_date`, `milestone_value` (ej: 10%) y `deliverables` (mínimo 3).
+- Idioma: Español técnico colombiano.
+SALIDA: JSON válido siguiendo el esquema SectionExtraction.
+"""
+    return ChatPromptTemplate.from_messages([
+        ("system", system_instructions),
+        ("human", "Sección {section} de {total} del contrato:\n\n{text}")
+    ])
+
+def get_audit_prompt():
+    from langchain_core.prompts import ChatPromptTemplate
+
+    system_instructions = """
+Eres el Auditor Senior de BARI Infraestructuras. El plan de tareas del contrato ya fue extraído sección por sección.
+
+CONTEXTO DE BARI (Políticas Internas y Datos Maestros SAP):
+{context}
+
+PLAN CONSOLIDADO (Fases y Tareas):
+{plan}
+
+TAREA:
+- Con el encabezado del contrato y el plan consolidado, completa los datos generales (partes, cliente, valor, fechas, ubicación, campos ERP/SAP) y el `thought_process`.
+- **Resumen Auditor (audit_summary)**: valida si la clasificación de fases y actividades es lógica y coherente con los estándares de BARI.
+- **Hallazgos (audit_insights)**: observaciones críticas con tono Corporativo y Analítico.
+- Idioma: Español técnico colombiano.
+SALIDA: JSON válido siguiendo el esquema ContractOverview.
+"""
+    return ChatPromptTemplate.from_messages([
+        ("system", system_instructions),
+        ("human", "Encabezado del contrato:\n\n{text}")
+    ])
+
+def _normalize_key(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+def _parse_percent(value: str) -> Optional[float]:
+    match = re.search(r"\d+(?:[.,]\d+)?", value or "")
+    return float(match.group().replace(",", ".")) if match else None
+
+def reconcile_milestone_values(actions: List[ActionItem]):
+    """
+    Rescales `milestone_value` so the weights of all actions add up to 100%.
+    Actions without a parseable percentage get the average weight; rounding uses
+    largest remainders so the integers still sum to exactly 100.
+    """
+    if not actions:
+        return
+    parsed = [_parse_percent(a.milestone_value) for a in actions]
+    known = [p for p in parsed if p is not None and p > 0]
+    default = sum(known) / len(known) if known else 1.0
+    weights = [p if p is not None and p > 0 else default for p in parsed]
+    total = sum(weights)
+    shares = [w * 100 / total for w in weights]
+    rounded = [int(s) for s in shares]
+    by_remainder = sorted(range(len(shares)), key=lambda i: shares[i] - rounded[i], reverse=True)
+    for i in by_remainder[:100 - sum(rounded)]:
+        rounded[i] += 1
+    for action, value in zip(actions, rounded):
+        action.milestone_value = f"{value}%"
+
+def merge_section_extractions(extractions: List[SectionExtraction]) -> List[Phase]:
+    """
+    Reduce step: merges per-section phases, dedupes actions, renumbers ids and reconciles weights.
+    """
+    actions_by_phase = {name: [] for name in PHASE_ORDER}
+    descriptions = {}
+    seen = {}
+    for extraction in extractions:
+        for phase in extraction.phases:
+            descriptions.setdefault(phase.name, phase.description)
+            for action in phase.actions:
+                key = (phase.name, _normalize_key(action.description))
+                duplicate = seen.get(key)
+                if duplicate is not None:
+                    # Same obligation restated in another section: keep the first, union deliverables.
+                    for deliverable in action.deliverables:
+                        if deliverable not in duplicate.deliverables:
+                            duplicate.deliverables.append(deliverable)
+                    continue
+                seen[key] = action
+                actions_by_phase[phase.name].append(action)
+
+    phases = []
+    for number, name in enumerate(PHASE_ORDER, start=1):
+        actions = actions_by_phase[name]
+        if not actions:
+            continue
+        for index, action in enumerate(actions, start=1):
+            action.id = f"M{number}-C{index}"
+        phases.append(Phase(name=name, description=descriptions.get(name, name.title()), actions=actions))
+
+    reconcile_milestone_values([a for phase in phases for a in phase.actions])
+    return phases
+
+def _format_plan(phases: List[Phase]) -> str:
+    lines = []
+    for phase in phases:
+        lines.append(f"{phase.name}: {phase.description}")
+        for action in phase.actions:
+            lines.append(f"  - {action.id} ({action.milestone_value}, {action.due_date}): {action.description}")
+    return "\n".join(lines)
+
+async def extract_sections(sections: List[str], context_str: str) -> List[SectionExtraction]:
+    """
+    Map step: one SectionExtraction per section, extracted concurrently (bounded by
+    MAP_REDUCE_CONCURRENCY). Failed sections are logged and left out.
+    """
+    section_prompt = get_section_prompt()
+    section_chain = section_prompt | get_structured_llm(SectionExtraction)
+    semaphore = asyncio.Semaphore(settings.MAP_REDUCE_CONCURRENCY)
+
+    async def extract_section(index: int, section: str) -> Optional[SectionExtraction]:
+        inputs = {"context": context_str, "text": section, "section": index + 1, "total": len(sections)}
+        _observe_prompt("section", section_prompt, inputs)
+        async with semaphore:
+            try:
+                extraction = await llm_gateway.acall(
+                    section_chain.invoke, inputs,
+                    key=request_key("section", settings.GEMINI_MODEL, get_prompt_version(), inputs),
+                )
+            except Exception as e:
+                logger.error(f"   --> Section {index + 1}/{len(sections)} failed: {e}")
+                return None
+        if extraction is not None:
+            # Partial results: ids/weights are provisional until the reduce step.
+            report_progress(
+                "section_extracted", f"Section {index + 1}/{len(sections)} extracted",
+                section=index + 1, total=len(sections),
+                phases=[phase.model_dump(mode="json") for phase in extraction.phases],
+            )
+        return extraction
+
+    extractions = await asyncio.gather(*(extract_section(i, s) for i, s in enumerate(sections)))
+    return [e for e in extractions if e is not None]
+
+async def extract_contract_data_map_reduce(text: str, context_str: str) -> ContractSchema:
+    """
+    Map-reduce extraction for contracts too large for one call: sections are extracted
+    concurrently (bounded by MAP_REDUCE_CONCURRENCY), merged, then audited once.
+    """
+    sections = split_into_windows(text, window_chars=settings.MAP_REDUCE_SECTION_CHARS, max_windows=sys.maxsize)
+    logger.info(f"   --> Map-reduce mode: {len(sections)} sections, concurrency {settings.MAP_REDUCE_CONCURRENCY}")
+
+    start_time = time.time()
+    extractions = await extract_sections(sections, context_str)
+    if not extractions:
+        raise ValueError("Every section extraction failed")
+    logger.info(f"   --> Map step: {len(extractions)}/{len(sections)} sections in {time.time() - start_time:.2f}s")
+
+    with STAGE_DURATION.time(stage="merge"):
+        phases = merge_section_extractions(extractions)
+    report_progress("llm_started", "Running audit pass", mode="map_reduce_audit")
+
+    audit_prompt = get_audit_prompt()
+    audit_chain = audit_prompt | get_structured_llm(ContractOverview)
+    inputs = {
+        "context": context_str,
+        "plan": _format_plan(phases),
+        "text": text[:settings.MAP_REDUCE_AUDIT_CHARS],
+    }
+    _observe_prompt("audit", audit_prompt, inputs)
+    overview = await llm_gateway.acall(
+        audit_chain.invoke, inputs,
+        key=request_key("audit", settings.GEMINI_MODEL, get_prompt_version(), inputs),
+    )
+    if overview is None:
+        raise ValueError("Gemini returned None for the audit pass")
+
+    with STAGE_DURATION.time(stage="validation"):
+        return ContractSchema(
+            **overview.model_dump(),
+            phases=phases,
+            current_phase=phases[0].name if phases else "INICIO",
+        )
+
+def extract_revised_clauses(text: str) -> List[SectionExtraction]:
+    """
+    Extracts the actions of the clauses an amendment changed (app/services/revisions.py):
+    retrieval and the section prompt run over `text` only, so the cost follows the size of
+    the change. Raises when every section fails; there is no fallback contract here.
+    """
+    if not settings.GOOGLE_API_KEY:
+        raise ValueError("Google API Key missing")
+    relevant_context = retrieve_context(text)
+    context_str = "\n".join(relevant_context)
+    report_progress("context_retrieved", f"{len(relevant_context)} KB documents retrieved", documents=len(relevant_context))
+
+    sections = split_into_windows(text, window_chars=settings.MAP_REDUCE_SECTION_CHARS, max_windows=sys.maxsize)
+    report_progress("llm_started", f"Invoking Gemini on {len(sections)} changed sections", mode="revision")
+    start_time = time.time()
+    with STAGE_DURATION.time(stage="llm_extraction"):
+        extractions = _run_coroutine(extract_sections(sections, context_str))
+    if not extractions:
+        EXTRACTIONS.inc(outcome="error")
+        raise ValueError("Every section extraction failed")
+    trace_sink.record(
+        "revision_extraction", model=settings.GEMINI_MODEL, prompt_version=get_prompt_version(),
+        context=context_str, text=text, elapsed_s=round(time.time() - start_time, 3), response=extractions,
+    )
+    EXTRACTIONS.inc(outcome="revision")
+    return extractions
+
+def _observe_prompt(mode: str, prompt, inputs: dict):
+    # Template text plus every input value; close enough to the rendered prompt without rendering it.
+    chars = sum(len(message.prompt.template) for message in prompt.messages)
+    chars += sum(len(str(value)) for value in inputs.values())
+    PROMPT_CHARS.observe(chars, mode=mode)
+    PROMPT_TOKENS.observe(chars // 4, mode=mode)
+
+def _run_coroutine(coro):
+    # extract_contract_data is called from worker threads (no running loop); fall back to a
+    # helper thread if someone calls it from inside an event loop.
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(context.run, asyncio.run, coro).result()
+
+def _report_phases(contract: ContractSchema):
+    for phase in contract.phases:
+        report_progress(
+            "phase_parsed", f"Phase {phase.name}: {len(phase.actions)} actions",
+            phase=phase.model_dump(mode="json"),
+        )
 
 def extract_contract_data(param: str) -> ContractSchema:
     """
     Extracts data using RAG (ChromaDB) and Gemini (Stable Version).
     """
+    cache_key = None
+    if settings.RESULT_CACHE_ENABLED:
+        cache_key = contract_cache_key(param, get_prompt_version(), settings.GEMINI_MODEL)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"   --> ⚡ Cache hit ({cache_key[:12]}). Skipping ChromaDB + Gemini.")
+            report_progress("cache_hit", "Served from result cache")
+            EXTRACTIONS.inc(outcome="cache_hit")
+            _report_phases(cached)
+            return cached
+
     try:
         if not settings.GOOGLE_API_KEY:
             raise ValueError("Google API Key missing")
             
         # 🟢 STEP 1: SEMANTIC SEARCH (RAG)
         logger.info("   --> Searching ChromaDB for relevant BARI context...")
-        relevant_context = query_kb(param, n_results=5)
+        relevant_context = retrieve_context(param)
         context_str = "\n".join(relevant_context)
-        
-        # 🔵 STEP 2: DYNAMIC PROMPT
-        current_prompt = get_prompt(context_str)
-        extraction_chain = current_prompt | structured_llm
+        report_progress("context_retrieved", f"{len(relevant_context)} KB documents retrieved", documents=len(relevant_context))
 
-        logger.info("   --> Invoking Gemini Chain (Stable Mode)...")
         start_time = time.time()
-        result = extraction_chain.invoke({"text": param})
+        mode = "single"
+        if settings.MAP_REDUCE_ENABLED and len(param) > settings.MAP_REDUCE_THRESHOLD_CHARS:
+            mode = "map_reduce"
+            # 🟣 STEP 2b: MAP-REDUCE for contracts that don't fit one call
+            report_progress("llm_started", "Invoking Gemini (map-reduce)", mode="map_reduce")
+            with STAGE_DURATION.time(stage="llm_extraction"):
+                result = _run_coroutine(extract_contract_data_map_reduce(param, context_str))
+        else:
+            # 🔵 STEP 2: DYNAMIC PROMPT
+            current_prompt = get_prompt(context_str)
+            extraction_chain = current_prompt | get_structured_llm(ContractSchema)
+
+            logger.info("   --> Invoking Gemini Chain (Stable Mode)...")
+            report_progress("llm_started", "Invoking Gemini", mode="single")
+            _observe_prompt("single", current_prompt, {"text": param})
+            # Identical uploads arriving together share one Gemini call
+            with STAGE_DURATION.time(stage="llm_extraction"):
+                result = llm_gateway.call(
+                    extraction_chain.invoke, {"text": param},
+                    key=request_key("contract", settings.GEMINI_MODEL, get_prompt_version(), context_str, param),
+                )
         logger.info(f"   --> Gemini Response received in {time.time() - start_time:.2f}s")
         
         if result is None:
             raise ValueError("Gemini returned None (Failed to generate structured output)")
-        
-        with open("debug_gemini_response.txt", "w", encoding="utf-8") as f:
-            f.write(f"SUCCESS:\n{result}")
-            
+        _report_phases(result)
+        # Queued for the background trace writer; nothing is serialized on this thread
+        trace_sink.record(
+            "extraction", mode=mode, model=settings.GEMINI_MODEL, prompt_version=get_prompt_version(),
+            context=context_str, text=param, elapsed_s=round(time.time() - start_time, 3), response=result,
+        )
+
+        if cache_key:
+            result_cache.set(cache_key, result)
+        EXTRACTIONS.inc(outcome="success")
         return result
     except Exception as e:
         # Fallback for demo if API fails or Key missing
         logger.error(f"Extraction failed: {e}")
         import traceback
         traceback.print_exc()
-        
-        with open("debug_gemini_response.txt", "w", encoding="utf-8") as f:
-            f.write(f"EXCEPTION:\n{str(e)}\n\nTRACEBACK:\n{traceback.format_exc()}")
-            
+        trace_sink.record_exception("extraction_error", e, model=settings.GEMINI_MODEL, text=param)
+
         logger.info("Returning mock data due to error.")
+        report_progress("fallback", f"Extraction failed, returning fallback data: {e}")
+        EXTRACTIONS.inc(outcome="fallback")
         return ContractSchema(
-            contract_id="MOCK-SAP-001",
+            contract_id=FALLBACK_CONTRACT_ID,
             title="Contrato de Suministro Estándar (Fallback)",
             summary="Análisis de contingencia por error de conexión con Gemini.",
             thought_process="Protocolo de respaldo activado.",
@@ -1,6 +1,10 @@
-from typing import TypedDict, List, Annotated, Optional
-from langgraph.graph import StateGraph, END
-from app.models import ContractSchema, ActionItem, Phase
+import threading
+import time
+from typing import Dict, TypedDict, List, Annotated, Optional
+from app.core.metrics import GRAPH_NODE_DURATION
+from app.models import ContractSchema, ActionItem, Phase, EvidenceVerdict
+from app.services.contract_store import is_completed
+from app.services.evidence_evaluator import evidence_evaluator
 
 # Define the State for the Graph
 class AgentState(TypedDict):
@@ -8,6 +12,26 @@ class AgentState(TypedDict):
     current_action: Optional[ActionItem]
     latest_evidence: Optional[str]
     agent_response: Optional[str]
+    # Optional, supplied by the contract store: the phase of `current_action` and the number of
+    # completed actions per phase, so the manager node doesn't rescan every action.
+    action_phase: Optional[str]
+    phase_progress: Optional[Dict[str, int]]
+    # Batch mode: [{"action": ActionItem, "phase": str, "evidence": str}, ...] and one result per item
+    batch: Optional[List[dict]]
+    batch_results: Optional[List[dict]]
+    verdict: Optional[EvidenceVerdict]
+
+def complete_action(action: ActionItem, phase_name: Optional[str], progress: Optional[Dict[str, int]]) -> Optional[Dict[str, int]]:
+    """
+    Marks the action completed and returns the (copied) per-phase counters, incremented if it wasn't already.
+    """
+    was_completed = is_completed(action.status)
+    action.status = "completed"
+    if progress is None or not phase_name or was_completed:
+        return progress
+    progress = dict(progress)
+    progress[phase_name] = progress.get(phase_name, 0) + 1
+    return progress
 
 def evaluate_evidence_node(state: AgentState):
     """
@@ -20,17 +44,50 @@ def evaluate_evidence_node(state: AgentState):
     if not action or not evidence:
         return {"agent_response": "No action or evidence provided."}
 
-    # In a real impl, we'd use LLM here:
-    # prompt = f"Criteria: {action.criteria}. Evidence: {evidence}. Is it met?"
-    
-    # Simple keyword mock for MVP
-    is_met = "done" in evidence.lower() or "completo" in evidence.lower() or "https://" in evidence
-    
-    if is_met:
-        action.status = "COMPLETED"
-        return {"agent_response": "Milestone COMPLETED based on evidence.", "contract": state["contract"]}
+    # Tiered: local matcher first, Gemini only for ambiguous evidence
+    verdict = evidence_evaluator.evaluate(action, evidence)
+    if verdict.met:
+        update = {"agent_response": "Milestone COMPLETED based on evidence.", "contract": state["contract"], "verdict": verdict}
+        progress = complete_action(action, state.get("action_phase"), state.get("phase_progress"))
+        if progress is not None:
+            update["phase_progress"] = progress
+        return update
     else:
-        return {"agent_response": "Evidence insufficient. Please provide more details."}
+        return {"agent_response": "Evidence insufficient. Please provide more details.", "verdict": verdict}
+
+def evaluate_batch_node(state: AgentState):
+    """
+    Evaluates every (action, evidence) pair of a batch and applies all status changes.
+    The phase transition runs once afterwards, in the manager node.
+    """
+    progress = state.get("phase_progress")
+    batch = state.get("batch") or []
+    # One pass through the evaluator so every ambiguous item escalates to Gemini concurrently
+    to_evaluate = [(item["action"], item["evidence"]) for item in batch if item.get("evidence")]
+    verdicts = iter(evidence_evaluator.evaluate_many(to_evaluate))
+    results = []
+    for item in batch:
+        action = item["action"]
+        if not item.get("evidence"):
+            results.append({"action_id": action.id, "met": False, "agent_response": "No action or evidence provided."})
+            continue
+        verdict = next(verdicts)
+        if verdict.met:
+            progress = complete_action(action, item.get("phase"), progress)
+            response = "Milestone COMPLETED based on evidence."
+        else:
+            response = "Evidence insufficient. Please provide more details."
+        results.append({"action_id": action.id, "met": verdict.met, "agent_response": response, "verdict": verdict})
+
+    completed = sum(1 for r in results if r["met"])
+    update = {
+        "batch_results": results,
+        "contract": state["contract"],
+        "agent_response": f"{completed} of {len(results)} milestones COMPLETED based on evidence.",
+    }
+    if progress is not None:
+        update["phase_progress"] = progress
+    return update
 
 def check_phase_transition(state: AgentState):
     """
@@ -45,35 +102,87 @@ def check_phase_transition(state: AgentState):
     if phase_idx == -1:
         return state
 
-    current_phase = contract.phases[phase_idx]
-    
-    # Check if all actions are COMPLETED
-    all_done = all(a.status == "COMPLETED" for a in current_phase.actions)
-    
-    if all_done:
+    # A batch can finish more than one phase, so keep advancing while the current one is done
+    progress = state.get("phase_progress")
+    while phase_idx < len(contract.phases):
+        current_phase = contract.phases[phase_idx]
+
+        # Check if all actions are completed: O(1) with store counters, full scan otherwise
+        if progress is not None:
+            all_done = progress.get(current_phase.name, 0) >= len(current_phase.actions)
+        else:
+            all_done = all(is_completed(a.status) for a in current_phase.actions)
+        if not all_done:
+            break
+
         current_phase.status = "COMPLETED"
-        # Move to next phase
-        if current_phase_name == "INITIATION":
-            contract.current_phase = "EXECUTION"
-            contract.phases[phase_idx + 1].status = "ACTIVE"
-        elif current_phase_name == "EXECUTION":
-            contract.current_phase = "CLOSURE"
-            contract.phases[phase_idx + 1].status = "ACTIVE"
-        elif current_phase_name == "CLOSURE":
-            # Contract Done
-            pass
+        # Move to next phase (INICIO -> EJECUCION -> CIERRE); after CIERRE the contract is done
+        phase_idx += 1
+        if phase_idx < len(contract.phases):
+            next_phase = contract.phases[phase_idx]
+            contract.current_phase = next_phase.name
+            next_phase.status = "ACTIVE"
             
     return {"contract": contract}
 
+def timed_node(name: str, node):
+    def run(state: AgentState):
+        start_time = time.perf_counter()
+        try:
+            return node(state)
+        finally:
+            GRAPH_NODE_DURATION.observe(time.perf_counter() - start_time, node=name)
+    return run
+
 # Build the Graph
-workflow = StateGraph(AgentState)
+def build_graph(evaluator=evaluate_evidence_node):
+    # langgraph is imported here rather than at module level: it costs ~0.7s of cold start.
+    from langgraph.graph import StateGraph, END
+
+    workflow = StateGraph(AgentState)
+
+    workflow.add_node("evaluator", timed_node(evaluator.__name__, evaluator))
+    workflow.add_node("manager", timed_node("check_phase_transition", check_phase_transition))
+
+    # Edges
+    workflow.set_entry_point("evaluator")
+    workflow.add_edge("evaluator", "manager")
+    workflow.add_edge("manager", END)
+
+    return workflow.compile()
+
+_app_graph = None
+_graph_lock = threading.Lock()
 
-workflow.add_node("evaluator", evaluate_evidence_node)
-workflow.add_node("manager", check_phase_transition)
+def get_app_graph():
+    """
+    Compiled milestone workflow, built on first use.
+    """
+    global _app_graph
+    if _app_graph is None:
+        with _graph_lock:
+            if _app_graph is None:
+                _app_graph = build_graph()
+    return _app_graph
+
+_batch_graph = None
+
+def get_batch_graph():
+    """
+    Same workflow with the batch evaluator: N evidence items, one phase-transition check.
+    """
+    global _batch_graph
+    if _batch_graph is None:
+        with _graph_lock:
+            if _batch_graph is None:
+                _batch_graph = build_graph(evaluate_batch_node)
+    return _batch_graph
 
-# Edges
-workflow.set_entry_point("evaluator")
-workflow.add_edge("evaluator", "manager")
-workflow.add_edge("manager", END)
+def is_graph_ready() -> bool:
+    return _app_graph is not None
 
-app_graph = workflow.compile()
+def __getattr__(name):
+    # Keeps `from app.services.graph import app_graph` working without compiling at import time.
+    if name == "app_graph":
+        return get_app_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,136 @@
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from app.core.config import settings
+from app.core.metrics import ANALYSES_IN_FLIGHT
+from app.models import AnalysisJob, ProgressEvent, RevisionReport
+from app.services.progress import progress_subscriber
+from app.services.tracing import current_request_id
+
+logger = logging.getLogger("uvicorn.error")
+
+class JobQueueFull(Exception):
+    """
+    Raised when the pool already has `max_workers + queue_depth` outstanding jobs.
+    """
+
+class JobManager:
+    """
+    Bounded worker pool for the PDF -> retrieval -> LLM pipeline.
+    At most `max_workers` jobs run at once and at most `queue_depth` wait behind them;
+    anything beyond that is rejected instead of piling up in memory.
+    """
+
+    def __init__(self, max_workers: int, queue_depth: int, result_ttl: int):
+        self.max_workers = max(1, max_workers)
+        self.queue_depth = max(0, queue_depth)
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="analysis")
+        self._jobs: Dict[str, AnalysisJob] = {}
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._outstanding = 0
+
+    def submit(self, fn: Callable, *args, filename: Optional[str] = None) -> AnalysisJob:
+        """
+        Queues `fn(*args)` and returns its job record immediately.
+        """
+        with self._lock:
+            self._prune()
+            if self._outstanding >= self.max_workers + self.queue_depth:
+                raise JobQueueFull(
+                    f"Analysis queue is full ({self._outstanding} jobs outstanding)."
+                )
+            job = AnalysisJob(
+                job_id=uuid.uuid4().hex, filename=filename, created_at=time.time(), stage="queued",
+                request_id=current_request_id(),
+            )
+            self._jobs[job.job_id] = job
+            self._outstanding += 1
+
+        # Run in a copy of the caller's context so the request id (traces) follows the job
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, self._run, job, fn, args)
+        with self._lock:
+            self._futures[job.job_id] = future
+        future.add_done_callback(lambda done: self._cancelled(job) if done.cancelled() else None)
+        return job
+
+    def _cancelled(self, job: AnalysisJob):
+        # A job cancelled while still queued never reaches _run, which does this bookkeeping otherwise
+        job.error = "Cancelled before it started"
+        job.status = "failed"
+        job.finished_at = time.time()
+        with self._lock:
+            self._outstanding -= 1
+
+    def _run(self, job: AnalysisJob, fn: Callable, args: tuple):
+        job.status = "running"
+        job.started_at = time.time()
+
+        def track(event: ProgressEvent):
+            job.stage = event.stage
+
+        try:
+            with progress_subscriber(track):
+                result = fn(*args)
+            if isinstance(result, RevisionReport):
+                job.revision = result
+            else:
+                job.result = result
+            job.status = "completed"
+            return result
+        except Exception as e:
+            logger.error(f"❌ Job {job.job_id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+            raise
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._outstanding -= 1
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def future(self, job_id: str) -> Optional[Future]:
+        with self._lock:
+            return self._futures.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            by_status: Dict[str, int] = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self.queue_depth,
+                "outstanding": self._outstanding,
+                "jobs": by_status,
+            }
+
+    def _prune(self):
+        # Caller holds the lock. Finished jobs are kept for `result_ttl` seconds so clients can poll them.
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+            self._futures.pop(job_id, None)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+job_manager = JobManager(
+    max_workers=settings.ANALYSIS_MAX_CONCURRENCY,
+    queue_depth=settings.ANALYSIS_QUEUE_DEPTH,
+    result_ttl=settings.ANALYSIS_JOB_TTL_SECONDS,
+)
+ANALYSES_IN_FLIGHT.set_function(lambda: job_manager.stats()["outstanding"])
@@ -0,0 +1,344 @@
+"""
+Multi-process knowledge base (KB_MODE=snapshot).
+
+One process at a time, elected with an flock on KB_SNAPSHOT_DIR/.lock, syncs ChromaDB and exports
+it as an immutable, versioned snapshot directory; an atomically replaced CURRENT file points at the
+live one. Every worker memory-maps the snapshot's embeddings read-only (the OS shares the pages
+between processes), searches them exactly with numpy, and swaps to a newer snapshot when CURRENT
+changes, without a restart. Only the builder ever opens chroma_db.
+
+    python -m app.services.kb_snapshot            # build/publish if the sources changed
+    python -m app.services.kb_snapshot --force    # always publish a new snapshot
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+from app.core.config import settings
+from app.services import chroma_service, kb_sync
+
+logger = logging.getLogger("uvicorn.error")
+
+CURRENT = "CURRENT"
+LOCK = ".lock"
+SNAPSHOT_PREFIX = "v"
+
+class SnapshotUnavailable(RuntimeError):
+    """
+    No snapshot could be opened even after ensure(): CURRENT is missing or points at a snapshot
+    that fails to load. Workers never fall back to opening chroma_db themselves.
+    """
+
+def source_hash(embedding_fn=None) -> str:
+    """
+    Identity of what a snapshot was built from: the raw source files, the collection and the
+    embedding model. Hashing bytes (not parsed records) keeps the freshness check cheap.
+    """
+    from app.services.embeddings import model_id
+
+    digest = hashlib.sha256()
+    for path in (kb_sync.MASTER_DATA_PATH, kb_sync.POLICIES_PATH):
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        digest.update(b"\x00")
+    digest.update(chroma_service.collection_name().encode("utf-8"))
+    digest.update(model_id(embedding_fn or chroma_service.get_embedding_fn()).encode("utf-8"))
+    return digest.hexdigest()
+
+class KnowledgeBaseSnapshot:
+    """
+    One published snapshot: records in memory, embeddings memory-mapped read-only.
+    """
+
+    def __init__(self, path: str):
+        import numpy as np
+
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(path, "records.json"), "r", encoding="utf-8") as f:
+            records = json.load(f)
+        self.ids: List[str] = records["ids"]
+        self.documents: List[str] = records["documents"]
+        self.metadatas: List[dict] = records["metadatas"]
+        self.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        self.norms = np.load(os.path.join(path, "norms.npy"), mmap_mode="r")
+        self.space = self.manifest.get("space", "l2")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def query(self, query_embeddings, n_results: int, include: List[str]) -> dict:
+        """
+        Exact nearest neighbours, returned in Chroma's query() shape with its distance for `space`
+        (cosine: 1 - cos, l2: squared euclidean, ip: 1 - dot).
+        """
+        import numpy as np
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        if not len(self):
+            for values in result.values():
+                values.extend([] for _ in range(len(queries)))
+            return {key: value if key in include or key == "ids" else None for key, value in result.items()}
+        dots = queries @ self.embeddings.T
+        if self.space == "cosine":
+            query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            distances = 1.0 - dots / np.maximum(query_norms * self.norms[None, :], 1e-12)
+        elif self.space == "ip":
+            distances = 1.0 - dots
+        else:
+            distances = (queries * queries).sum(axis=1, keepdims=True) + (self.norms ** 2)[None, :] - 2.0 * dots
+        k = min(n_results, len(self))
+        for row in distances:
+            top = np.argpartition(row, k - 1)[:k] if k < len(row) else np.arange(len(row))
+            top = top[np.argsort(row[top], kind="stable")]
+            result["ids"].append([self.ids[i] for i in top])
+            result["documents"].append([self.documents[i] for i in top])
+            result["metadatas"].append([self.metadatas[i] for i in top])
+            result["distances"].append([float(row[i]) for i in top])
+            result["embeddings"].append(np.asarray(self.embeddings[top]))
+        return {key: value if key in include or key == "ids" else None for key, value in result.items()}
+
+class SnapshotStore:
+    """
+    Current snapshot of one directory. The CURRENT pointer is checked at most every
+    KB_SNAPSHOT_POLL_SECONDS; a new target is opened first and then swapped in by assignment,
+    so in-flight queries finish on the snapshot they started with.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._snapshot: Optional[KnowledgeBaseSnapshot] = None
+        self._pointer: Optional[tuple] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.swaps = 0
+        self.builds = 0
+
+    @contextmanager
+    def build_lock(self):
+        """
+        Exclusive, cross-process: held while syncing Chroma and publishing. Released by the kernel
+        if the holder dies, so a crashed builder never blocks the others.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK), "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def current_name(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, CURRENT), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def current_manifest(self) -> Optional[dict]:
+        name = self.current_name()
+        if name is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, name, "manifest.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def current(self) -> Optional[KnowledgeBaseSnapshot]:
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < settings.KB_SNAPSHOT_POLL_SECONDS:
+            return snapshot
+        with self._lock:
+            self._checked_at = now
+            try:
+                stat = os.stat(os.path.join(self.directory, CURRENT))
+                pointer = (stat.st_ino, stat.st_mtime_ns)
+            except OSError:
+                return self._snapshot
+            if pointer != self._pointer:
+                name = self.current_name()
+                if name is not None and (self._snapshot is None or name != self._snapshot.name):
+                    try:
+                        self._snapshot = KnowledgeBaseSnapshot(os.path.join(self.directory, name))
+                        self.swaps += 1
+                        logger.info(f"📚 KB snapshot {name} opened ({len(self._snapshot)} entries, memory-mapped)")
+                    except (OSError, ValueError, KeyError) as e:
+                        # Keep serving the previous snapshot; the pointer is retried next poll
+                        logger.error(f"Failed to open KB snapshot {name}: {e}")
+                        return self._snapshot
+                self._pointer = pointer
+            return self._snapshot
+
+    def is_ready(self) -> bool:
+        return self._snapshot is not None
+
+    def ensure(self, force: bool = False) -> dict:
+        """
+        Startup path for every worker: opens the current snapshot, building one first only if
+        it is missing or stale. Workers that find a fresh snapshot never take the lock.
+        """
+        desired = source_hash()
+        manifest = self.current_manifest()
+        if force or manifest is None or manifest.get("source_hash") != desired:
+            with self.build_lock():
+                # Another worker may have published while we waited for the lock
+                manifest = self.current_manifest()
+                if force or manifest is None or manifest.get("source_hash") != desired:
+                    manifest = self._build(desired)
+        self._checked_at = 0.0
+        self.current()
+        return manifest
+
+    def sync(self, dry_run: bool = False) -> dict:
+        """
+        /admin/kb/sync in snapshot mode: incremental Chroma sync plus a new snapshot, under the lock.
+        Other workers pick the snapshot up on their next poll.
+        """
+        with self.build_lock():
+            if dry_run:
+                try:
+                    return kb_sync.sync_knowledge_base(dry_run=True)
+                finally:
+                    self._release_chroma()
+            manifest = self._build(source_hash())
+        self._checked_at = 0.0
+        self.current()
+        return {"snapshot": manifest["name"], **manifest.get("sync", {})}
+
+    def _build(self, desired_hash: str) -> dict:
+        """
+        Syncs Chroma and publishes a new snapshot. Caller holds the build lock. `desired_hash` is
+        taken before the sources are read: a file edited mid-build can only make the snapshot look
+        stale (one extra rebuild), never make stale content look fresh.
+        """
+        import numpy as np
+
+        start_time = time.perf_counter()
+        try:
+            collection = chroma_service.get_collection()
+            report = kb_sync.sync_knowledge_base(collection)
+            ids, documents, metadatas, vectors = [], [], [], []
+            offset, page_size = 0, 1000
+            while True:
+                page = collection.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+                ids += page["ids"]
+                documents += page["documents"]
+                metadatas += page["metadatas"]
+                vectors += list(page["embeddings"])
+                if len(page["ids"]) < page_size:
+                    break
+                offset += page_size
+            space = (collection.configuration.get("hnsw") or {}).get("space", "l2")
+        finally:
+            self._release_chroma()
+
+        embeddings = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.directory)
+        try:
+            _save(os.path.join(staging, "embeddings.npy"), lambda f: np.save(f, embeddings))
+            _save(os.path.join(staging, "norms.npy"), lambda f: np.save(f, np.linalg.norm(embeddings, axis=1)))
+            _save(os.path.join(staging, "records.json"), lambda f: f.write(json.dumps(
+                {"ids": ids, "documents": documents, "metadatas": metadatas}, ensure_ascii=False
+            ).encode("utf-8")))
+            name = f"{SNAPSHOT_PREFIX}{self._next_version():06d}-{desired_hash[:8]}"
+            manifest = {
+                "name": name, "source_hash": desired_hash, "collection": chroma_service.collection_name(),
+                "space": space, "count": len(ids), "dimensions": int(embeddings.shape[1]) if len(ids) else 0,
+                "created_at": time.time(), "builder_pid": os.getpid(), "sync": report,
+            }
+            _save(os.path.join(staging, "manifest.json"), lambda f: f.write(json.dumps(manifest, indent=2).encode("utf-8")))
+            os.rename(staging, os.path.join(self.directory, name))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        # Publish: write-then-rename, so readers see either the old pointer or the new one
+        _save(os.path.join(self.directory, CURRENT + ".tmp"), lambda f: f.write(name.encode("utf-8")))
+        os.replace(os.path.join(self.directory, CURRENT + ".tmp"), os.path.join(self.directory, CURRENT))
+        self.builds += 1
+        self._collect_garbage(name)
+        logger.info(f"📚 KB snapshot {name} published: {len(ids)} entries in {time.perf_counter() - start_time:.2f}s")
+        return manifest
+
+    def _release_chroma(self):
+        # The builder doesn't keep Chroma's index in RAM either, and the next builder (maybe
+        # another process) must not race against handles cached here
+        chroma_service.reset_chroma()
+        try:
+            from chromadb.api.client import SharedSystemClient
+
+            SharedSystemClient.clear_system_cache()
+        except Exception:
+            pass
+
+    def _snapshot_names(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(SNAPSHOT_PREFIX) and os.path.isdir(os.path.join(self.directory, name))
+        )
+
+    def _next_version(self) -> int:
+        names = self._snapshot_names()
+        return int(names[-1][len(SNAPSHOT_PREFIX):].split("-", 1)[0]) + 1 if names else 1
+
+    def _collect_garbage(self, current: str):
+        # Workers still mapping a deleted snapshot keep reading it (the inode lives until unmapped)
+        stale = [name for name in self._snapshot_names() if name != current]
+        for name in stale[: max(0, len(stale) - max(0, settings.KB_SNAPSHOT_KEEP - 1))]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def query(self, query_texts: List[str], n_results: int, include: List[str]) -> dict:
+        snapshot = self.current()
+        if snapshot is None:
+            self.ensure()
+            snapshot = self.current()
+        if snapshot is None:
+            raise SnapshotUnavailable(
+                f"No KB snapshot could be opened in {self.directory} (CURRENT -> {self.current_name()!r})"
+            )
+        embedding_fn = chroma_service.get_embedding_fn()
+        return snapshot.query(embedding_fn.embed_query(list(query_texts)), n_results, include)
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "mode": settings.KB_MODE,
+            "directory": self.directory,
+            "snapshot": snapshot.name if snapshot is not None else None,
+            "entries": len(snapshot) if snapshot is not None else 0,
+            "space": snapshot.space if snapshot is not None else None,
+            "published": self.current_name(),
+            "swaps": self.swaps,
+            "builds": self.builds,
+        }
+
+def _save(path: str, write):
+    with open(path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+kb_snapshots = SnapshotStore(settings.KB_SNAPSHOT_DIR)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and publish a BARI knowledge base snapshot.")
+    parser.add_argument("--force", action="store_true", help="Publish even if the sources did not change.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(kb_snapshots.ensure(force=args.force), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Incremental knowledge-base sync: master data + policies -> ChromaDB.
+
+Every source document gets a content hash stored in its metadata. A sync only
+embeds documents that are new or whose hash changed, upserts them in batches,
+and deletes entries whose source disappeared.
+
+    python -m app.services.kb_sync            # apply changes
+    python -m app.services.kb_sync --dry-run  # only report what would change
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+from app.core.config import settings, DATA_DIR
+from app.services.chroma_service import get_collection
+
+logger = logging.getLogger("uvicorn.error")
+
+MASTER_DATA_PATH = os.path.join(DATA_DIR, "bari_master_data.json")
+POLICIES_PATH = os.path.join(DATA_DIR, "bari_policies.txt")
+
+_sync_lock = threading.Lock()
+
+def content_hash(text: str, metadata: dict) -> str:
+    payload = json.dumps({"text": text, "metadata": metadata}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def build_documents(master_data_path: Optional[str] = None, policies_path: Optional[str] = None) -> Dict[str, dict]:
+    """
+    Renders every source record as a KB document: {id: {"document", "metadata"}}.
+    """
+    master_data_path = master_data_path or MASTER_DATA_PATH
+    policies_path = policies_path or POLICIES_PATH
+    docs: Dict[str, dict] = {}
+
+    def add(doc_id: str, text: str, metadata: dict):
+        metadata = dict(metadata)
+        metadata["content_hash"] = content_hash(text, metadata)
+        docs[doc_id] = {"document": text, "metadata": metadata}
+
+    # 1. Master Data (from JSON)
+    with open(master_data_path, "r", encoding="utf-8") as f:
+        master_data = json.load(f)
+
+    for vendor in master_data.get("vendors", []):
+        text = f"Vendor: {vendor['name']} (ID: {vendor['id']}). Category: {vendor['category']}. specialty: {vendor.get('specialty', 'N/A')}. Rating: {vendor.get('rating', 'N/A')}"
+        add(f"vendor_{vendor['id']}", text, {"type": "vendor", "id": vendor['id'], "name": vendor['name']})
+
+    for cc in master_data.get("cost_centers", []):
+        text = f"Cost Center: {cc['description']} (ID: {cc['id']}). Area: {cc['area']}"
+        add(f"cc_{cc['id']}", text, {"type": "cost_center", "id": cc['id'], "desc": cc['description']})
+
+    # 2. Policies (from TXT), split by sections (Double Newlines).
+    # Ids come from the section content so inserting a section doesn't shift (and re-embed) the rest.
+    with open(policies_path, "r", encoding="utf-8") as f:
+        policies_text = f.read()
+
+    for section in policies_text.split("\n\n"):
+        section = section.strip()
+        if section:
+            section_id = hashlib.sha256(section.encode("utf-8")).hexdigest()[:16]
+            add(f"policy_{section_id}", section, {"type": "policy", "source": "bari_policies.txt"})
+
+    return docs
+
+def _existing_hashes(collection, page_size: int) -> Dict[str, Optional[str]]:
+    hashes: Dict[str, Optional[str]] = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        ids = page["ids"]
+        for doc_id, metadata in zip(ids, page["metadatas"]):
+            hashes[doc_id] = (metadata or {}).get("content_hash")
+        if len(ids) < page_size:
+            return hashes
+        offset += page_size
+
+def sync_knowledge_base(collection=None, dry_run: bool = False, batch_size: Optional[int] = None) -> dict:
+    """
+    Brings the collection in line with the source files. Returns a change report.
+    """
+    batch_size = batch_size or settings.KB_SYNC_BATCH_SIZE
+    with _sync_lock:
+        start_time = time.time()
+        collection = collection or get_collection()
+        desired = build_documents()
+        existing = _existing_hashes(collection, page_size=max(batch_size, 1000))
+
+        to_upsert = [
+            doc_id for doc_id, doc in desired.items()
+            if existing.get(doc_id) != doc["metadata"]["content_hash"]
+        ]
+        to_delete = [doc_id for doc_id in existing if doc_id not in desired]
+        report = {
+            "added": sum(1 for doc_id in to_upsert if doc_id not in existing),
+            "updated": sum(1 for doc_id in to_upsert if doc_id in existing),
+            "deleted": len(to_delete),
+            "unchanged": len(desired) - len(to_upsert),
+            "dry_run": dry_run,
+        }
+
+        if not dry_run:
+            # One embedding round trip per batch instead of one per document.
+            for i in range(0, len(to_upsert), batch_size):
+                batch = to_upsert[i:i + batch_size]
+                collection.upsert(
+                    ids=batch,
+                    documents=[desired[doc_id]["document"] for doc_id in batch],
+                    metadatas=[desired[doc_id]["metadata"] for doc_id in batch],
+                )
+            for i in range(0, len(to_delete), batch_size):
+                collection.delete(ids=to_delete[i:i + batch_size])
+
+        report["total"] = len(desired)
+        report["elapsed_s"] = round(time.time() - start_time, 3)
+        logger.info(f"📚 KB sync: {report}")
+        return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync BARI master data and policies into ChromaDB.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change.")
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(sync_knowledge_base(dry_run=args.dry_run, batch_size=args.batch_size), indent=2))
+
+if __name__ == "__main__":
+    main()
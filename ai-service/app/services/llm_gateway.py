@@ -0,0 +1,258 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+from app.core.config import settings
+from app.core.metrics import LLM_CALL_DURATION
+
+logger = logging.getLogger("uvicorn.error")
+
+# Every Gemini call (chat and embeddings) goes through a gateway so the whole process shares one
+# quota budget: a token bucket for request rate, a cap on calls in flight, jittered backoff on
+# quota/availability errors, a deadline per call and single-flight for identical prompts.
+
+# Only quota, availability and timeout failures are retried: by HTTP status when the error (or the
+# error it wraps, e.g. ChatGoogleGenerativeAIError around a google.genai APIError) carries one,
+# otherwise by exception type. A generic wrapper or a 400/500 is a real failure and is not retried.
+RETRYABLE_STATUS_CODES = {408, 429, 503, 504}
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded", "GatewayTimeout",
+    "GoogleRateLimitError", "ConnectionError", "TimeoutError", "ReadTimeout", "ConnectTimeout",
+}
+
+class GatewayDeadlineExceeded(TimeoutError):
+    """
+    Raised when a call could not finish (including waits and retries) before its deadline.
+    """
+
+def status_code(error: BaseException) -> Optional[int]:
+    for value in (getattr(error, "code", None), getattr(error, "status_code", None),
+                  getattr(getattr(error, "response", None), "status_code", None)):
+        # grpc's code() is a method and some libraries use string codes; only HTTP statuses count
+        if isinstance(value, int) and not isinstance(value, bool) and 100 <= value < 600:
+            return value
+    return None
+
+def is_retryable(error: BaseException) -> bool:
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, GatewayDeadlineExceeded):
+            return False
+        code = status_code(error)
+        if code is not None:
+            return code in RETRYABLE_STATUS_CODES
+        if any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+def request_key(*parts: Any) -> str:
+    """
+    Single-flight key for a call: hash of everything that determines its result.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True, ensure_ascii=False, default=str)
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`. rate 0 = unlimited.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """
+        Takes one token, sleeping until one is available. Returns the seconds waited.
+        Raises GatewayDeadlineExceeded if that would take longer than `timeout`.
+        """
+        if not self.rate:
+            return 0.0
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return now - start
+                wait = (1 - self._tokens) / self.rate
+            if timeout is not None and (now - start) + wait > timeout:
+                raise GatewayDeadlineExceeded("Rate limit wait exceeds the call deadline")
+            time.sleep(wait)
+
+class LLMGateway:
+    """
+    Wraps blocking upstream calls: `gateway.call(chain.invoke, inputs, key=...)`.
+    Calls sharing a `key` while one is in flight wait for that one instead of calling upstream.
+    """
+
+    def __init__(self, name: str, rate_per_minute: float, burst: int, max_in_flight: int,
+                 max_retries: int, backoff_base: float, backoff_max: float, deadline: float):
+        self.name = name
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.max_in_flight = max(1, max_in_flight)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "calls": 0, "upstream_calls": 0, "coalesced": 0, "retries": 0,
+            "failures": 0, "deadline_exceeded": 0, "in_flight": 0, "peak_in_flight": 0,
+        }
+        self._throttled_s = 0.0
+
+    def call(self, fn: Callable, *args, key: Optional[str] = None, deadline: Optional[float] = None):
+        """
+        Runs `fn(*args)` under the rate limit, in-flight cap, retry policy and deadline (seconds, 0 = none).
+        """
+        deadline = self.deadline if deadline is None else deadline
+        expires_at = time.monotonic() + deadline if deadline else None
+        self._count("calls")
+
+        if key is None:
+            return self._call_upstream(fn, args, expires_at)
+
+        with self._lock:
+            leader = self._inflight.get(key)
+            if leader is None:
+                future: Future = Future()
+                self._inflight[key] = future
+        if leader is not None:
+            self._count("coalesced")
+            try:
+                return leader.result(timeout=self._remaining(expires_at))
+            except TimeoutError:
+                self._count("deadline_exceeded")
+                raise GatewayDeadlineExceeded(f"{self.name}: deadline exceeded waiting for an identical call")
+
+        try:
+            result = self._call_upstream(fn, args, expires_at)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def acall(self, fn: Callable, *args, key: Optional[str] = None, deadline: Optional[float] = None):
+        """
+        Async form of `call`. The limits are process-wide (threads and event loops), so the blocking
+        call runs in a worker thread.
+        """
+        return await asyncio.to_thread(self.call, fn, *args, key=key, deadline=deadline)
+
+    def _call_upstream(self, fn: Callable, args: tuple, expires_at: Optional[float]):
+        attempt = 0
+        while True:
+            try:
+                self._throttled(self.bucket.acquire(timeout=self._remaining(expires_at)))
+                if not self._slots.acquire(timeout=self._remaining(expires_at)):
+                    raise GatewayDeadlineExceeded(f"{self.name}: no free slot before the deadline")
+            except GatewayDeadlineExceeded:
+                self._count("deadline_exceeded")
+                raise
+
+            self._enter()
+            start_time = time.perf_counter()
+            try:
+                result = fn(*args)
+                LLM_CALL_DURATION.observe(time.perf_counter() - start_time, gateway=self.name, outcome="ok")
+                return result
+            except Exception as e:
+                retryable = is_retryable(e)
+                LLM_CALL_DURATION.observe(
+                    time.perf_counter() - start_time, gateway=self.name, outcome="retryable_error" if retryable else "error"
+                )
+                if not retryable or attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                # Full jitter: spreads retries of a throttled burst instead of re-synchronizing them
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                remaining = self._remaining(expires_at)
+                if remaining is not None and delay >= remaining:
+                    self._count("deadline_exceeded")
+                    raise GatewayDeadlineExceeded(f"{self.name}: deadline exceeded after {attempt + 1} attempts: {e}") from e
+                logger.warning(f"⏳ {self.name} call failed ({type(e).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                self._count("retries")
+            finally:
+                self._leave()
+                self._slots.release()
+            attempt += 1
+            time.sleep(delay)
+
+    @staticmethod
+    def _remaining(expires_at: Optional[float]) -> Optional[float]:
+        if expires_at is None:
+            return None
+        return max(0.0, expires_at - time.monotonic())
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _throttled(self, seconds: float):
+        with self._lock:
+            self._throttled_s += seconds
+
+    def _enter(self):
+        with self._lock:
+            self._counters["upstream_calls"] += 1
+            self._counters["in_flight"] += 1
+            self._counters["peak_in_flight"] = max(self._counters["peak_in_flight"], self._counters["in_flight"])
+
+    def _leave(self):
+        with self._lock:
+            self._counters["in_flight"] -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "rate_per_minute": self.bucket.rate * 60,
+                "max_in_flight": self.max_in_flight,
+                "throttled_s": round(self._throttled_s, 3),
+            }
+
+llm_gateway = LLMGateway(
+    "gemini",
+    rate_per_minute=settings.LLM_RATE_PER_MINUTE,
+    burst=settings.LLM_BURST,
+    max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+    max_retries=settings.LLM_MAX_RETRIES,
+    backoff_base=settings.LLM_BACKOFF_BASE_SECONDS,
+    backoff_max=settings.LLM_BACKOFF_MAX_SECONDS,
+    deadline=settings.LLM_CALL_DEADLINE_SECONDS,
+)
+
+embedding_gateway = LLMGateway(
+    "embeddings",
+    rate_per_minute=settings.EMBEDDING_RATE_PER_MINUTE,
+    burst=settings.LLM_BURST,
+    max_in_flight=settings.EMBEDDING_MAX_IN_FLIGHT,
+    max_retries=settings.LLM_MAX_RETRIES,
+    backoff_base=settings.LLM_BACKOFF_BASE_SECONDS,
+    backoff_max=settings.LLM_BACKOFF_MAX_SECONDS,
+    deadline=settings.LLM_CALL_DEADLINE_SECONDS,
+)
@@ -0,0 +1,285 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.core.config import settings, DATA_DIR
+from app.core.metrics import MASTER_DATA_RESOLUTIONS
+from app.models import ContractSchema
+
+logger = logging.getLogger("uvicorn.error")
+
+MASTER_DATA_PATH = os.path.join(DATA_DIR, "bari_master_data.json")
+
+# Deterministic ERP field resolution: exact id / name / tax-id maps plus a trigram index for
+# fuzzy names, rebuilt when bari_master_data.json changes. Resolving a contract costs dict
+# lookups and a few posting-list scans, no LLM or embedding call.
+
+LEGAL_SUFFIXES = re.compile(r"\b(s\s?a\s?s|s\s?a|ltda|limitada|e\s?u|s\s?en\s?c|co|cia|y\s?cia)\b")
+NON_ALNUM = re.compile(r"[^a-z0-9]+")
+TAX_ID = re.compile(r"\b(\d{3}\.?\d{3}\.?\d{3})(?:\s*-\s*\d)?\b")
+
+def normalize_name(name: str) -> str:
+    """
+    Accent/case/punctuation-insensitive name with legal suffixes (S.A.S., LTDA...) removed.
+    """
+    text = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode("ascii").lower()
+    text = NON_ALNUM.sub(" ", text)
+    text = LEGAL_SUFFIXES.sub(" ", text)
+    return " ".join(text.split())
+
+def normalize_tax_id(tax_id: str) -> str:
+    # NIT without separators or verification digit: "901.234.567-8" -> "901234567"
+    match = TAX_ID.search(tax_id or "")
+    return match.group(1).replace(".", "") if match else ""
+
+def trigrams(text: str) -> List[str]:
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+class EntityIndex:
+    """
+    One master-data table: records by id, by normalized name, and a trigram -> row postings index.
+    """
+
+    def __init__(self, records: List[dict], id_field: str, name_field: str):
+        self.records = records
+        self.id_field = id_field
+        self.name_field = name_field
+        self.by_id: Dict[str, int] = {}
+        self.by_name: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.grams: List[int] = []
+        self.postings: Dict[str, List[int]] = {}
+        for row, record in enumerate(records):
+            self.by_id[str(record.get(id_field, "")).strip().upper()] = row
+            name = normalize_name(record.get(name_field, ""))
+            self.names.append(name)
+            self.by_name.setdefault(name, row)
+            grams = set(trigrams(name)) if name else set()
+            self.grams.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(row)
+        # Trigrams shared by a large share of the table ("  s", "de ") carry no signal and
+        # dominate scan time at 100k+ rows; they are skipped unless nothing else is left.
+        self.max_posting = max(1000, len(records) // 20)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, entity_id: Optional[str]) -> Optional[dict]:
+        row = self.by_id.get(str(entity_id or "").strip().upper())
+        return self.records[row] if row is not None else None
+
+    def match(self, name: str, min_score: float) -> Optional[Tuple[dict, float]]:
+        """
+        Best record for a free-text name: exact normalized name first, then trigram Dice score.
+        """
+        query = normalize_name(name)
+        if not query:
+            return None
+        row = self.by_name.get(query)
+        if row is not None:
+            return self.records[row], 1.0
+        query_grams = set(trigrams(query))
+        postings = [self.postings[g] for g in query_grams if g in self.postings]
+        selective = [p for p in postings if len(p) <= self.max_posting] or sorted(postings, key=len)[:2]
+        counts = Counter()
+        for posting in selective:
+            counts.update(posting)
+        # Postings only nominate candidates; the score uses every trigram of the candidate
+        best_row, best_score = None, 0.0
+        for row, _ in counts.most_common(32):
+            score = 2 * len(query_grams & set(trigrams(self.names[row]))) / (len(query_grams) + self.grams[row])
+            if score > best_score:
+                best_row, best_score = row, score
+        if best_row is None or best_score < min_score:
+            return None
+        return self.records[best_row], round(best_score, 3)
+
+class MasterDataSnapshot:
+    """
+    Immutable view of one version of the master data file.
+    """
+
+    def __init__(self, raw: dict, mtime: float = 0.0):
+        self.raw = raw
+        self.mtime = mtime
+        self.loaded_at = time.time()
+        self.purchasing_org = str(raw.get("purchasing_org") or "") or None
+        self.organization = normalize_name(raw.get("organization", ""))
+        self.vendors = EntityIndex(raw.get("vendors", []), "id", "name")
+        self.cost_centers = EntityIndex(raw.get("cost_centers", []), "id", "description")
+        self.material_groups = EntityIndex(raw.get("material_groups", []), "code", "description")
+        self.vendors_by_tax_id: Dict[str, dict] = {}
+        for vendor in self.vendors.records:
+            tax_id = normalize_tax_id(vendor.get("tax_id", ""))
+            if tax_id:
+                self.vendors_by_tax_id.setdefault(tax_id, vendor)
+
+    def match_vendor(self, texts: Iterable[str]) -> Optional[Tuple[dict, float, str]]:
+        """
+        Best vendor among several candidate strings (contract parties): NIT first, then name.
+        """
+        best = None
+        for text in texts:
+            name = normalize_name(text)
+            # BARI itself is always a party; it is never the vendor
+            if self.organization and name and (name in self.organization or self.organization in name):
+                continue
+            for match in TAX_ID.finditer(text or ""):
+                vendor = self.vendors_by_tax_id.get(match.group(1).replace(".", ""))
+                if vendor is not None:
+                    return vendor, 1.0, "tax_id"
+            found = self.vendors.match(text, settings.MASTER_DATA_MIN_MATCH_SCORE)
+            if found and (best is None or found[1] > best[1]):
+                best = (found[0], found[1], "exact_name" if found[1] == 1.0 else "fuzzy_name")
+        return best
+
+class MasterDataIndex:
+    """
+    Holds the current snapshot and swaps in a new one when the file's mtime changes
+    (checked at most every MASTER_DATA_RELOAD_INTERVAL_SECONDS). Only the first load blocks;
+    later ones are built by a background thread while callers keep the previous snapshot.
+    """
+
+    def __init__(self, path: str = MASTER_DATA_PATH):
+        self.path = path
+        self._snapshot: Optional[MasterDataSnapshot] = None
+        # _lock guards counters and the builder handoff only; builds run under _build_lock
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._builder: Optional[threading.Thread] = None
+        self._checked_at = 0.0
+        self.reloads = 0
+        self.reload_errors = 0
+        self.resolutions = 0
+        self.corrections = 0
+
+    def current(self) -> MasterDataSnapshot:
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < settings.MASTER_DATA_RELOAD_INTERVAL_SECONDS:
+            return snapshot
+        self._checked_at = now
+        mtime = self._mtime()
+        if snapshot is None:
+            with self._build_lock:
+                if self._snapshot is None:
+                    self._build(mtime)
+            return self._snapshot
+        if mtime != snapshot.mtime:
+            self._reload_in_background(mtime)
+        return snapshot
+
+    def _mtime(self) -> float:
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return 0.0
+
+    def _reload_in_background(self, mtime: float):
+        with self._lock:
+            if self._builder is not None and self._builder.is_alive():
+                return
+            self._builder = threading.Thread(target=self._rebuild, args=(mtime,), name="master-data-reload", daemon=True)
+            self._builder.start()
+
+    def _rebuild(self, mtime: float):
+        with self._build_lock:
+            if self._snapshot is None or self._snapshot.mtime != mtime:
+                self._build(mtime)
+
+    def _build(self, mtime: float):
+        start_time = time.perf_counter()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError) as e:
+            # A half-written or broken file must not wipe out the index we already have
+            logger.error(f"Failed to load master data: {e}")
+            with self._lock:
+                self.reload_errors += 1
+            if self._snapshot is None:
+                self._snapshot = MasterDataSnapshot({}, mtime)
+            return
+        snapshot = MasterDataSnapshot(raw, mtime)
+        # Readers pick up whichever snapshot the attribute points at; the swap is one assignment
+        self._snapshot = snapshot
+        with self._lock:
+            self.reloads += 1
+        logger.info(
+            f"📇 Master data indexed: {len(snapshot.vendors)} vendors, "
+            f"{len(snapshot.cost_centers)} cost centers in {time.perf_counter() - start_time:.2f}s"
+        )
+
+    def resolve(self, contract: ContractSchema) -> List[dict]:
+        """
+        Validates the ERP fields of an extracted contract against master data and fixes them
+        in place. Returns the corrections made ({field, from, to, method}).
+        """
+        snapshot = self.current()
+        corrections = []
+
+        def correct(field: str, value: Optional[str], method: str):
+            previous = getattr(contract, field)
+            if value == previous:
+                return
+            setattr(contract, field, value)
+            corrections.append({"field": field, "from": previous, "to": value, "method": method})
+
+        # Vendor: the contract parties are the ground truth. A valid id from the model is only
+        # overridden by an unambiguous match (NIT or exact name); an unknown id by any match.
+        matched = snapshot.match_vendor(contract.parties)
+        current_vendor = snapshot.vendors.get(contract.erp_vendor_id)
+        if matched is not None and matched[0] is not current_vendor:
+            vendor, _, method = matched
+            if current_vendor is None or method != "fuzzy_name":
+                correct("erp_vendor_id", vendor["id"], method)
+        elif matched is None and contract.erp_vendor_id and current_vendor is None:
+            correct("erp_vendor_id", None, "unknown_id")
+
+        for field, table, hint in (
+            ("erp_cost_center", snapshot.cost_centers, contract.title),
+            ("erp_material_group", snapshot.material_groups, contract.title),
+        ):
+            value = getattr(contract, field)
+            if value and table.get(value) is not None:
+                continue
+            found = table.match(hint, settings.MASTER_DATA_MIN_MATCH_SCORE) if hint else None
+            if found is not None:
+                correct(field, found[0][table.id_field], "fuzzy_name")
+            elif value:
+                correct(field, None, "unknown_id")
+
+        if snapshot.purchasing_org and contract.erp_purchasing_org != snapshot.purchasing_org:
+            correct("erp_purchasing_org", snapshot.purchasing_org, "master_data")
+
+        for item in corrections:
+            MASTER_DATA_RESOLUTIONS.inc(field=item["field"], method=item["method"])
+        with self._lock:
+            self.resolutions += 1
+            self.corrections += len(corrections)
+        if corrections:
+            logger.info(f"📇 ERP fields corrected from master data: {corrections}")
+        return corrections
+
+    def stats(self) -> dict:
+        snapshot = self.current()
+        return {
+            "path": self.path,
+            "vendors": len(snapshot.vendors),
+            "cost_centers": len(snapshot.cost_centers),
+            "material_groups": len(snapshot.material_groups),
+            "loaded_at": snapshot.loaded_at,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "resolutions": self.resolutions,
+            "corrections": self.corrections,
+        }
+
+master_data_index = MasterDataIndex()
@@ -0,0 +1,309 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+from app.core.config import settings
+from app.models import ContractSchema
+
+logger = logging.getLogger("uvicorn.error")
+
+# Writes analyzed contracts into the schema.sql tables (contracts + milestones) in one transaction
+# per contract: one upsert for the contract row, one batched upsert for all its milestones, stale
+# milestones deleted. DATABASE_URL picks the backend: postgresql://... (Neon; needs `psycopg`,
+# imported lazily) or sqlite:///path, a local stand-in that creates the schema.sql tables itself.
+
+CONTRACT_COLUMNS = (
+    "id", "title", "summary", "client", "type", "status", "progress", "value", "start_date", "end_date",
+    "location", "phase", "health", "risk_level", "project_manager_id", "pdf_url",
+)
+# Owned by the app once the contract exists (progress, PM assignment...): a re-analysis never resets them
+CONTRACT_INSERT_ONLY = ("status", "progress", "phase", "health", "project_manager_id")
+MILESTONE_COLUMNS = ("id", "contract_id", "name", "phase", "due_date", "status", "value", "deliverables")
+
+# The SQLite stand-in runs schema.sql itself (seed users included, so the default project manager
+# "1" satisfies its foreign key); only the Postgres-only defaults are translated
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "schema.sql")
+SQLITE_TRANSLATIONS = (("DEFAULT NOW()", "DEFAULT CURRENT_TIMESTAMP"), ("'[]'::jsonb", "'[]'"))
+
+def sqlite_schema(path: str = SCHEMA_PATH) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        script = f.read()
+    for postgres, sqlite in SQLITE_TRANSLATIONS:
+        script = script.replace(postgres, sqlite)
+    return script
+
+class PersistenceNotConfigured(RuntimeError):
+    pass
+
+def milestone_id(contract_id: str, action_id: str) -> str:
+    # Same id the frontend used when it inserted milestones itself
+    return f"{contract_id}-{action_id}"
+
+def contract_row(contract: ContractSchema, project_manager_id: Optional[str] = None, pdf_url: Optional[str] = None) -> tuple:
+    summary = contract.audit_summary
+    if contract.audit_insights:
+        summary += "\n\nINSIGHTS DE AUDITORÍA:\n" + "\n".join(contract.audit_insights)
+    values = {
+        "id": contract.contract_id, "title": contract.title, "summary": summary, "client": contract.client,
+        "type": contract.type, "status": contract.status, "progress": contract.progress, "value": contract.value,
+        "start_date": contract.start_date, "end_date": contract.end_date, "location": contract.location,
+        "phase": contract.current_phase.lower(), "health": contract.health, "risk_level": contract.risk_level,
+        "project_manager_id": project_manager_id or contract.project_manager_id, "pdf_url": pdf_url or contract.pdf_url,
+    }
+    return tuple(values[column] for column in CONTRACT_COLUMNS)
+
+def milestone_rows(contract: ContractSchema) -> List[tuple]:
+    rows = {}
+    for phase in contract.phases:
+        for action in phase.actions:
+            # A repeated action id would make one upsert statement touch the same row twice
+            rows.setdefault(milestone_id(contract.contract_id, action.id), (
+                milestone_id(contract.contract_id, action.id), contract.contract_id, action.description,
+                phase.name.lower(), action.due_date, action.status, action.milestone_value,
+                json.dumps(action.deliverables, ensure_ascii=False),
+            ))
+    return list(rows.values())
+
+def upsert_sql(table: str, columns: tuple, source: str, update: tuple, extra: str = "") -> str:
+    assignments = ", ".join(f"{column} = excluded.{column}" for column in update)
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) {source} "
+        f"ON CONFLICT (id) DO UPDATE SET {assignments}{extra}"
+    )
+
+# A re-analysis yields "pending" everywhere; it must not undo progress already recorded
+MILESTONE_STATUS_UPDATE = ", status = CASE WHEN excluded.status = 'pending' THEN milestones.status ELSE excluded.status END"
+MILESTONE_UPDATE = ("contract_id", "name", "phase", "due_date", "value", "deliverables")
+CONTRACT_UPDATE = tuple(c for c in CONTRACT_COLUMNS if c != "id" and c not in CONTRACT_INSERT_ONLY)
+
+class ConnectionPool:
+    """
+    Fixed-size pool: connections are created on demand up to `size` and reused (LIFO, so idle
+    ones at the bottom can time out server-side without being handed out first).
+    """
+
+    def __init__(self, factory: Callable, size: int):
+        self.factory = factory
+        self.size = max(1, size)
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    conn = self.factory()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        except Exception:
+            # The connection may be mid-transaction or broken: replace it rather than reuse it
+            try:
+                conn.close()
+            finally:
+                with self._lock:
+                    self._created -= 1
+            raise
+        self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+class SQLiteBackend:
+    """
+    Local stand-in for Neon: same tables and upsert statements, `?` placeholders.
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        with self._schema_lock:
+            if not self._schema_ready:
+                # schema.sql is not idempotent (plain CREATE TABLE, seed rows): run it on a new database only
+                exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contracts'").fetchone()
+                if not exists:
+                    conn.executescript(sqlite_schema())
+                self._schema_ready = True
+        return conn
+
+    def write_contract(self, conn, contract: tuple, milestones: List[tuple]) -> int:
+        contract_sql = upsert_sql(
+            "contracts", CONTRACT_COLUMNS, f"VALUES ({', '.join('?' * len(CONTRACT_COLUMNS))})", CONTRACT_UPDATE,
+            ", updated_at = CURRENT_TIMESTAMP",
+        )
+        milestone_sql = upsert_sql(
+            "milestones", MILESTONE_COLUMNS, f"VALUES ({', '.join('?' * len(MILESTONE_COLUMNS))})", MILESTONE_UPDATE,
+            MILESTONE_STATUS_UPDATE,
+        )
+        with conn:  # one transaction; rolled back on error
+            conn.execute(contract_sql, contract)
+            conn.executemany(milestone_sql, milestones)
+            keep = {row[0] for row in milestones}
+            existing = [r[0] for r in conn.execute("SELECT id FROM milestones WHERE contract_id = ?", (contract[0],))]
+            stale = [(mid,) for mid in existing if mid not in keep]
+            conn.executemany("DELETE FROM milestones WHERE id = ?", stale)
+        return len(stale)
+
+class PostgresBackend:
+    """
+    Neon / PostgreSQL through psycopg 3. Milestones are streamed with COPY into a temporary
+    staging table and upserted from it with a single INSERT ... SELECT.
+    """
+    name = "postgres"
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def connect(self):
+        import psycopg
+
+        return psycopg.connect(self.url)
+
+    def write_contract(self, conn, contract: tuple, milestones: List[tuple]) -> int:
+        contract_sql = upsert_sql(
+            "contracts", CONTRACT_COLUMNS, f"VALUES ({', '.join(['%s'] * len(CONTRACT_COLUMNS))})", CONTRACT_UPDATE,
+            ", updated_at = NOW()",
+        )
+        columns = ", ".join(MILESTONE_COLUMNS)
+        milestone_sql = upsert_sql(
+            "milestones", MILESTONE_COLUMNS, f"SELECT {columns} FROM milestones_stage", MILESTONE_UPDATE,
+            MILESTONE_STATUS_UPDATE,
+        )
+        with conn.transaction(), conn.cursor() as cur:
+            cur.execute(contract_sql, contract)
+            cur.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS milestones_stage "
+                "(LIKE milestones INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+            )
+            with cur.copy(f"COPY milestones_stage ({columns}) FROM STDIN") as copy:
+                for row in milestones:
+                    copy.write_row(row)
+            cur.execute(milestone_sql)
+            cur.execute(
+                "DELETE FROM milestones m WHERE m.contract_id = %s "
+                "AND NOT EXISTS (SELECT 1 FROM milestones_stage s WHERE s.id = m.id)",
+                (contract[0],),
+            )
+            return cur.rowcount
+
+def build_backend(url: str):
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith(("postgres://", "postgresql://")):
+        return PostgresBackend(url)
+    raise ValueError(f"Unsupported DATABASE_URL scheme: {url.split(':', 1)[0]!r} (expected postgresql:// or sqlite:///)")
+
+class ContractRepository:
+    """
+    Bulk writer for analyzed contracts. Disabled (enabled=False) while DATABASE_URL is empty.
+    """
+
+    def __init__(self, url: str, pool_size: int):
+        self.url = url
+        self.pool_size = pool_size
+        self._backend = None
+        self._pool: Optional[ConnectionPool] = None
+        self._lock = threading.Lock()
+        self.contracts_written = 0
+        self.milestones_written = 0
+        self.milestones_deleted = 0
+        self.write_seconds = 0.0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    def _get_pool(self) -> ConnectionPool:
+        if not self.enabled:
+            raise PersistenceNotConfigured("DATABASE_URL is not set")
+        with self._lock:
+            if self._pool is None:
+                self._backend = build_backend(self.url)
+                self._pool = ConnectionPool(self._backend.connect, self.pool_size)
+            return self._pool
+
+    def save_contract(self, contract: ContractSchema, project_manager_id: Optional[str] = None,
+                      pdf_url: Optional[str] = None) -> dict:
+        """
+        Upserts the contract and all its actions as milestones in one transaction.
+        """
+        pool = self._get_pool()
+        row = contract_row(contract, project_manager_id, pdf_url)
+        milestones = milestone_rows(contract)
+        start_time = time.perf_counter()
+        try:
+            with pool.connection() as conn:
+                deleted = self._backend.write_contract(conn, row, milestones)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        elapsed = time.perf_counter() - start_time
+        with self._lock:
+            self.contracts_written += 1
+            self.milestones_written += len(milestones)
+            self.milestones_deleted += deleted
+            self.write_seconds += elapsed
+        logger.info(
+            f"💾 Contract {contract.contract_id} persisted: {len(milestones)} milestones "
+            f"({deleted} stale removed) in {elapsed * 1000:.0f}ms"
+        )
+        return {
+            "contract_id": contract.contract_id, "milestones": len(milestones), "deleted": deleted,
+            "elapsed_s": round(elapsed, 4),
+        }
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "backend": self._backend.name if self._backend is not None else None,
+                "contracts_written": self.contracts_written,
+                "milestones_written": self.milestones_written,
+                "milestones_deleted": self.milestones_deleted,
+                "errors": self.errors,
+                "milestones_per_s": round(self.milestones_written / self.write_seconds, 1) if self.write_seconds else 0.0,
+            }
+
+contract_repository = ContractRepository(settings.DATABASE_URL, settings.DATABASE_POOL_SIZE)
@@ -0,0 +1,231 @@
+import logging
+import os
+from typing import List
+from app.core.config import settings
+from app.core.metrics import DOCUMENT_PAGES, PREPROCESS_SAVED_RATIO, PREPROCESS_TOKENS_SAVED, STAGE_DURATION, UPLOAD_BYTES
+from app.models import ClauseCounts, ContractSchema, MilestoneChanges, RevisionReport, RevisionTokens
+from app.services.contract_store import contract_store
+from app.services.extractor import extract_contract_data, extract_revised_clauses, is_fallback
+from app.services.master_data import master_data_index
+from app.services.persistence import contract_repository
+from app.services.pdf_extractor import DocumentTooLargeError, extract_pdf_pages, join_pages, spool_to_tempfile
+from app.services.preprocess import PreprocessedText, preprocess_pages, restore_citations
+from app.services.progress import report_progress
+from app.services.retrieval import estimate_tokens, split_clauses
+from app.services.revisions import (
+    ClauseDiff, RevisionConflict, UnknownContractError, apply_revision, clause_baseline, fingerprint,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+class EmptyDocumentError(ValueError):
+    """
+    Raised when no usable text could be extracted from an upload.
+    """
+
+def spool_upload(src, filename: str) -> str:
+    """
+    Copies an upload stream to a temp file (bounded by PDF_MAX_BYTES) and returns its path.
+    """
+    suffix = os.path.splitext(filename or "")[1].lower()
+    return spool_to_tempfile(src, suffix=suffix)
+
+def extract_pages(filename: str, path: str) -> List[str]:
+    """
+    Turns a spooled upload into per-page text (PDF or text/markdown).
+    Text files are split on form feeds; without them they count as a single page.
+    """
+    # Determine file type (basic check)
+    if filename and filename.lower().endswith(".pdf"):
+        logger.info(f"📄 Processing PDF...")
+        return extract_pdf_pages(path)
+    # Assume text/md
+    if settings.PDF_MAX_BYTES and os.path.getsize(path) > settings.PDF_MAX_BYTES:
+        raise DocumentTooLargeError(f"Upload exceeds {settings.PDF_MAX_BYTES} bytes.")
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().split("\f")
+
+def pages_to_text(filename: str, pages: List[str]) -> str:
+    if filename and filename.lower().endswith(".pdf"):
+        return join_pages(pages)
+    return "\f".join(pages)
+
+def page_separator(filename: str) -> str:
+    return "\n" if filename and filename.lower().endswith(".pdf") else "\f"
+
+def preprocess_document(filename: str, pages: List[str]) -> PreprocessedText:
+    with STAGE_DURATION.time(stage="preprocess"):
+        document = preprocess_pages(pages, page_separator(filename))
+    stats = document.stats()
+    PREPROCESS_TOKENS_SAVED.observe(stats["tokens_saved"])
+    PREPROCESS_SAVED_RATIO.observe(stats["saved_ratio"])
+    logger.info(
+        f"✂️ Preprocessed: {stats['original_tokens']} -> {stats['tokens']} tokens "
+        f"(-{stats['saved_ratio']:.0%}, {stats['removed_lines']} header/footer lines, "
+        f"{stats['duplicate_blocks']} duplicate blocks)"
+    )
+    return document
+
+def extract_text(filename: str, path: str) -> str:
+    """
+    Turns a spooled upload into plain text (PDF or text/markdown).
+    """
+    return pages_to_text(filename, extract_pages(filename, path))
+
+def analyze_document(filename: str, path: str) -> ContractSchema:
+    """
+    Full analysis pipeline: PDF -> text -> RAG context -> Gemini -> ContractSchema.
+    Blocking; call it from a worker thread, never from the event loop.
+    """
+    logger.info(f"\n--- 📥 Receiving File: {filename} ---")
+    report_progress("received", f"Processing {filename}", filename=filename)
+    UPLOAD_BYTES.observe(os.path.getsize(path))
+    with STAGE_DURATION.time(stage="pdf_extraction"):
+        pages = extract_pages(filename, path)
+    DOCUMENT_PAGES.observe(len(pages))
+    text = pages_to_text(filename, pages)
+
+    if not text.strip():
+        raise EmptyDocumentError("Could not extract text from file.")
+    report_progress("pages_extracted", f"{len(pages)} pages extracted", pages=len(pages), chars=len(text))
+
+    document = None
+    if settings.PREPROCESS_ENABLED:
+        document = preprocess_document(filename, pages)
+        text = document.text
+        report_progress(
+            "pages_extracted", f"Preprocessed: {document.tokens_saved} tokens saved",
+            pages=len(pages), **document.stats(),
+        )
+
+    logger.info(f"✅ Text Extracted ({len(text)} chars). Sending to Gemini...")
+    logger.info(f"📝 Preview: {text[:200]}...\n")
+
+    contract_data = extract_contract_data(text)
+    if document is not None:
+        # The model quoted the cleaned text; point citations back at the original wording
+        restore_citations(contract_data, document)
+    # Vendor / cost center / material group ids checked against master data (hallucinated ids fixed)
+    with STAGE_DURATION.time(stage="master_data"):
+        master_data_index.resolve(contract_data)
+    logger.info(f"🤖 Gemini Analysis Complete. ID: {contract_data.contract_id}")
+    if is_fallback(contract_data):
+        logger.warning("⚠️ Extraction fell back to demo data; the contract is not stored nor persisted")
+    else:
+        # Kept server-side so /check-milestone only needs contract_id + action_id; the clause
+        # baseline lets a later amendment re-extract only what it changed. A re-upload returns
+        # the stored contract (statuses included) instead of replacing it.
+        stored, _ = contract_store.add(contract_data.model_copy(deep=True), baseline=clause_baseline(text, contract_data))
+        with stored.lock:
+            contract_data = stored.contract.model_copy(deep=True)
+        persist_contract(contract_data)
+    report_progress("done", "Analysis complete", contract_id=contract_data.contract_id)
+    return contract_data
+
+def persist_contract(contract: ContractSchema):
+    if settings.PERSIST_ANALYZED_CONTRACTS and contract_repository.enabled:
+        try:
+            with STAGE_DURATION.time(stage="persist"):
+                contract_repository.save_contract(contract)
+        except Exception as e:
+            # The analysis itself succeeded; POST /contracts/{id}/persist can retry the write
+            logger.error(f"Failed to persist contract {contract.contract_id}: {e}")
+
+def revise_document(contract_id: str, filename: str, path: str) -> RevisionReport:
+    """
+    Amendment ("otrosí") of a stored contract: the new text is diffed clause by clause against
+    the stored baseline and only the changed clauses go to Gemini. The result is merged into the
+    stored contract in place (same contract_id; untouched actions keep id, status and evidence).
+    Returns the revision report. Blocking; call it from a worker thread.
+    """
+    stored = contract_store.get(contract_id)
+    if stored is None:
+        raise UnknownContractError(f"Contract {contract_id} not found")
+    with stored.lock:
+        baseline = stored.baseline
+        base_version = stored.version
+    if baseline is None:
+        raise RevisionConflict(f"Contract {contract_id} has no clause baseline; analyze it with /analyze-contract first")
+
+    logger.info(f"\n--- 📑 Revision of {contract_id}: {filename} ---")
+    report_progress("received", f"Processing revision {filename}", filename=filename, contract_id=contract_id)
+    UPLOAD_BYTES.observe(os.path.getsize(path))
+    with STAGE_DURATION.time(stage="pdf_extraction"):
+        pages = extract_pages(filename, path)
+    text = pages_to_text(filename, pages)
+    if not text.strip():
+        raise EmptyDocumentError("Could not extract text from file.")
+    report_progress("pages_extracted", f"{len(pages)} pages extracted", pages=len(pages), chars=len(text))
+    document = preprocess_document(filename, pages) if settings.PREPROCESS_ENABLED else None
+    if document is not None:
+        text = document.text
+
+    with STAGE_DURATION.time(stage="revision_diff"):
+        clauses = split_clauses(text)
+        diff = ClauseDiff(baseline["clauses"], [fingerprint(clause) for clause in clauses])
+    changed_text = "\n\n".join(clauses[j] for j in diff.added)
+    logger.info(
+        f"📑 Revision diff: {len(diff.moved)}/{len(clauses)} clauses unchanged, {len(diff.removed)} removed, "
+        f"{len(diff.added)} added (~{estimate_tokens(changed_text) if changed_text else 0} of {estimate_tokens(text)} tokens)"
+    )
+
+    extractions = []
+    if changed_text:
+        extractions = extract_revised_clauses(changed_text)
+        if document is not None:
+            for extraction in extractions:
+                restore_citations(extraction, document)
+
+    with stored.lock:
+        if stored.baseline is not baseline or contract_store.get(contract_id) is not stored:
+            raise RevisionConflict(f"Contract {contract_id} changed while the revision was being processed; retry")
+        report = {
+            "added": [], "changed": [], "removed": [], "reopened": [], "reweighted": False,
+            "unchanged": sum(len(phase.actions) for phase in stored.contract.phases),
+        }
+        contract = None
+        if diff.changed:
+            with STAGE_DURATION.time(stage="revision_merge"):
+                stored.baseline, report = apply_revision(stored.contract, baseline, diff, clauses, extractions)
+                stored.reindex()
+            contract_store.commit(stored)
+            if settings.PERSIST_ANALYZED_CONTRACTS:
+                contract = stored.contract.model_copy(deep=True)
+        version = stored.version
+    if contract is not None:
+        persist_contract(contract)
+
+    result = RevisionReport(
+        contract_id=contract_id,
+        base_version=base_version,
+        version=version,
+        clauses=ClauseCounts(total=len(clauses), unchanged=len(diff.moved), removed=len(diff.removed), added=len(diff.added)),
+        milestones=MilestoneChanges(**report),
+        tokens=RevisionTokens(revision=estimate_tokens(changed_text) if changed_text else 0, document=estimate_tokens(text)),
+    )
+    report_progress("done", "Revision applied", contract_id=contract_id, version=version)
+    return result
+
+def analyze_spooled_document(filename: str, path: str) -> ContractSchema:
+    """
+    Same as analyze_document, but takes ownership of `path` and deletes it when done.
+    """
+    try:
+        return analyze_document(filename, path)
+    finally:
+        _unlink(path)
+
+def revise_spooled_document(contract_id: str, filename: str, path: str) -> RevisionReport:
+    """
+    Same as revise_document, but takes ownership of `path` and deletes it when done.
+    """
+    try:
+        return revise_document(contract_id, filename, path)
+    finally:
+        _unlink(path)
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
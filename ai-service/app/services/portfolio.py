@@ -0,0 +1,164 @@
+import re
+import threading
+import unicodedata
+from collections import Counter
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+# Portfolio aggregates (risk distribution, average health, per-phase completion, overdue
+# milestones) kept as running totals. The contract store reports every change as a per-contract
+# summary; the old summary is subtracted and the new one added, so reads never scan contracts.
+
+MONTHS = {
+    "ene": 1, "jan": 1, "feb": 2, "mar": 3, "abr": 4, "apr": 4, "may": 5, "jun": 6, "jul": 7,
+    "ago": 8, "aug": 8, "sep": 9, "set": 9, "oct": 10, "nov": 11, "dic": 12, "dec": 12,
+}
+DAY_MONTH_YEAR = re.compile(r"(\d{1,2})\s*(?:de\s+)?([a-z]+)\.?\s*(?:de\s+|del\s+)?(\d{4})")
+ISO_DATE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+
+def due_ordinal(text: Optional[str]) -> Optional[int]:
+    """
+    Parses the model's due dates ("15 Ene 2026", "15 de enero de 2026", "2026-01-15") to a
+    date ordinal; None when it is not a date ("Mes 3", "Al finalizar la obra").
+    """
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii").lower()
+    try:
+        match = ISO_DATE.search(text)
+        if match:
+            return date(int(match.group(1)), int(match.group(2)), int(match.group(3))).toordinal()
+        match = DAY_MONTH_YEAR.search(text)
+        if match and match.group(2)[:3] in MONTHS:
+            return date(int(match.group(3)), MONTHS[match.group(2)[:3]], int(match.group(1))).toordinal()
+    except ValueError:
+        return None
+    return None
+
+class ContractAggregate:
+    """
+    One contract's contribution to the portfolio totals.
+    """
+    __slots__ = ("risk_level", "health", "current_phase", "phases", "due")
+
+    def __init__(self, risk_level: str, health: int, current_phase: str, phases: Dict[str, Tuple[int, int]]):
+        self.risk_level = risk_level
+        self.health = health
+        self.current_phase = current_phase
+        self.phases = phases
+        # Open (not completed) actions with a parseable due date -> date ordinal
+        self.due: Dict[str, int] = {}
+
+    @property
+    def done(self) -> bool:
+        return all(completed >= total for completed, total in self.phases.values())
+
+class Portfolio:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contracts: Dict[str, ContractAggregate] = {}
+        self._risk = Counter()
+        self._current_phase = Counter()
+        self._health_sum = 0
+        self._phase_completed = Counter()
+        self._phase_total = Counter()
+        self._done = 0
+        # Open milestones per due date; the overdue count is adjusted on every change and
+        # recomputed from this histogram only when the day rolls over
+        self._open_due = Counter()
+        self._overdue = 0
+        self._overdue_day = date.today().toordinal()
+        self.updates = 0
+
+    def update(self, contract_id: str, risk_level: str, health: int, current_phase: str,
+               phases: Dict[str, Tuple[int, int]], due: Dict[str, Optional[str]], full: bool = False):
+        """
+        Replaces a contract's contribution. `phases` is {phase: (completed, total)}; `due` maps
+        action ids to their due date, or None once completed. With full=True `due` lists every
+        action of the contract; otherwise only the actions that changed.
+        """
+        parsed = {action_id: due_ordinal(text) if text is not None else None for action_id, text in due.items()}
+        with self._lock:
+            previous = self._contracts.get(contract_id)
+            entry = ContractAggregate(risk_level, health, current_phase, phases)
+            if previous is not None:
+                self._apply(previous, -1)
+                if full:
+                    self._set_due(previous, {action_id: None for action_id in previous.due})
+                else:
+                    entry.due = previous.due
+            self._set_due(entry, parsed)
+            self._apply(entry, 1)
+            self._contracts[contract_id] = entry
+            self.updates += 1
+
+    def remove(self, contract_id: str):
+        with self._lock:
+            previous = self._contracts.pop(contract_id, None)
+            if previous is not None:
+                self._apply(previous, -1)
+                self._set_due(previous, {action_id: None for action_id in previous.due})
+
+    def _apply(self, entry: ContractAggregate, sign: int):
+        self._risk[entry.risk_level] += sign
+        self._current_phase[entry.current_phase] += sign
+        self._health_sum += sign * entry.health
+        for name, (completed, total) in entry.phases.items():
+            self._phase_completed[name] += sign * completed
+            self._phase_total[name] += sign * total
+        if entry.done:
+            self._done += sign
+
+    def _set_due(self, entry: ContractAggregate, changes: Dict[str, Optional[int]]):
+        for action_id, ordinal in changes.items():
+            old = entry.due.pop(action_id, None)
+            if old is not None:
+                self._count_due(old, -1)
+            if ordinal is not None:
+                entry.due[action_id] = ordinal
+                self._count_due(ordinal, 1)
+
+    def _count_due(self, ordinal: int, delta: int):
+        self._open_due[ordinal] += delta
+        if not self._open_due[ordinal]:
+            del self._open_due[ordinal]
+        if ordinal < self._overdue_day:
+            self._overdue += delta
+
+    def _overdue_today(self) -> int:
+        today = date.today().toordinal()
+        if today != self._overdue_day:
+            self._overdue_day = today
+            self._overdue = sum(count for ordinal, count in self._open_due.items() if ordinal < today)
+        return self._overdue
+
+    def snapshot(self) -> dict:
+        """
+        Portfolio totals; cost is independent of the number of contracts and milestones.
+        """
+        with self._lock:
+            contracts = len(self._contracts)
+            total = sum(self._phase_total.values())
+            completed = sum(self._phase_completed.values())
+            return {
+                "contracts": contracts,
+                "contracts_completed": self._done,
+                "average_health": round(self._health_sum / contracts, 1) if contracts else None,
+                "risk_levels": {level: count for level, count in self._risk.items() if count},
+                "current_phases": {phase: count for phase, count in self._current_phase.items() if count},
+                "milestones": {
+                    "total": total,
+                    "completed": completed,
+                    "progress": round(completed / total, 4) if total else 0.0,
+                    "overdue": self._overdue_today(),
+                },
+                "phases": {
+                    name: {
+                        "completed": self._phase_completed[name],
+                        "total": self._phase_total[name],
+                        "progress": round(self._phase_completed[name] / self._phase_total[name], 4) if self._phase_total[name] else 0.0,
+                    }
+                    for name in self._phase_total
+                    if self._phase_total[name]
+                },
+            }
+
+portfolio = Portfolio()
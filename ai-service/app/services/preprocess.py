@@ -0,0 +1,289 @@
+import bisect
+import logging
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.models import ContractSchema
+from app.services.retrieval import CLAUSE_START, estimate_tokens
+
+logger = logging.getLogger("uvicorn.error")
+
+# Prompt-size reduction before the LLM: repeated page headers/footers, page numbers, hyphenation,
+# whitespace noise and verbatim-duplicated clauses are removed. The cleaned text keeps an offset
+# map back to the original so citations quoted from it can be restored to the original wording.
+
+WORD = re.compile(r"\S+")
+DIGITS = re.compile(r"\d+")
+PAGE_NUMBER = re.compile(
+    r"^[-–—\s]*(p[aá]g(ina)?\.?\s*)?\d+(\s*(de|/|of)\s*\d+)?[-–—\s]*$", re.IGNORECASE
+)
+# A page counter inside a header/footer ("Documento confidencial - Página 3 de 40")
+PAGE_MARKER = re.compile(r"\b(p[aá]g(ina)?|page|hoja|folio)\.?\s*(n[o°º]\.?\s*)?\d+", re.IGNORECASE)
+
+# Running headers/footers are short; long lines at a page edge are body text
+EDGE_LINE_MAX_CHARS = 160
+
+Span = Tuple[int, int]
+
+class PreprocessedText:
+    """
+    Cleaned text plus a run-length offset map: cleaned[clean_starts[i]:...] was copied from
+    original[orig_starts[i]:...] (single separators map to the whitespace they replaced).
+    """
+
+    def __init__(self, text: str, original: str, clean_starts: List[int], orig_starts: List[int],
+                 removed_lines: int = 0, duplicate_blocks: int = 0, joined_hyphens: int = 0):
+        self.text = text
+        self.original = original
+        self.clean_starts = clean_starts
+        self.orig_starts = orig_starts
+        self.removed_lines = removed_lines
+        self.duplicate_blocks = duplicate_blocks
+        self.joined_hyphens = joined_hyphens
+
+    @property
+    def original_tokens(self) -> int:
+        return estimate_tokens(self.original)
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.original_tokens - self.tokens)
+
+    def to_original_offset(self, position: int) -> int:
+        if not self.clean_starts:
+            return position
+        i = max(0, bisect.bisect_right(self.clean_starts, position) - 1)
+        return self.orig_starts[i] + (position - self.clean_starts[i])
+
+    def original_span(self, start: int, end: int) -> str:
+        """
+        Original text behind cleaned[start:end] (headers removed in between come back with it).
+        """
+        if end <= start:
+            return ""
+        return self.original[self.to_original_offset(start):self.to_original_offset(end - 1) + 1]
+
+    def find_original(self, quote: str) -> Optional[str]:
+        """
+        Locates a quote taken from the cleaned text and returns the matching original text.
+        Falls back to a whitespace-insensitive match; None when the quote is not in the text.
+        """
+        quote = (quote or "").strip()
+        if not quote:
+            return None
+        start = self.text.find(quote)
+        if start >= 0:
+            return self.original_span(start, start + len(quote))
+        words = WORD.findall(quote)
+        if not words:
+            return None
+        match = re.search(r"\s*".join(re.escape(word) for word in words), self.text)
+        if match is None:
+            return None
+        return self.original_span(match.start(), match.end())
+
+    def stats(self) -> dict:
+        original_tokens = self.original_tokens
+        return {
+            "original_chars": len(self.original),
+            "chars": len(self.text),
+            "original_tokens": original_tokens,
+            "tokens": self.tokens,
+            "tokens_saved": self.tokens_saved,
+            "saved_ratio": round(self.tokens_saved / original_tokens, 4) if original_tokens else 0.0,
+            "removed_lines": self.removed_lines,
+            "duplicate_blocks": self.duplicate_blocks,
+            "joined_hyphens": self.joined_hyphens,
+        }
+
+def _line_key(line: str) -> str:
+    # "Página 3 de 40" and "Página 4 de 40" are the same footer. Digits are only folded on page
+    # counters: body lines that differ by a number ("la póliza 1." / "la póliza 2.") are not repeats
+    key = " ".join(line.split()).lower()
+    if PAGE_NUMBER.match(line) or PAGE_MARKER.search(line):
+        return DIGITS.sub("#", key)
+    return key
+
+def _page_lines(original: str, page_starts: List[int], page_ends: List[int]) -> List[List[Span]]:
+    pages = []
+    for start, end in zip(page_starts, page_ends):
+        lines = []
+        position = start
+        for line in original[start:end].split("\n"):
+            lines.append((position, position + len(line)))
+            position += len(line) + 1
+        pages.append(lines)
+    return pages
+
+def _edge_lines(original: str, lines: List[Span], count: int) -> Dict[Span, int]:
+    """
+    Short non-blank lines near the top/bottom of a page -> slot (0, 1, ... from the top;
+    -1, -2, ... from the bottom).
+    """
+    non_blank = [span for span in lines if original[span[0]:span[1]].strip()]
+    slots = {}
+    for i, span in enumerate(non_blank[:count]):
+        slots[span] = i
+    for i, span in enumerate(reversed(non_blank[-count:])):
+        slots.setdefault(span, -(i + 1))
+    return {span: slot for span, slot in slots.items() if span[1] - span[0] <= EDGE_LINE_MAX_CHARS}
+
+def _repeated_edge_keys(original: str, pages: List[List[Span]]) -> set:
+    """
+    (slot, normalized line) pairs found in the same slot on enough pages to be headers or footers.
+    """
+    if len(pages) < settings.PREPROCESS_MIN_REPEAT_PAGES:
+        return set()
+    counts = Counter()
+    for lines in pages:
+        edges = _edge_lines(original, lines, settings.PREPROCESS_EDGE_LINES)
+        counts.update({(slot, _line_key(original[s:e])) for (s, e), slot in edges.items()})
+    min_pages = max(settings.PREPROCESS_MIN_REPEAT_PAGES, math.ceil(settings.PREPROCESS_REPEAT_RATIO * len(pages)))
+    return {pair for pair, count in counts.items() if count >= min_pages}
+
+def preprocess_pages(pages: List[str], separator: str = "\n") -> PreprocessedText:
+    """
+    Cleans per-page text for the LLM. `separator` is how the caller joins pages, so offsets
+    refer to the same original text the rest of the pipeline sees.
+    """
+    original = separator.join(pages)
+    page_starts, position = [], 0
+    for page in pages:
+        page_starts.append(position)
+        position += len(page) + len(separator)
+    page_ends = [start + len(page) for start, page in zip(page_starts, pages)]
+    page_lines = _page_lines(original, page_starts, page_ends)
+
+    # 1. Drop repeated headers/footers (first occurrence kept: it often names the contract) and
+    #    bare page numbers. Lines become lists of word spans; None marks a blank line.
+    repeated = _repeated_edge_keys(original, page_lines)
+    seen_repeated = set()
+    removed_lines = 0
+    lines: List[Optional[List[Span]]] = []
+    for page in page_lines:
+        edges = _edge_lines(original, page, settings.PREPROCESS_EDGE_LINES)
+        for start, end in page:
+            line = original[start:end]
+            if not line.strip():
+                lines.append(None)
+                continue
+            slot = edges.get((start, end))
+            if slot is not None:
+                key = _line_key(line)
+                if PAGE_NUMBER.match(line) or ((slot, key) in repeated and key in seen_repeated):
+                    removed_lines += 1
+                    continue
+                if (slot, key) in repeated:
+                    seen_repeated.add(key)
+            lines.append([(start + m.start(), start + m.end()) for m in WORD.finditer(line)])
+
+    # 2. Collapse clauses/paragraphs that repeat verbatim (boilerplate pasted into every annex)
+    lines, duplicate_blocks = _drop_duplicate_blocks(original, lines)
+
+    # 3. Emit: one space between words, one blank line at most, hyphenated line breaks joined
+    parts: List[str] = []
+    clean_starts: List[int] = []
+    orig_starts: List[int] = []
+    length = 0
+
+    def emit(piece: str, orig_start: int):
+        nonlocal length
+        parts.append(piece)
+        clean_starts.append(length)
+        orig_starts.append(orig_start)
+        length += len(piece)
+
+    joined_hyphens = 0
+    glue_next = False
+    previous_end: Optional[int] = None
+    pending_blank = False
+    for index, words in enumerate(lines):
+        if words is None or not words:
+            pending_blank = previous_end is not None
+            continue
+        if previous_end is not None and not glue_next:
+            emit("\n\n" if pending_blank else "\n", previous_end)
+        pending_blank = False
+        for position, (start, end) in enumerate(words):
+            if position:
+                emit(" ", words[position - 1][1])
+            glue_next = False
+            is_last = position == len(words) - 1
+            if is_last and _hyphenated(original, start, end) and _continues_lowercase(original, lines, index):
+                emit(original[start:end - 1], start)
+                glue_next = True
+                joined_hyphens += 1
+            else:
+                emit(original[start:end], start)
+            previous_end = end
+    if parts:
+        emit("\n", previous_end)
+
+    return PreprocessedText(
+        "".join(parts), original, clean_starts, orig_starts,
+        removed_lines=removed_lines, duplicate_blocks=duplicate_blocks, joined_hyphens=joined_hyphens,
+    )
+
+def _hyphenated(original: str, start: int, end: int) -> bool:
+    return end - start > 2 and original[end - 1] == "-" and original[end - 2].isalpha()
+
+def _continues_lowercase(original: str, lines: List[Optional[List[Span]]], index: int) -> bool:
+    following = lines[index + 1] if index + 1 < len(lines) else None
+    if not following:
+        return False
+    return original[following[0][0]].islower()
+
+def _drop_duplicate_blocks(original: str, lines: List[Optional[List[Span]]]):
+    """
+    Splits lines into blocks (blank lines / clause headings, as retrieval.split_clauses does)
+    and drops any block at least PREPROCESS_MIN_DUPLICATE_CHARS long already seen verbatim.
+    """
+    blocks: List[List[Optional[List[Span]]]] = []
+    current: List[Optional[List[Span]]] = []
+    for words in lines:
+        starts_clause = bool(words) and CLAUSE_START.match(original[words[0][0]:words[-1][1]])
+        if words is None or starts_clause:
+            if current:
+                blocks.append(current)
+            current = [] if words is None else [words]
+            if words is None:
+                blocks.append([None])
+            continue
+        current.append(words)
+    if current:
+        blocks.append(current)
+
+    seen = set()
+    kept: List[Optional[List[Span]]] = []
+    dropped = 0
+    for block in blocks:
+        text = " ".join(original[s:e] for words in block if words for s, e in words)
+        if len(text) >= settings.PREPROCESS_MIN_DUPLICATE_CHARS:
+            key = text.lower()
+            if key in seen:
+                dropped += 1
+                continue
+            seen.add(key)
+        kept.extend(block)
+    return kept, dropped
+
+def restore_citations(contract: ContractSchema, document: PreprocessedText) -> int:
+    """
+    Rewrites each action's citation (quoted from the cleaned text) with the original wording.
+    Returns how many citations were found in the document.
+    """
+    found = 0
+    for phase in contract.phases:
+        for action in phase.actions:
+            original = document.find_original(action.citation) if action.citation else None
+            if original is None:
+                continue
+            found += 1
+            action.citation = original
+    return found
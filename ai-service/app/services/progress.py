@@ -0,0 +1,43 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Tuple
+from app.models import ProgressEvent, ProgressStage
+
+logger = logging.getLogger("uvicorn.error")
+
+ProgressCallback = Callable[[ProgressEvent], None]
+
+# Subscribers for the analysis running in the current context (thread or task).
+# Pipeline code calls report_progress() unconditionally; with no subscribers it's a no-op.
+_subscribers: ContextVar[Tuple[ProgressCallback, ...]] = ContextVar("progress_subscribers", default=())
+
+def report_progress(stage: ProgressStage, message: str = "", **data):
+    subscribers = _subscribers.get()
+    if not subscribers:
+        return
+    event = ProgressEvent(stage=stage, message=message, data=data, timestamp=time.time())
+    for callback in subscribers:
+        try:
+            callback(event)
+        except Exception as e:
+            logger.warning(f"Progress subscriber failed on '{stage}': {e}")
+
+@contextmanager
+def progress_subscriber(callback: ProgressCallback):
+    """
+    Delivers every progress event reported inside the block to `callback`.
+    Nested subscribers stack, so a job tracker and an SSE stream can watch the same run.
+    """
+    token = _subscribers.set(_subscribers.get() + (callback,))
+    try:
+        yield
+    finally:
+        _subscribers.reset(token)
+
+def format_sse(event: ProgressEvent) -> str:
+    """
+    Server-sent-events frame: the stage is the event name, the full event is the data.
+    """
+    return f"event: {event.stage}\ndata: {event.model_dump_json()}\n\n"
@@ -0,0 +1,159 @@
+import logging
+import re
+from typing import Dict, List, Optional, Sequence
+from app.core.config import settings
+from app.core.metrics import STAGE_DURATION
+from app.services.chroma_service import query_kb_hits
+
+logger = logging.getLogger("uvicorn.error")
+
+# Lines that open a new clause in Colombian contracts ("CLÁUSULA QUINTA", "PARÁGRAFO", "3.2 ...").
+CLAUSE_START = re.compile(
+    r"^\s*(CL[AÁ]USULA|ART[IÍ]CULO|PAR[AÁ]GRAFO|CAP[IÍ]TULO|\d+(\.\d+)*[.)-]\s)",
+    re.IGNORECASE,
+)
+
+def estimate_tokens(text: str) -> int:
+    # ~4 chars per token for Spanish text with Gemini's tokenizer; good enough for budgeting.
+    return max(1, len(text) // 4)
+
+def split_clauses(text: str) -> List[str]:
+    """
+    Splits a contract into clause-sized blocks on blank lines and clause headings.
+    """
+    blocks: List[str] = []
+    current: List[str] = []
+    for line in text.splitlines():
+        if not line.strip() or CLAUSE_START.match(line):
+            if current:
+                blocks.append("\n".join(current).strip())
+                current = []
+            if not line.strip():
+                continue
+        current.append(line)
+    if current:
+        blocks.append("\n".join(current).strip())
+    return [block for block in blocks if block]
+
+def split_into_windows(text: str, window_chars: Optional[int] = None, max_windows: Optional[int] = None) -> List[str]:
+    """
+    Packs consecutive clauses into windows of at most `window_chars` characters.
+    Past `max_windows`, windows are sampled evenly across the document so the query
+    count (and embedding cost) stays flat no matter how long the contract is.
+    """
+    window_chars = window_chars or settings.RETRIEVAL_WINDOW_CHARS
+    max_windows = max_windows or settings.RETRIEVAL_MAX_WINDOWS
+
+    windows: List[str] = []
+    current = ""
+    for clause in split_clauses(text):
+        # Oversized clauses are hard-split so no query exceeds the embedding input limit.
+        pieces = [clause[i:i + window_chars] for i in range(0, len(clause), window_chars)]
+        for piece in pieces:
+            if current and len(current) + len(piece) + 1 > window_chars:
+                windows.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        windows.append(current)
+
+    if len(windows) > max_windows:
+        step = (len(windows) - 1) / (max_windows - 1) if max_windows > 1 else 0
+        windows = [windows[round(i * step)] for i in range(max_windows)]
+    return windows
+
+def _similarity_matrix(embeddings: List[Optional[Sequence[float]]]):
+    """
+    Pairwise cosine similarity of every candidate, computed once with numpy.
+    Also returns which rows had an embedding; rows without one (or with a zero vector) are all zeros.
+    """
+    import numpy as np
+
+    present = np.array([embedding is not None for embedding in embeddings], dtype=bool)
+    if not present.any():
+        return np.zeros((len(embeddings), len(embeddings)), dtype=np.float32), present
+    dimensions = len(next(embedding for embedding in embeddings if embedding is not None))
+    vectors = np.zeros((len(embeddings), dimensions), dtype=np.float32)
+    for i, embedding in enumerate(embeddings):
+        if embedding is not None:
+            vectors[i] = embedding
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+    return unit @ unit.T, present
+
+def mmr_select(candidates: List[dict], lambda_mult: float, token_budget: int, max_results: int) -> List[dict]:
+    """
+    Maximal Marginal Relevance under a token budget.
+    Each candidate is {"document", "relevance", "embedding"}; relevance is normalized to [0, 1].
+    Redundancy (max similarity to anything already selected) is updated incrementally from one
+    similarity matrix, so each pick is a vector op instead of a Python loop over every pair.
+    """
+    import numpy as np
+
+    if not candidates:
+        return []
+    top = max(c["relevance"] for c in candidates) or 1.0
+    similarity, present = _similarity_matrix([c["embedding"] for c in candidates])
+    relevance = lambda_mult * np.array([c["relevance"] for c in candidates], dtype=np.float64) / top
+    # -inf until something comparable is selected, i.e. max() over an empty set, which counts as 0
+    redundancy = np.full(len(candidates), -np.inf)
+    remaining = np.ones(len(candidates), dtype=bool)
+    selected: List[dict] = []
+    used_tokens = 0
+
+    while remaining.any() and len(selected) < max_results:
+        scores = relevance - (1 - lambda_mult) * np.where(np.isfinite(redundancy), redundancy, 0.0)
+        # argmax keeps the earliest of equal scores, like the original candidate order
+        best = int(np.argmax(np.where(remaining, scores, -np.inf)))
+        remaining[best] = False
+        tokens = estimate_tokens(candidates[best]["document"])
+        if used_tokens + tokens > token_budget:
+            continue
+        selected.append(candidates[best])
+        used_tokens += tokens
+        if present[best]:
+            redundancy[present] = np.maximum(redundancy[present], similarity[best, present])
+    return selected
+
+def retrieve_context(text: str) -> List[str]:
+    """
+    Chunked multi-query retrieval: one batched query for every clause window,
+    hits merged by id, then diversified with MMR under RETRIEVAL_CONTEXT_TOKENS.
+    """
+    with STAGE_DURATION.time(stage="retrieval"):
+        return _retrieve_context(text)
+
+def _retrieve_context(text: str) -> List[str]:
+    windows = split_into_windows(text)
+    if not windows:
+        return []
+
+    hits = query_kb_hits(windows, n_results=settings.RETRIEVAL_RESULTS_PER_WINDOW)
+
+    merged: Dict[str, dict] = {}
+    for q, ids in enumerate(hits["ids"]):
+        for rank, doc_id in enumerate(ids):
+            distance = hits["distances"][q][rank]
+            relevance = 1.0 / (1.0 + distance)
+            entry = merged.get(doc_id)
+            if entry is None:
+                embeddings = hits.get("embeddings")
+                merged[doc_id] = {
+                    "document": hits["documents"][q][rank],
+                    "relevance": relevance,
+                    "embedding": list(embeddings[q][rank]) if embeddings is not None else None,
+                }
+            elif relevance > entry["relevance"]:
+                entry["relevance"] = relevance
+
+    selected = mmr_select(
+        list(merged.values()),
+        lambda_mult=settings.RETRIEVAL_MMR_LAMBDA,
+        token_budget=settings.RETRIEVAL_CONTEXT_TOKENS,
+        max_results=settings.RETRIEVAL_MAX_RESULTS,
+    )
+    logger.info(
+        f"   --> Retrieval: {len(windows)} windows, {len(merged)} unique hits, "
+        f"{len(selected)} selected (~{sum(estimate_tokens(s['document']) for s in selected)} tokens)"
+    )
+    return [s["document"] for s in selected]
@@ -0,0 +1,244 @@
+import bisect
+import hashlib
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, Tuple
+from app.core.config import settings
+from app.models import ActionItem, ContractSchema, Phase, SectionExtraction
+from app.services.contract_store import is_completed
+from app.services.extractor import PHASE_ORDER, _normalize_key, reconcile_milestone_values
+from app.services.retrieval import split_clauses
+
+# Amendments ("otrosí") without a full re-analysis. Every analyzed contract keeps a clause
+# baseline next to it in the contract store: one fingerprint per clause of the text the model
+# saw, plus the clause each action was cited from. A revision is diffed against it clause by
+# clause; only actions anchored in changed clauses are re-extracted and merged back in place.
+
+# Fields taken from the re-extraction and reported when they change (criteria also reopens a
+# completed action). milestone_value is not: a partial extraction weighs actions against the
+# changed clauses only, so weights are kept and added actions get the contract's average.
+COMPARED_FIELDS = ("description", "criteria", "due_date", "deliverables")
+ACTION_NUMBER = re.compile(r"^M(\d+)-C(\d+)$")
+# Leading characters of a normalized citation used to find the clause it was quoted from
+ANCHOR_CHARS = 80
+
+class UnknownContractError(LookupError):
+    """
+    Raised when a revision targets a contract the store doesn't hold.
+    """
+
+class RevisionConflict(RuntimeError):
+    """
+    Raised when a revision can't be diffed: the contract has no clause baseline (it was never
+    analyzed on this server), or it changed while the revision was being extracted.
+    """
+
+def fingerprint(clause: str) -> str:
+    # Accents, case, punctuation and spacing don't count as changes
+    return hashlib.sha1(_normalize_key(clause).encode("utf-8")).hexdigest()[:16]
+
+def anchor_actions(clauses: List[str], actions: List[ActionItem]) -> Dict[str, int]:
+    """
+    Maps action ids to the index of the clause their citation was quoted from.
+    Actions whose citation isn't found are left out (never re-extracted by a revision).
+    """
+    normalized = [_normalize_key(clause) for clause in clauses]
+    starts, position = [], 0
+    for clause in normalized:
+        starts.append(position)
+        position += len(clause) + 1
+    haystack = " ".join(normalized)
+    anchors = {}
+    for action in actions:
+        key = _normalize_key(action.citation or "")[:ANCHOR_CHARS]
+        found = haystack.find(key) if key else -1
+        if found >= 0:
+            anchors[action.id] = bisect.bisect_right(starts, found) - 1
+    return anchors
+
+def clause_baseline(text: str, contract: ContractSchema) -> dict:
+    """
+    What a later revision is diffed against: {"clauses": [fingerprint], "actions": {id: clause index}}.
+    """
+    clauses = split_clauses(text)
+    actions = [action for phase in contract.phases for action in phase.actions]
+    return {"clauses": [fingerprint(clause) for clause in clauses], "actions": anchor_actions(clauses, actions)}
+
+class ClauseDiff:
+    """
+    Clause-level diff between two fingerprint lists: `moved` maps unchanged old clauses to their
+    new index, `removed` holds old clauses that were rewritten or deleted, `added` the new clauses
+    that were rewritten or inserted (the only text a revision sends to the model).
+    """
+
+    def __init__(self, old: List[str], new: List[str]):
+        self.fingerprints = new
+        self.moved: Dict[int, int] = {}
+        self.removed = set()
+        self.added: List[int] = []
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+            if tag == "equal":
+                self.moved.update(zip(range(i1, i2), range(j1, j2)))
+            else:
+                self.removed.update(range(i1, i2))
+                self.added.extend(range(j1, j2))
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.removed or self.added)
+
+def match_actions(old: List[Tuple[Phase, ActionItem]], new: List[Tuple[Phase, ActionItem]],
+                  threshold: float) -> List[Tuple[int, int]]:
+    """
+    Pairs old and re-extracted actions of the same phase by description similarity, best pairs
+    first. Returned in the order of `old`.
+    """
+    old_keys = [(phase.name, _normalize_key(action.description)) for phase, action in old]
+    new_keys = [(phase.name, _normalize_key(action.description)) for phase, action in new]
+    scored = []
+    for i, (old_phase, old_key) in enumerate(old_keys):
+        for j, (new_phase, new_key) in enumerate(new_keys):
+            if old_phase != new_phase:
+                continue
+            matcher = SequenceMatcher(None, old_key, new_key, autojunk=False)
+            if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= threshold:
+                scored.append((ratio, i, j))
+    pairs, used_old, used_new = [], set(), set()
+    for _, i, j in sorted(scored, reverse=True):
+        if i not in used_old and j not in used_new:
+            pairs.append((i, j))
+            used_old.add(i)
+            used_new.add(j)
+    return sorted(pairs)
+
+def apply_revision(contract: ContractSchema, baseline: dict, diff: ClauseDiff, clauses: List[str],
+                   extractions: List[SectionExtraction]) -> Tuple[dict, dict]:
+    """
+    Merges re-extracted actions into `contract` in place and returns (new baseline, report).
+    Actions anchored in unchanged clauses are not touched. Actions from changed clauses are
+    matched to the re-extraction: matches keep id, status and evidence (a completed one whose
+    criteria changed goes back to in-progress); the rest are removed or added with fresh ids.
+    """
+    anchors = baseline.get("actions", {})
+    affected: List[Tuple[Phase, ActionItem]] = [
+        (phase, action) for phase in contract.phases for action in phase.actions
+        if anchors.get(action.id) in diff.removed
+    ]
+    affected_ids = {action.id for _, action in affected}
+    # Changed clauses often restate obligations kept elsewhere; those are not new actions
+    seen = {
+        (phase.name, _normalize_key(action.description))
+        for phase in contract.phases for action in phase.actions if action.id not in affected_ids
+    }
+    candidates: List[Tuple[Phase, ActionItem]] = []
+    for extraction in extractions:
+        for phase in extraction.phases:
+            for action in phase.actions:
+                key = (phase.name, _normalize_key(action.description))
+                if key not in seen:
+                    seen.add(key)
+                    candidates.append((phase, action))
+
+    report = {"added": [], "changed": [], "removed": [], "reopened": []}
+    pairs = match_actions(affected, candidates, settings.REVISION_MATCH_THRESHOLD)
+    revised: List[ActionItem] = []
+    for i, j in pairs:
+        action, update = affected[i][1], candidates[j][1]
+        fields = [field for field in COMPARED_FIELDS if getattr(action, field) != getattr(update, field)]
+        for field in COMPARED_FIELDS + ("insight", "citation"):
+            setattr(action, field, getattr(update, field))
+        if fields:
+            report["changed"].append({"id": action.id, "fields": fields})
+        if "criteria" in fields and is_completed(action.status):
+            action.status = "in-progress"
+            report["reopened"].append(action.id)
+        revised.append(action)
+
+    matched_old = {i for i, _ in pairs}
+    report["removed"] = [action.id for i, (_, action) in enumerate(affected) if i not in matched_old]
+    removed = set(report["removed"])
+    for phase in contract.phases:
+        phase.actions = [action for action in phase.actions if action.id not in removed]
+
+    # Fresh ids continue after the highest number ever used in the phase (kept in the baseline),
+    # so a removed milestone's id (and its status downstream) is never handed to another action
+    next_number = {int(number): used for number, used in baseline.get("numbers", {}).items()}
+    for action_id in [a.id for phase in contract.phases for a in phase.actions] + report["removed"]:
+        match = ACTION_NUMBER.match(action_id)
+        if match:
+            number = int(match.group(1))
+            next_number[number] = max(next_number.get(number, 0), int(match.group(2)))
+
+    matched_new = {j for _, j in pairs}
+    phases = {phase.name: phase for phase in contract.phases}
+    for j, (source, action) in enumerate(candidates):
+        if j in matched_new:
+            continue
+        phase = phases.get(source.name)
+        if phase is None:
+            phase = Phase(name=source.name, description=source.description, actions=[])
+            order = PHASE_ORDER.index(source.name)
+            contract.phases.insert(sum(1 for p in contract.phases if PHASE_ORDER.index(p.name) < order), phase)
+            phases[source.name] = phase
+        number = PHASE_ORDER.index(source.name) + 1
+        next_number[number] = next_number.get(number, 0) + 1
+        action.id = f"M{number}-C{next_number[number]}"
+        action.status = "pending"
+        action.evidence = []
+        action.milestone_value = ""
+        phase.actions.append(action)
+        report["added"].append(action.id)
+        revised.append(action)
+
+    reweighted = bool(report["added"] or report["removed"])
+    if reweighted:
+        reconcile_milestone_values([action for phase in contract.phases for action in phase.actions])
+    if report["added"] or report["removed"] or report["reopened"]:
+        sync_phases(contract)
+
+    # Unchanged clauses carry their actions' anchors to the new numbering; re-extracted actions
+    # are anchored again among the changed clauses
+    new_anchors = {action_id: diff.moved[index] for action_id, index in anchors.items() if index in diff.moved}
+    changed_anchors = anchor_actions([clauses[j] for j in diff.added], revised)
+    new_anchors.update({action_id: diff.added[k] for action_id, k in changed_anchors.items()})
+
+    total = sum(len(phase.actions) for phase in contract.phases)
+    report["unchanged"] = total - len(report["added"]) - len(report["changed"])
+    report["reweighted"] = reweighted
+    new_baseline = {
+        "clauses": diff.fingerprints,
+        "actions": new_anchors,
+        "numbers": {str(number): used for number, used in next_number.items()},
+    }
+    return new_baseline, report
+
+def sync_phases(contract: ContractSchema):
+    """
+    Re-derives phase statuses after a revision added, removed or reopened actions: the current
+    phase becomes the first one with open actions, which can move it back to a completed phase.
+    """
+    if not contract.phases:
+        return
+    names = [phase.name for phase in contract.phases]
+    previous = names.index(contract.current_phase) if contract.current_phase in names else 0
+    current = next(
+        (i for i, phase in enumerate(contract.phases) if not all(is_completed(a.status) for a in phase.actions)), None
+    )
+    if current is None:
+        # Same end state as the milestone workflow: every phase completed, current_phase on the last
+        for phase in contract.phases:
+            phase.status = "COMPLETED"
+        contract.current_phase = names[-1]
+        return
+    contract.current_phase = names[current]
+    for i, phase in enumerate(contract.phases):
+        if i < current:
+            phase.status = "COMPLETED"
+        elif i == current:
+            if current != previous or phase.status == "COMPLETED":
+                phase.status = "ACTIVE"
+        elif phase.status == "COMPLETED":
+            phase.status = "PENDING"
@@ -0,0 +1,274 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import traceback
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, List, Optional
+from pydantic import BaseModel
+from app.core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# Debug traces (prompt / response / exception) per request id. Recording only enqueues references;
+# a background writer serializes them and appends to a size-capped, rotating JSONL file, so the
+# request path never blocks on disk and concurrent requests never overwrite each other.
+
+# Client X-Request-ID values kept as a prefix of the server id (for correlation); anything else is dropped
+CLIENT_REQUEST_ID = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+@contextmanager
+def request_context(request_id: Optional[str] = None):
+    token = _request_id.set(request_id or new_request_id())
+    try:
+        yield _request_id.get()
+    finally:
+        _request_id.reset(token)
+
+def is_sampled(request_id: str, rate: float) -> bool:
+    """
+    Deterministic per request id, so a sampled request keeps all of its traces.
+    """
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    return zlib.crc32(request_id.encode("utf-8")) / 0xFFFFFFFF < rate
+
+def _to_jsonable(value: Any, max_chars: int) -> Any:
+    if isinstance(value, BaseModel):
+        value = value.model_dump(mode="json")
+    if isinstance(value, str):
+        return value if len(value) <= max_chars else value[:max_chars] + f"... [{len(value) - max_chars} chars truncated]"
+    if isinstance(value, dict):
+        return {str(k): _to_jsonable(v, max_chars) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_jsonable(v, max_chars) for v in value]
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    return _to_jsonable(str(value), max_chars)
+
+class TraceSink:
+    """
+    Bounded queue + background writer. When the queue is full new traces are dropped (and counted)
+    rather than slowing the request down.
+    """
+
+    def __init__(self, directory: str, sample_rate: float, max_bytes: int, backups: int,
+                 queue_size: int, max_field_chars: int, recent_requests: int = 256):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backups = max(0, backups)
+        self.max_field_chars = max_field_chars
+        self.recent_requests = recent_requests
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=max(1, queue_size))
+        self._recent: "OrderedDict[str, List[dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, "traces.jsonl")
+
+    def record(self, kind: str, force: bool = False, **fields):
+        """
+        Queues a trace for the current request. `force` bypasses sampling (used for exceptions).
+        """
+        if not settings.TRACE_ENABLED:
+            return
+        request_id = current_request_id() or new_request_id()
+        if not force and not is_sampled(request_id, self.sample_rate):
+            return
+        self._ensure_writer()
+        entry = {"request_id": request_id, "kind": kind, "timestamp": time.time(), "fields": fields}
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            self.recorded += 1
+
+    def record_exception(self, kind: str, error: BaseException, **fields):
+        self.record(
+            kind, force=True, error=f"{type(error).__name__}: {error}",
+            traceback="".join(traceback.format_exception(type(error), error, error.__traceback__)), **fields,
+        )
+
+    def get(self, request_id: str) -> List[dict]:
+        """
+        Traces for a request: recent ones from memory, older ones from the current and rotated files.
+        """
+        with self._lock:
+            recent = self._recent.get(request_id)
+            if recent is not None:
+                return list(recent)
+        found = []
+        # The substring test only skips most lines cheaply; the parsed id must match exactly
+        needle = f'"request_id": {json.dumps(request_id, ensure_ascii=False)}'
+        for path in reversed(self._files()):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if needle not in line:
+                            continue
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        if entry.get("request_id") == request_id:
+                            found.append(entry)
+            except OSError:
+                continue
+        return found
+
+    def flush(self, timeout: float = 5.0):
+        """
+        Waits until everything queued so far has been written (tests, shutdown).
+        """
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": settings.TRACE_ENABLED,
+                "sample_rate": self.sample_rate,
+                "queued": self._queue.qsize(),
+                "recorded": self.recorded,
+                "dropped": self.dropped,
+                "written": self.written,
+                "write_errors": self.write_errors,
+            }
+
+    def _files(self) -> List[str]:
+        # Oldest first: traces.jsonl.N ... traces.jsonl.1, traces.jsonl
+        return [f"{self.path}.{i}" for i in range(self.backups, 0, -1)] + [self.path]
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._drain, name="trace-writer", daemon=True)
+                self._writer.start()
+
+    def _drain(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                # Batch whatever else is already waiting into the same write
+                batch = [entry]
+                while len(batch) < 100:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"Failed to serialize traces: {e}")
+            finally:
+                for _ in range(len(batch)):
+                    self._queue.task_done()
+
+    def _write(self, batch: List[dict]):
+        lines = []
+        for entry in batch:
+            entry["fields"] = _to_jsonable(entry["fields"], self.max_field_chars)
+            lines.append(json.dumps(entry, ensure_ascii=False))
+            with self._lock:
+                self._recent.setdefault(entry["request_id"], []).append(entry)
+                self._recent.move_to_end(entry["request_id"])
+                while len(self._recent) > self.recent_requests:
+                    self._recent.popitem(last=False)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._rotate_if_needed()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            with self._lock:
+                self.written += len(lines)
+        except OSError as e:
+            logger.error(f"Failed to write traces: {e}")
+            with self._lock:
+                self.write_errors += len(lines)
+
+    def _rotate_if_needed(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size < self.max_bytes:
+            return
+        if not self.backups:
+            os.remove(self.path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+def server_request_id(incoming: str) -> str:
+    """
+    The request id is always generated here: it decides sampling and is the key traces are read
+    back by, so two clients sending the same X-Request-ID must not share it. A well-formed client
+    id is kept as a prefix ("<client id>.<server id>") so logs can still be correlated.
+    """
+    if CLIENT_REQUEST_ID.fullmatch(incoming or ""):
+        return f"{incoming}.{new_request_id()}"
+    return new_request_id()
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware: assigns the request id (see server_request_id), exposes it to the request's
+    code via current_request_id() and returns it in the X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        incoming = dict(scope.get("headers") or []).get(b"x-request-id", b"").decode("latin-1").strip()
+        request_id = server_request_id(incoming)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        with request_context(request_id):
+            await self.app(scope, receive, send_wrapper)
+
+trace_sink = TraceSink(
+    directory=settings.TRACE_DIR,
+    sample_rate=settings.TRACE_SAMPLE_RATE,
+    max_bytes=settings.TRACE_MAX_BYTES,
+    backups=settings.TRACE_BACKUPS,
+    queue_size=settings.TRACE_QUEUE_SIZE,
+    max_field_chars=settings.TRACE_MAX_FIELD_CHARS,
+)
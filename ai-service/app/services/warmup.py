@@ -0,0 +1,72 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+from app.services.chroma_service import initialize_knowledge_base, is_collection_ready
+from app.services.contract_store import contract_store
+from app.services.extractor import get_llm, is_llm_ready
+from app.services.graph import get_app_graph, is_graph_ready
+from app.services.master_data import master_data_index
+
+logger = logging.getLogger("uvicorn.error")
+
+# Components that must be warm before the instance reports ready.
+# The graph is cheap to build lazily, so it is warmed but doesn't gate readiness.
+REQUIRED_COMPONENTS = ("llm", "knowledge_base")
+
+_state: Dict[str, dict] = {}
+_state_lock = threading.Lock()
+_warmup_thread: Optional[threading.Thread] = None
+
+def _warm(name: str, fn: Callable):
+    start_time = time.time()
+    try:
+        fn()
+        error = None
+    except Exception as e:
+        logger.error(f"❌ Warm-up of {name} failed: {e}")
+        error = str(e)
+    with _state_lock:
+        _state[name] = {"warmed": error is None, "error": error, "elapsed_s": round(time.time() - start_time, 3)}
+
+def warm_up():
+    """
+    Creates the heavy resources (Gemini client, knowledge base, milestone graph, master data,
+    stored contracts) ahead of the first request.
+    """
+    logger.info("🔥 Warming up LLM, knowledge base and graph...")
+    _warm("llm", get_llm)
+    _warm("knowledge_base", initialize_knowledge_base)
+    _warm("graph", get_app_graph)
+    _warm("master_data", master_data_index.current)
+    # Persisted contracts are otherwise loaded lazily; the portfolio aggregates need all of them
+    _warm("contracts", contract_store.load_all)
+    logger.info(f"🔥 Warm-up finished: {readiness()}")
+
+def start_background_warmup() -> threading.Thread:
+    global _warmup_thread
+    with _state_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=warm_up, name="warmup", daemon=True)
+            _warmup_thread.start()
+        return _warmup_thread
+
+def readiness() -> dict:
+    """
+    Live readiness: a component counts as warm once it exists, whether the warm-up
+    or a first request created it.
+    """
+    with _state_lock:
+        state = {name: dict(info) for name, info in _state.items()}
+        warming = _warmup_thread is not None and _warmup_thread.is_alive()
+    components = {
+        "llm": is_llm_ready(),
+        "knowledge_base": is_collection_ready(),
+        "graph": is_graph_ready(),
+    }
+    return {
+        "ready": all(components[name] for name in REQUIRED_COMPONENTS),
+        "warming_up": warming,
+        "components": components,
+        "warmup": state,
+    }
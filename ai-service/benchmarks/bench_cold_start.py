@@ -0,0 +1,60 @@
+"""
+Cold-start benchmark: `import app.main` time and first-request latency in fresh interpreters.
+Exits non-zero when the median import time exceeds --max-import-s, so CI can catch regressions.
+
+    cd ai-service
+    python -m benchmarks.bench_cold_start --runs 5 --max-import-s 1.5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    t2 = time.perf_counter()
+    assert client.get("/").status_code == 200
+    t3 = time.perf_counter()
+    ready = client.get("/ready").status_code
+print(json.dumps({"import_s": t1 - t0, "startup_s": t2 - t1, "first_request_s": t3 - t2, "ready_status": ready}))
+"""
+
+def run_probe(env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], env=env, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup-mode", default="off", choices=["off", "background", "blocking"])
+    parser.add_argument("--max-import-s", type=float, default=None)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+    env["WARMUP_MODE"] = args.warmup_mode
+    env["TRACE_ENABLED"] = "false"
+
+    samples = [run_probe(env) for _ in range(args.runs)]
+    for key in ("import_s", "startup_s", "first_request_s"):
+        values = [s[key] for s in samples]
+        print(f"{key:>16}: median {statistics.median(values):.3f}s  max {max(values):.3f}s")
+    print(f"{'ready_status':>16}: {samples[-1]['ready_status']}")
+
+    median_import = statistics.median(s["import_s"] for s in samples)
+    if args.max_import_s is not None and median_import > args.max_import_s:
+        print(f"FAIL: import time {median_import:.3f}s > {args.max_import_s:.3f}s")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
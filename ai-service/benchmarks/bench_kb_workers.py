@@ -0,0 +1,109 @@
+"""
+Multi-worker knowledge base (KB_MODE=snapshot): N processes start at once against an empty snapshot
+directory. Reports how many built (should be 1), per-worker startup wall/CPU time and peak RSS,
+and whether every worker hot-swaps to a snapshot published while they run. Local embedder, temp dirs.
+
+    cd ai-service
+    python -m benchmarks.bench_kb_workers --workers 1,4,8
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def worker(directory: str, wait_s: float):
+    os.environ.update(
+        KB_MODE="snapshot", EMBEDDING_BACKEND="local", EMBEDDING_CACHE_ENABLED="false",
+        GOOGLE_API_KEY="benchmark-placeholder", KB_SNAPSHOT_DIR=os.path.join(directory, "snapshots"),
+        KB_SNAPSHOT_POLL_SECONDS="0.1",
+    )
+    from app.services import chroma_service, kb_sync
+
+    chroma_service.CHROMA_PATH = os.path.join(directory, "chroma")
+    kb_sync.MASTER_DATA_PATH = os.path.join(directory, "master_data.json")
+    kb_sync.POLICIES_PATH = os.path.join(directory, "policies.txt")
+    from app.services.kb_snapshot import kb_snapshots
+
+    start_time, start_cpu = time.perf_counter(), time.process_time()
+    chroma_service.initialize_knowledge_base()
+    startup_s, startup_cpu_s = time.perf_counter() - start_time, time.process_time() - start_cpu
+    chroma_service.query_kb_hits(["proveedor de obra civil"], n_results=3)
+    first = kb_snapshots.current().name
+    deadline = time.time() + wait_s
+    while time.time() < deadline and kb_snapshots.current().name == first:
+        time.sleep(0.05)
+    print(json.dumps({
+        "startup_s": startup_s, "startup_cpu_s": startup_cpu_s, "builds": kb_snapshots.builds,
+        "swapped": kb_snapshots.current().name != first,
+        "rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+def run(count: int, wait_s: float) -> dict:
+    directory = tempfile.mkdtemp(prefix="bench-kb-workers-")
+    try:
+        shutil.copy(os.path.join(ROOT, "app", "data", "bari_master_data.json"), os.path.join(directory, "master_data.json"))
+        shutil.copy(os.path.join(ROOT, "app", "data", "bari_policies.txt"), os.path.join(directory, "policies.txt"))
+        command = [sys.executable, "-m", "benchmarks.bench_kb_workers", "--worker", directory, "--wait", str(wait_s)]
+        processes = [subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) for _ in range(count)]
+        # Once everyone is up, change a source and publish from a separate process, like POST /admin/kb/sync
+        while not os.path.exists(os.path.join(directory, "snapshots", "CURRENT")):
+            time.sleep(0.1)
+        time.sleep(1.0)
+        with open(os.path.join(directory, "policies.txt"), "a", encoding="utf-8") as f:
+            f.write("\n\nPolítica de prueba: publicada mientras los workers atienden.\n")
+        publish = subprocess.run(command[:5] + ["--publish"], cwd=ROOT, capture_output=True, text=True)
+        rows = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in processes]
+        if publish.returncode:
+            raise RuntimeError(publish.stderr)
+        return {
+            "workers": count,
+            "builds": sum(r["builds"] for r in rows),
+            "swapped": sum(r["swapped"] for r in rows),
+            "startup_s_max": round(max(r["startup_s"] for r in rows), 2),
+            "startup_cpu_s_max": round(max(r["startup_cpu_s"] for r in rows), 2),
+            "rss_mib_max": round(max(r["rss_mib"] for r in rows), 1),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def publish(directory: str):
+    os.environ.update(
+        KB_MODE="snapshot", EMBEDDING_BACKEND="local", EMBEDDING_CACHE_ENABLED="false",
+        GOOGLE_API_KEY="benchmark-placeholder", KB_SNAPSHOT_DIR=os.path.join(directory, "snapshots"),
+    )
+    from app.services import chroma_service, kb_sync
+
+    chroma_service.CHROMA_PATH = os.path.join(directory, "chroma")
+    kb_sync.MASTER_DATA_PATH = os.path.join(directory, "master_data.json")
+    kb_sync.POLICIES_PATH = os.path.join(directory, "policies.txt")
+    from app.services.kb_snapshot import kb_snapshots
+
+    kb_snapshots.sync()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,4,8")
+    parser.add_argument("--wait", type=float, default=30.0, help="how long workers wait for the hot swap (s)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--publish", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker and args.publish:
+        return publish(args.worker)
+    if args.worker:
+        return worker(args.worker, args.wait)
+    columns = ("workers", "builds", "swapped", "startup_s_max", "startup_cpu_s_max", "rss_mib_max")
+    print("".join(f"{c:>18}" for c in columns))
+    for count in (int(c) for c in args.workers.split(",")):
+        row = run(count, args.wait)
+        print("".join(f"{row[c]:>18}" for c in columns))
+
+if __name__ == "__main__":
+    main()
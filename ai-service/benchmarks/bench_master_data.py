@@ -0,0 +1,123 @@
+"""
+Master-data index at scale: build time, memory, id / name / fuzzy lookups, contract resolution
+and hot reload, on a synthetic vendor table.
+
+    cd ai-service
+    python -m benchmarks.bench_master_data --vendors 100000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+
+from app.core.config import settings  # noqa: E402
+from app.services.master_data import MasterDataIndex  # noqa: E402
+from benchmarks.run import make_large_contract, percentile  # noqa: E402
+
+WORDS = [
+    "CONSTRUCCIONES", "INGENIERÍA", "SUMINISTROS", "LOGÍSTICA", "IMPERMEABILIZACIONES", "ELÉCTRICOS",
+    "ANDINA", "BOGOTÁ", "CARIBE", "PACÍFICO", "TÉCNICOS", "SOLUCIONES", "MONTAJES", "ESTRUCTURAS",
+    "ACABADOS", "CUBIERTAS", "QUÍMICOS", "TRANSPORTES", "SERVICIOS", "INTEGRALES", "DEL", "NORTE", "SUR",
+]
+SUFFIXES = ["S.A.S.", "LTDA", "S.A.", ""]
+
+def make_master_data(vendors: int, seed: int = 11) -> dict:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(vendors):
+        name = " ".join(rng.sample(WORDS, rng.randint(2, 4))) + f" {i:06d} " + rng.choice(SUFFIXES)
+        nit = 900_000_000 + i
+        rows.append({
+            "id": str(40_000_000 + i), "name": name.strip(), "category": "Obra Civil",
+            "tax_id": f"{nit // 1_000_000}.{nit // 1000 % 1000:03d}.{nit % 1000:03d}-{i % 10}",
+        })
+    return {
+        "organization": "BARI Infraestructuras S.A.S.", "purchasing_org": "1000", "vendors": rows,
+        "cost_centers": [{"id": f"500-{i:04d}", "description": f"Centro de costo {i}"} for i in range(500)],
+        "material_groups": [{"code": f"MAT-{i:03d}", "description": f"Grupo de material {i}"} for i in range(200)],
+    }
+
+def typo(name: str, rng: random.Random) -> str:
+    # Drop one character and lowercase: what an LLM or a scanned contract tends to produce
+    i = rng.randrange(len(name))
+    return (name[:i] + name[i + 1:]).lower()
+
+def timed_us(fn: Callable, samples: List) -> List[float]:
+    latencies = []
+    for sample in samples:
+        start_time = time.perf_counter()
+        fn(sample)
+        latencies.append((time.perf_counter() - start_time) * 1e6)
+    return latencies
+
+def report(name: str, latencies: List[float]):
+    print(f"{name:<28} {percentile(latencies, 0.5):>10.1f} {percentile(latencies, 0.99):>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vendors", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    data = make_master_data(args.vendors)
+    fd, path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    print(f"Synthetic master data: {args.vendors} vendors, {os.path.getsize(path) / 2 ** 20:.1f} MiB")
+
+    try:
+        settings.MASTER_DATA_RELOAD_INTERVAL_SECONDS = 0
+        index = MasterDataIndex(path)
+        start_time = time.perf_counter()
+        snapshot = index.current()
+        build_s = time.perf_counter() - start_time
+        # Peak memory from a second, traced build: tracemalloc slows the build several times over
+        tracemalloc.start()
+        MasterDataIndex(path).current()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"Index build: {build_s:.2f}s, peak {peak / 2 ** 20:.0f} MiB")
+
+        vendors = [rng.choice(data["vendors"]) for _ in range(args.lookups)]
+        print(f"{'lookup':<28} {'p50 µs':>10} {'p99 µs':>10}")
+        report("id", timed_us(lambda v: snapshot.vendors.get(v["id"]), vendors))
+        report("exact name", timed_us(lambda v: snapshot.vendors.match(v["name"], 0.6), vendors))
+        report("tax id", timed_us(lambda v: snapshot.match_vendor([f"NIT {v['tax_id']}"]), vendors))
+
+        fuzzy = [(v, typo(v["name"], rng)) for v in vendors[: max(1, args.lookups // 4)]]
+        hits = sum(1 for v, name in fuzzy if (snapshot.vendors.match(name, 0.6) or ({},))[0].get("id") == v["id"])
+        report("fuzzy name (1 typo)", timed_us(lambda pair: snapshot.vendors.match(pair[1], 0.6), fuzzy))
+        print(f"{'':<28} fuzzy accuracy {hits / len(fuzzy):.1%}")
+
+        contracts = []
+        for vendor in vendors[:200]:
+            contract = make_large_contract(1, contract_id="BENCH-MD")
+            contract.parties = ["BARI S.A.S.", typo(vendor["name"], rng)]
+            contract.erp_vendor_id = "HALLUCINATED-1"
+            contracts.append(contract)
+        report("resolve contract", timed_us(index.resolve, contracts))
+        fixed = sum(1 for contract, vendor in zip(contracts, vendors) if contract.erp_vendor_id == vendor["id"])
+        print(f"{'':<28} hallucinated ids corrected {fixed / len(contracts):.1%}")
+
+        os.utime(path, (time.time() + 5, time.time() + 5))
+        start_time = time.perf_counter()
+        stale = index.current()
+        request_s = time.perf_counter() - start_time
+        index._builder.join()
+        swapped = index.current() is not stale
+        print(
+            f"Hot reload after mtime change: request {request_s * 1000:.2f}ms (previous snapshot), "
+            f"background build {time.perf_counter() - start_time:.2f}s (reloads={index.reloads}, swapped={swapped})"
+        )
+    finally:
+        os.unlink(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+PDF extraction throughput vs. number of worker processes.
+
+    cd ai-service
+    python -m benchmarks.bench_pdf_extraction --pages 400
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from app.services.pdf_extractor import extract_pages
+from benchmarks.synthetic import make_pdf_bytes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(make_pdf_bytes(args.pages))
+    print(f"Synthetic PDF: {args.pages} pages, {os.path.getsize(path) / 1024:.0f} KiB")
+
+    try:
+        workers = 1
+        baseline = None
+        print(f"{'workers':>8} {'best s':>8} {'pages/s':>9} {'speedup':>8}")
+        while workers <= args.max_workers:
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                extract_pages(path, pool)  # warm up worker processes
+                best = float("inf")
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    pages = extract_pages(path, pool)
+                    best = min(best, time.perf_counter() - start)
+            assert len(pages) == args.pages
+            rate = args.pages / best
+            baseline = baseline or rate
+            print(f"{workers:>8} {best:>8.2f} {rate:>9.0f} {rate / baseline:>7.1f}x")
+            workers *= 2
+    finally:
+        os.unlink(path)
+
+if __name__ == "__main__":
+    main()
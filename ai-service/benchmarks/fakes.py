@@ -0,0 +1,170 @@
+"""
+Deterministic offline stand-ins for Gemini chat and Google embeddings, with configurable latency.
+
+    from benchmarks.fakes import use_fake_backends
+    use_fake_backends(llm_latency_s=0.5, embed_latency_s=0.02)
+"""
+import hashlib
+import math
+import re
+import tempfile
+import time
+from typing import List, Optional
+from chromadb.api.types import EmbeddingFunction
+from app.models import (
+    ActionItem, ContractOverview, ContractSchema, EvidenceAssessment, Phase, SectionExtraction,
+)
+
+CLAUSE = re.compile(r"CL[AÁ]USULA (\d+)\. ([A-ZÁÉÍÓÚÑ]+):\s*([^\n]*)")
+# Clause titles of benchmarks/synthetic.py -> phase
+PHASE_BY_TITLE = {
+    "OBJETO": "INICIO", "PÓLIZAS": "INICIO",
+    "PAGOS": "EJECUCION", "SEGURIDAD": "EJECUCION",
+    "PRUEBAS": "CIERRE", "LIQUIDACIÓN": "CIERRE",
+}
+PHASE_ORDER = ["INICIO", "EJECUCION", "CIERRE"]
+
+def _prompt_text(prompt_value) -> str:
+    messages = prompt_value.to_messages()
+    return messages[-1].content if messages else ""
+
+def _phases_from_text(text: str, max_actions_per_phase: int) -> List[Phase]:
+    actions = {name: [] for name in PHASE_ORDER}
+    for number, title, body in CLAUSE.findall(text):
+        phase = PHASE_BY_TITLE.get(title, "EJECUCION")
+        if len(actions[phase]) >= max_actions_per_phase:
+            continue
+        index = PHASE_ORDER.index(phase) + 1
+        actions[phase].append(ActionItem(
+            id=f"M{index}-C{len(actions[phase]) + 1}",
+            description=f"{title.title()} (cláusula {number})",
+            criteria=body[:160],
+            citation=f"CLÁUSULA {number}",
+            due_date="15 Ene 2026",
+            milestone_value="0%",
+            deliverables=["Acta firmada", "Informe técnico", "Registro fotográfico"],
+        ))
+    phases = [Phase(name=name, description=name.title(), actions=acts) for name, acts in actions.items() if acts]
+    total = sum(len(p.actions) for p in phases)
+    for phase in phases:
+        for action in phase.actions:
+            action.milestone_value = f"{100 / total:.0f}%" if total else "0%"
+    return phases
+
+def _overview_fields(text: str) -> dict:
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:8].upper()
+    return dict(
+        contract_id=f"BENCH-{digest}",
+        title="Contrato de obra (benchmark)",
+        summary="Contrato sintético generado para benchmarks.",
+        thought_process="Respuesta determinista del modelo falso.",
+        erp_vendor_id="100045",
+        erp_cost_center="CC-OPS-100",
+        parties=["BARI S.A.S.", "CONTRATISTA"],
+        audit_summary="Sin observaciones (benchmark).",
+        audit_insights=[],
+        client="BARI",
+        type="construcción",
+        value="$1.0M",
+        start_date="01 Ene 2026",
+        end_date="31 Dic 2026",
+        location="Bogotá",
+        risk_level="bajo",
+    )
+
+class FakeChatModel:
+    """
+    Stands in for ChatGoogleGenerativeAI via extractor.set_llm: only `with_structured_output` is used.
+    Each call sleeps `latency_s` plus `latency_per_1k_chars_s` per 1,000 prompt characters.
+    """
+
+    def __init__(self, latency_s: float = 0.0, latency_per_1k_chars_s: float = 0.0, max_actions_per_phase: int = 8):
+        self.latency_s = latency_s
+        self.latency_per_1k_chars_s = latency_per_1k_chars_s
+        self.max_actions_per_phase = max_actions_per_phase
+        self.calls = 0
+
+    def _sleep(self, prompt_value):
+        self.calls += 1
+        chars = sum(len(str(m.content)) for m in prompt_value.to_messages())
+        delay = self.latency_s + self.latency_per_1k_chars_s * chars / 1000
+        if delay:
+            time.sleep(delay)
+
+    def with_structured_output(self, schema):
+        from langchain_core.runnables import RunnableLambda
+
+        def respond(prompt_value):
+            self._sleep(prompt_value)
+            text = _prompt_text(prompt_value)
+            if schema is ContractSchema:
+                return ContractSchema(**_overview_fields(text), phases=_phases_from_text(text, self.max_actions_per_phase))
+            if schema is SectionExtraction:
+                return SectionExtraction(phases=_phases_from_text(text, self.max_actions_per_phase))
+            if schema is ContractOverview:
+                return ContractOverview(**_overview_fields(text))
+            if schema is EvidenceAssessment:
+                met = "http" in text or "firmad" in text.lower()
+                return EvidenceAssessment(met=met, confidence=0.9, reason="benchmark")
+            raise ValueError(f"FakeChatModel has no canned answer for {schema.__name__}")
+
+        return RunnableLambda(respond)
+
+class FakeEmbeddingFunction(EmbeddingFunction):
+    """
+    Hashed bag-of-words embeddings (unit length), so similar texts still land close together.
+    """
+
+    def __init__(self, dimensions: int = 128, latency_s: float = 0.0):
+        self.dimensions = dimensions
+        self.latency_s = latency_s
+        self.calls = 0
+        self.texts = 0
+
+    def __call__(self, input):
+        self.calls += 1
+        self.texts += len(input)
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        vectors = []
+        for text in input:
+            vector = [0.0] * self.dimensions
+            for word in re.findall(r"\w+", text.lower()):
+                vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dimensions] += 1.0
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            vectors.append([v / norm for v in vector])
+        return vectors
+
+    @staticmethod
+    def name() -> str:
+        return "benchmark_fake"
+
+    def get_config(self) -> dict:
+        return {"dimensions": self.dimensions}
+
+    @staticmethod
+    def build_from_config(config: dict) -> "FakeEmbeddingFunction":
+        return FakeEmbeddingFunction(config.get("dimensions", 128))
+
+def use_fake_backends(llm_latency_s: float = 0.0, llm_latency_per_1k_chars_s: float = 0.0,
+                      embed_latency_s: float = 0.0, chroma_path: Optional[str] = None, rate_limit: bool = False):
+    """
+    Points the service at the fakes: fake chat model, fake embedder, and a throwaway Chroma store.
+    Gateway rate limits are lifted unless `rate_limit` is set, so runs measure the service itself.
+    """
+    from app.core.config import settings
+    from app.services import chroma_service, extractor
+    from app.services.llm_gateway import embedding_gateway, llm_gateway
+
+    settings.GOOGLE_API_KEY = settings.GOOGLE_API_KEY or "benchmark-placeholder"
+    llm = FakeChatModel(llm_latency_s, llm_latency_per_1k_chars_s)
+    embedder = FakeEmbeddingFunction(latency_s=embed_latency_s)
+    extractor.set_llm(llm)
+
+    chroma_service.reset_chroma()
+    chroma_service.CHROMA_PATH = chroma_path or tempfile.mkdtemp(prefix="bench-chroma-")
+    chroma_service.set_embedding_fn(embedder)
+    if not rate_limit:
+        llm_gateway.bucket.rate = 0
+        embedding_gateway.bucket.rate = 0
+    return llm, embedder
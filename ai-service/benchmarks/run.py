@@ -0,0 +1,388 @@
+"""
+Offline benchmark suite: fake Gemini + fake embedder (benchmarks/fakes.py), synthetic contracts
+and PDFs (benchmarks/synthetic.py). Reports throughput, p50/p99 latency and peak Python memory.
+
+    cd ai-service
+    python -m benchmarks.run                           # everything, default sizes
+    python -m benchmarks.run --only pdf,kb --pages 1,50,500
+    python -m benchmarks.run --llm-latency 0.5 --concurrency 8 --json results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+# Benchmarks never call Google and never touch the repo's data/ directory.
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+os.environ.setdefault("WARMUP_MODE", "off")
+os.environ["RESULT_CACHE_ENABLED"] = "false"
+os.environ["EMBEDDING_CACHE_ENABLED"] = "false"  # the "embeddings" benchmark uses its own cache
+os.environ["TRACE_ENABLED"] = "false"  # traces would land in app/data/traces
+
+from app.core.config import settings  # noqa: E402
+from benchmarks.fakes import use_fake_backends  # noqa: E402
+from benchmarks.synthetic import make_contract_text, make_pdf_bytes  # noqa: E402
+
+BENCHMARKS = ("pdf", "preprocess", "embeddings", "kb", "analyze", "milestone", "portfolio", "revision")
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[rank]
+
+def summarize(name: str, latencies: List[float], wall_s: float, peak_bytes: int, **extra) -> dict:
+    return {
+        "benchmark": name,
+        "n": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "throughput_per_s": round(len(latencies) / wall_s, 2) if wall_s else 0.0,
+        "peak_mib": round(peak_bytes / 2 ** 20, 1),
+        **extra,
+    }
+
+def measure(fn: Callable[[], List[float]], memory: bool = True):
+    """
+    Runs `fn` (which returns per-operation latencies) and returns latencies, wall time and peak
+    Python memory. tracemalloc slows allocation-heavy code (pydantic, LangChain) several times
+    over, so timing comes from an untraced run and the peak from a second, traced run.
+    """
+    start_time = time.perf_counter()
+    latencies = fn()
+    wall_s = time.perf_counter() - start_time
+    peak = 0
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return latencies, wall_s, peak
+
+def timed(fn: Callable, repeat: int) -> List[float]:
+    latencies = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start_time)
+    return latencies
+
+def bench_pdf(page_counts: List[int], repeat: int) -> List[dict]:
+    from app.services.pdf_extractor import extract_pdf_pages
+
+    results = []
+    for pages in page_counts:
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(make_pdf_bytes(pages))
+        try:
+            extract_pdf_pages(path)  # spin up the worker pool outside the measurement
+            latencies, wall_s, peak = measure(lambda: timed(lambda: extract_pdf_pages(path), repeat))
+        finally:
+            os.unlink(path)
+        summary = summarize(f"pdf_extraction[{pages}p]", latencies, wall_s, peak)
+        summary["pages_per_s"] = round(pages / percentile(latencies, 0.5), 1)
+        results.append(summary)
+    return results
+
+def bench_preprocess(page_counts: List[int], repeat: int) -> List[dict]:
+    from app.services.preprocess import preprocess_pages
+    from benchmarks.synthetic import make_contract_pages
+
+    results = []
+    for pages in page_counts:
+        page_texts = make_contract_pages(pages)
+        latencies, wall_s, peak = measure(lambda: timed(lambda: preprocess_pages(page_texts), repeat))
+        stats = preprocess_pages(page_texts).stats()
+        results.append(summarize(
+            f"preprocess[{pages}p]", latencies, wall_s, peak,
+            tokens_saved=stats["tokens_saved"], saved_ratio=stats["saved_ratio"],
+        ))
+    return results
+
+def bench_embeddings(page_counts: List[int]) -> List[dict]:
+    """
+    Local hashing backend behind a throwaway embedding cache: cold (all misses) vs. warm.
+    """
+    from app.services.embeddings import EmbeddingCache, build_embedding_backend, cached_embedding_fn
+    from app.services.retrieval import split_clauses
+
+    backend, _ = build_embedding_backend("local")
+    results = []
+    for pages in page_counts:
+        clauses = split_clauses(make_contract_text(pages))
+        for state in ("cold", "warm"):
+            def run() -> List[float]:
+                cache = EmbeddingCache(os.path.join(tempfile.mkdtemp(prefix="bench-emb-"), "e.sqlite3"), 10_000)
+                fn = cached_embedding_fn(backend, cache)
+                if state == "warm":
+                    fn(clauses)
+                return timed(lambda: fn(clauses), 1)
+            latencies, wall_s, peak = measure(run)
+            summary = summarize(f"embed_{state}[{len(clauses)} texts]", latencies, wall_s, peak)
+            summary["texts_per_s"] = round(len(clauses) / latencies[0], 1)
+            results.append(summary)
+    return results
+
+def bench_kb(page_counts: List[int], repeat: int, embedder) -> List[dict]:
+    from app.services.chroma_service import query_kb
+    from app.services.kb_sync import sync_knowledge_base
+    from app.services.retrieval import retrieve_context
+
+    from app.services import chroma_service
+
+    def ingest():
+        # Into a fresh store every time, otherwise the second (traced) pass finds nothing to embed
+        chroma_service.reset_chroma()
+        chroma_service.CHROMA_PATH = tempfile.mkdtemp(prefix="bench-chroma-")
+        chroma_service.set_embedding_fn(embedder)
+        sync_knowledge_base()
+
+    results = []
+    calls_before = embedder.calls
+    latencies, wall_s, peak = measure(lambda: timed(ingest, 1))
+    results.append(summarize("kb_ingestion", latencies, wall_s, peak, embed_calls=(embedder.calls - calls_before) // 2))
+
+    latencies, wall_s, peak = measure(lambda: timed(lambda: query_kb("póliza de cumplimiento impermeabilización"), repeat * 10))
+    results.append(summarize("kb_query", latencies, wall_s, peak))
+
+    for pages in page_counts:
+        text = make_contract_text(pages)
+        latencies, wall_s, peak = measure(lambda: timed(lambda: retrieve_context(text), repeat))
+        results.append(summarize(f"retrieve_context[{pages}p]", latencies, wall_s, peak))
+    return results
+
+def bench_analyze(page_counts: List[int], requests: int, concurrency: int, llm) -> List[dict]:
+    import httpx
+    from app.main import app
+
+    results = []
+    for pages in page_counts:
+        # A different seed per request: identical uploads would be coalesced by the gateway.
+        uploads = [make_pdf_bytes(pages, seed=i, contract=f"BENCH-{i:04d}") for i in range(requests)]
+        calls_before = llm.calls
+
+        async def run() -> List[float]:
+            semaphore = asyncio.Semaphore(concurrency)
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                async def one(i: int) -> float:
+                    async with semaphore:
+                        start_time = time.perf_counter()
+                        response = await client.post(
+                            "/analyze-contract", files={"file": (f"contract-{i}.pdf", uploads[i], "application/pdf")}
+                        )
+                        response.raise_for_status()
+                        assert not response.json()["contract_id"].startswith("MOCK"), "extraction fell back"
+                        return time.perf_counter() - start_time
+                return await asyncio.gather(*(one(i) for i in range(requests)))
+
+        latencies, wall_s, peak = measure(lambda: asyncio.run(run()))
+        results.append(summarize(
+            f"analyze_contract[{pages}p,c={concurrency}]", latencies, wall_s, peak,
+            llm_calls=llm.calls - calls_before,
+        ))
+    return results
+
+def make_large_contract(actions_per_phase: int, contract_id: str = "BENCH-LARGE"):
+    from app.models import ActionItem, ContractSchema, Phase
+
+    phases = []
+    for index, name in enumerate(("INICIO", "EJECUCION", "CIERRE"), start=1):
+        phases.append(Phase(
+            name=name, description=name.title(), status="ACTIVE" if index == 1 else "PENDING",
+            actions=[
+                ActionItem(
+                    id=f"M{index}-C{i}", description=f"Tarea {i}", criteria=f"Acta {i} firmada por la interventoría",
+                    due_date="15 Ene 2026", milestone_value="0%", deliverables=[f"Acta {i} firmada", "Registro fotográfico"],
+                )
+                for i in range(1, actions_per_phase + 1)
+            ],
+        ))
+    return ContractSchema(
+        contract_id=contract_id, title="Contrato grande (benchmark)", summary="s", thought_process="t",
+        parties=["BARI"], phases=phases, audit_summary="a", audit_insights=[], client="BARI",
+        type="construcción", value="$1M", start_date="01 Ene 2026", end_date="31 Dic 2026",
+        location="Bogotá", risk_level="bajo",
+    )
+
+def bench_milestone(actions_per_phase: int, requests: int) -> List[dict]:
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services.contract_store import contract_store
+
+    contract_store.put(make_large_contract(actions_per_phase))
+    client = TestClient(app)
+    client.post("/check-milestone", json={"contract_id": "BENCH-LARGE", "action_id": "M1-C1", "evidence_text": "-"})
+
+    results = []
+    evidence = [f"Acta {i} firmada por la interventoría https://docs/acta-{i}.pdf" for i in range(requests)]
+
+    def single():
+        latencies = []
+        for i in range(requests):
+            action_id = f"M{1 + i % 3}-C{1 + i % actions_per_phase}"
+            start_time = time.perf_counter()
+            client.post("/check-milestone", json={"contract_id": "BENCH-LARGE", "action_id": action_id, "evidence_text": evidence[i]})
+            latencies.append(time.perf_counter() - start_time)
+        return latencies
+
+    latencies, wall_s, peak = measure(single)
+    results.append(summarize(f"check_milestone[{3 * actions_per_phase} actions]", latencies, wall_s, peak))
+
+    # Diff mode: the client sends the version it holds and gets a JSON Patch back
+    def diff():
+        latencies, sizes = [], []
+        version = client.get("/contracts/BENCH-LARGE").json()["version"]
+        for i in range(requests):
+            action_id = f"M{1 + i % 3}-C{1 + i % actions_per_phase}"
+            start_time = time.perf_counter()
+            response = client.post("/check-milestone", json={
+                "contract_id": "BENCH-LARGE", "action_id": action_id, "evidence_text": evidence[i], "known_version": version,
+            })
+            latencies.append(time.perf_counter() - start_time)
+            version = response.json()["version"]
+            sizes.append(len(response.content))
+        diff.sizes = sizes
+        return latencies
+
+    latencies, wall_s, peak = measure(diff)
+    full = client.get("/contracts/BENCH-LARGE", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/contracts/BENCH-LARGE", headers={"Accept-Encoding": "gzip"})
+    results.append(summarize(
+        f"check_milestone_diff[{3 * actions_per_phase} actions]", latencies, wall_s, peak,
+        diff_bytes_p50=int(percentile(diff.sizes, 0.5)), contract_bytes=len(full.content),
+        contract_gzip_bytes=int(gzipped.headers.get("content-length", len(gzipped.content))),
+    ))
+
+    items = [{"action_id": f"M2-C{1 + i % actions_per_phase}", "evidence_text": evidence[i]} for i in range(min(requests, 200))]
+    latencies, wall_s, peak = measure(lambda: timed(
+        lambda: client.post("/check-milestones", json={"contract_id": "BENCH-LARGE", "items": items}), 5
+    ))
+    results.append(summarize(f"check_milestones[{len(items)} items]", latencies, wall_s, peak))
+    return results
+
+def bench_portfolio(contract_counts: List[int], requests: int) -> List[dict]:
+    """
+    Portfolio aggregates: a status update and a full snapshot should cost the same at any size.
+    """
+    from app.services.portfolio import Portfolio
+
+    results = []
+    for count in contract_counts:
+        portfolio = Portfolio()
+        phases = {"INICIO": (3, 10), "EJECUCION": (0, 30), "CIERRE": (0, 10)}
+        due = {f"M{p}-C{i}": "15 Ene 2026" for p in range(1, 4) for i in range(1, 17)}
+        for i in range(count):
+            portfolio.update(f"C{i}", "medio", 90, "INICIO", phases, due, full=True)
+        touched = {"M2-C1": None}
+        latencies, wall_s, peak = measure(lambda: timed(
+            lambda: portfolio.update("C0", "medio", 90, "EJECUCION", phases, touched), requests
+        ), memory=False)
+        results.append(summarize(f"portfolio_update[{count} contracts]", latencies, wall_s, peak))
+        latencies, wall_s, peak = measure(lambda: timed(portfolio.snapshot, requests), memory=False)
+        results.append(summarize(f"portfolio_snapshot[{count} contracts]", latencies, wall_s, peak))
+    return results
+
+def bench_revision(page_counts: List[int], repeat: int) -> List[dict]:
+    """
+    Amendments: one rewritten clause, alternating between two versions of the same contract.
+    The tokens sent to the model should follow the change, not the contract length.
+    """
+    import re
+    from app.services.pipeline import analyze_document, revise_document
+
+    results = []
+    directory = tempfile.mkdtemp(prefix="bench-revision-")
+    for pages in page_counts:
+        original = make_contract_text(pages)
+        amended = re.sub(r"(CLÁUSULA 3\. [A-ZÁÉÍÓÚÑ]+: )[^\n]*", r"\1Redacción modificada por otrosí.", original)
+        paths = []
+        for name, text in (("original", original), ("amended", amended)):
+            paths.append(os.path.join(directory, f"{name}-{pages}.txt"))
+            with open(paths[-1], "w", encoding="utf-8") as f:
+                f.write(text)
+        contract_id = analyze_document("contract.txt", paths[0]).contract_id
+        reports = []
+
+        def revise():
+            latencies = []
+            for i in range(repeat):
+                start_time = time.perf_counter()
+                reports.append(revise_document(contract_id, "contract.txt", paths[(len(reports) + 1) % 2]))
+                latencies.append(time.perf_counter() - start_time)
+            return latencies
+
+        latencies, wall_s, peak = measure(revise)
+        results.append(summarize(
+            f"revise_1_clause[{pages} pages]", latencies, wall_s, peak,
+            revision_tokens=reports[-1].tokens.revision, document_tokens=reports[-1].tokens.document,
+        ))
+    return results
+
+def print_table(results: List[Dict]):
+    columns = ("benchmark", "n", "p50_ms", "p99_ms", "throughput_per_s", "peak_mib")
+    print(f"{columns[0]:<36}" + "".join(f"{c:>18}" for c in columns[1:]))
+    for row in results:
+        print(f"{row['benchmark']:<36}" + "".join(f"{row[c]:>18}" for c in columns[1:]))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"comma-separated subset of {BENCHMARKS}")
+    parser.add_argument("--pages", default="1,50,500", help="synthetic contract sizes (pages)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=16, help="requests per end-to-end run")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--actions", type=int, default=500, help="actions per phase for the milestone benchmark")
+    parser.add_argument("--contracts", default="100,10000", help="portfolio sizes for the portfolio benchmark")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake Gemini latency per call (s)")
+    parser.add_argument("--llm-latency-per-1k", type=float, default=0.0, help="extra fake latency per 1k prompt chars (s)")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="fake embedding latency per batch (s)")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the gateway quota limits from settings")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.only.split(",") if name.strip()]
+    page_counts = [int(p) for p in args.pages.split(",")]
+    llm, embedder = use_fake_backends(
+        llm_latency_s=args.llm_latency, llm_latency_per_1k_chars_s=args.llm_latency_per_1k,
+        embed_latency_s=args.embed_latency, rate_limit=args.rate_limit,
+    )
+    settings.RESULT_CACHE_ENABLED = False
+
+    results: List[dict] = []
+    if "pdf" in selected:
+        results += bench_pdf(page_counts, args.repeat)
+    if "preprocess" in selected:
+        results += bench_preprocess(page_counts, args.repeat)
+    if "embeddings" in selected:
+        results += bench_embeddings(page_counts)
+    if "kb" in selected or "analyze" in selected:
+        kb_results = bench_kb(page_counts, args.repeat, embedder)
+        if "kb" in selected:
+            results += kb_results
+    if "analyze" in selected:
+        results += bench_analyze(page_counts, args.requests, args.concurrency, llm)
+    if "milestone" in selected:
+        results += bench_milestone(args.actions, args.requests * 4)
+    if "portfolio" in selected:
+        results += bench_portfolio([int(c) for c in args.contracts.split(",")], args.requests * 64)
+    if "revision" in selected:
+        results += bench_revision(page_counts, args.repeat)
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
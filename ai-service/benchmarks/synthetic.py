@@ -0,0 +1,97 @@
+"""
+Synthetic contract generators for the offline benchmarks (no network, no external deps).
+"""
+import random
+from typing import List
+
+CLAUSE_TEMPLATES = [
+    "CLÁUSULA {n}. OBJETO: El CONTRATISTA se obliga a ejecutar las obras de impermeabilización de la cubierta del bloque {b}, "
+    "incluyendo el suministro de mantos asfálticos certificados ISO 9001 y la mano de obra calificada.",
+    "CLÁUSULA {n}. PÓLIZAS: El CONTRATISTA constituirá una póliza de cumplimiento equivalente al {p}% del valor del contrato "
+    "dentro de los cinco (5) días hábiles siguientes a la firma del acta de inicio.",
+    "CLÁUSULA {n}. PAGOS: BARI pagará el {p}% del valor contra la entrega del informe de avance de obra número {b}, "
+    "previa aprobación de la interventoría y radicación de la factura electrónica.",
+    "CLÁUSULA {n}. SEGURIDAD: El personal deberá contar con certificado vigente de trabajo en alturas y afiliación ARL nivel 5 "
+    "durante toda la ejecución de las actividades en el frente {b}.",
+    "CLÁUSULA {n}. PRUEBAS: Antes del pago final se realizará una prueba de inundación de 24 horas sobre el área {b}, "
+    "cuyo resultado constará en acta firmada por ambas partes.",
+    "CLÁUSULA {n}. LIQUIDACIÓN: Dentro de los {p} días siguientes a la terminación se suscribirá el acta de liquidación "
+    "y se entregarán los planos récord y la garantía de estanqueidad por diez (10) años.",
+]
+
+HEADER = "BARI INFRAESTRUCTURAS S.A.S. - CONTRATO DE OBRA No. {contract}"
+FOOTER = "Documento confidencial - Página {page}"
+
+def make_contract_pages(pages: int, clauses_per_page: int = 6, seed: int = 7, contract: str = "BENCH-001") -> List[str]:
+    """
+    Returns `pages` page texts with a repeated header/footer, like a real scanned contract.
+    """
+    rng = random.Random(seed)
+    out = []
+    n = 1
+    for page in range(1, pages + 1):
+        lines = [HEADER.format(contract=contract)]
+        for _ in range(clauses_per_page):
+            template = rng.choice(CLAUSE_TEMPLATES)
+            lines.append(template.format(n=n, b=rng.randint(1, 40), p=rng.choice([5, 10, 15, 20, 30])))
+            n += 1
+        lines.append(FOOTER.format(page=page))
+        out.append("\n".join(lines))
+    return out
+
+def make_contract_text(pages: int, **kwargs) -> str:
+    return "\n".join(make_contract_pages(pages, **kwargs)) + "\n"
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _wrap(line: str, width: int = 95) -> List[str]:
+    words, rows, current = line.split(), [], ""
+    for word in words:
+        if current and len(current) + len(word) + 1 > width:
+            rows.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        rows.append(current)
+    return rows
+
+def make_pdf_bytes(pages: int, **kwargs) -> bytes:
+    """
+    Builds a text PDF (Helvetica, WinAnsi) with one synthetic contract page per PDF page.
+    Hand-written so benchmarks don't need a PDF authoring library.
+    """
+    page_texts = make_contract_pages(pages, **kwargs)
+    objects: List[bytes] = []
+
+    # 1: catalog, 2: page tree, 3: font; page/content pairs follow.
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(pages))
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    for i, text in enumerate(page_texts):
+        rows = [row for line in text.split("\n") for row in _wrap(line)]
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        for row in rows:
+            ops.append(f"({_pdf_escape(row)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("cp1252", errors="replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
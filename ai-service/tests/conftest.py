@@ -0,0 +1,12 @@
+import os
+
+# Settings are read at import time: tests never call Google, never warm up and never write
+# into app/data (traces, caches, stored contracts).
+os.environ.setdefault("GOOGLE_API_KEY", "test-placeholder")
+os.environ["WARMUP_MODE"] = "off"
+os.environ["TRACE_ENABLED"] = "false"
+os.environ["RESULT_CACHE_ENABLED"] = "false"
+os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+os.environ["CONTRACT_STORE_DIR"] = ""
+os.environ["DATABASE_URL"] = ""
+os.environ["PERSIST_ANALYZED_CONTRACTS"] = "false"
@@ -0,0 +1,24 @@
+from typing import Dict, List
+from app.models import ActionItem, ContractSchema, Phase
+
+def make_action(action_id: str, description: str = "Tarea", citation: str = None, **fields) -> ActionItem:
+    return ActionItem(
+        id=action_id, description=description, criteria=fields.pop("criteria", f"Criterio de {description}"),
+        citation=citation, due_date=fields.pop("due_date", "15 Ene 2026"),
+        milestone_value=fields.pop("milestone_value", "10%"), deliverables=fields.pop("deliverables", ["Acta firmada"]),
+        **fields,
+    )
+
+def make_contract(contract_id: str = "T-001", phases: Dict[str, List[ActionItem]] = None, **fields) -> ContractSchema:
+    phases = phases if phases is not None else {"INICIO": [make_action("M1-C1")], "EJECUCION": [make_action("M2-C1")]}
+    defaults = dict(
+        title="Contrato de prueba", summary="s", thought_process="t", parties=["BARI", "CONTRATISTA"],
+        audit_summary="a", audit_insights=[], client="BARI", type="construcción", value="$1M",
+        start_date="01 Ene 2026", end_date="31 Dic 2026", location="Bogotá", risk_level="bajo",
+    )
+    defaults.update(fields)
+    return ContractSchema(
+        contract_id=contract_id,
+        phases=[Phase(name=name, description=name.title(), actions=actions) for name, actions in phases.items()],
+        **defaults,
+    )
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+from app import main
+from app.services.contract_store import ContractStore
+from app.services.persistence import ContractRepository
+from tests.helpers import make_contract
+
+@contextmanager
+def held_by_another_thread(lock, timeout: float = 5.0):
+    """
+    Holds `lock` from a helper thread until the block exits (or `timeout` passes, so a handler
+    that blocks the event loop fails the test instead of hanging it).
+    """
+    acquired, release = threading.Event(), threading.Event()
+
+    def hold():
+        with lock:
+            acquired.set()
+            release.wait(timeout)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    acquired.wait()
+    try:
+        yield release
+    finally:
+        release.set()
+        thread.join()
+
+async def loop_stays_responsive(task: asyncio.Task, ticks: int = 5) -> bool:
+    for _ in range(ticks):
+        await asyncio.sleep(0.01)
+    return not task.done()
+
+def stored_contract(monkeypatch, contract_id: str = "T-API"):
+    store = ContractStore()
+    monkeypatch.setattr(main, "contract_store", store)
+    stored, _ = store.add(make_contract(contract_id), baseline={"clauses": ["a"], "actions": {}})
+    return stored
+
+def test_get_contract_waits_for_the_lock_off_the_event_loop(monkeypatch):
+    stored = stored_contract(monkeypatch)
+
+    async def scenario():
+        with held_by_another_thread(stored.lock) as release:
+            task = asyncio.create_task(main.get_contract("T-API", None))
+            responsive = await loop_stays_responsive(task)
+            release.set()
+            return responsive, await task
+
+    responsive, response = asyncio.run(scenario())
+    assert responsive
+    assert response.status_code == 200 and response.headers["ETag"] == '"T-API:1"'
+
+def test_get_contract_not_modified(monkeypatch):
+    stored_contract(monkeypatch)
+    response = asyncio.run(main.get_contract("T-API", '"T-API:1"'))
+    assert response.status_code == 304
+
+def test_persist_contract_waits_for_the_lock_off_the_event_loop(monkeypatch, tmp_path):
+    stored = stored_contract(monkeypatch)
+    monkeypatch.setattr(main, "contract_repository", ContractRepository(f"sqlite:///{tmp_path / 'db.sqlite3'}", pool_size=1))
+
+    async def scenario():
+        with held_by_another_thread(stored.lock) as release:
+            task = asyncio.create_task(main.persist_contract("T-API"))
+            responsive = await loop_stays_responsive(task)
+            release.set()
+            return responsive, await task
+
+    responsive, result = asyncio.run(scenario())
+    assert responsive
+    assert result["contract_id"] == "T-API" and result["milestones"] == 2
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import zipfile
+import pytest
+from app.services import batch
+from app.services.batch import BatchItem, BatchTooLargeError, analyze_batch, expand_upload
+from app.services.jobs import JobManager
+from tests.helpers import make_contract
+
+def make_zip(tmp_path, members: dict) -> str:
+    path = tmp_path / "contracts.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, text in members.items():
+            archive.writestr(name, text)
+    return str(path)
+
+def spooled(tmp_path, names) -> list:
+    items = []
+    for name in names:
+        path = tmp_path / name
+        path.write_text("CLÁUSULA 1. OBJETO: obra.", encoding="utf-8")
+        items.append(BatchItem(name, str(path)))
+    return items
+
+@pytest.fixture
+def jobs(monkeypatch):
+    manager = JobManager(max_workers=2, queue_depth=0, result_ttl=60)
+    monkeypatch.setattr(batch, "job_manager", manager)
+    monkeypatch.setattr(batch, "QUEUE_RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(batch.settings, "BATCH_CONCURRENCY", 4)
+    yield manager
+    manager.shutdown()
+
+class FakePipeline:
+    """
+    Stands in for analyze_spooled_document: owns (deletes) its file, fails on "bad" files,
+    blocks while `gate` is cleared and records how many run at once.
+    """
+
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, filename: str, path: str):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            self.gate.wait(10)
+            time.sleep(0.02)
+            if filename.startswith("bad"):
+                raise ValueError("unreadable contract")
+            return make_contract(os.path.splitext(filename)[0])
+        finally:
+            os.unlink(path)
+            with self.lock:
+                self.running -= 1
+
+async def collect(items) -> list:
+    return [json.loads(line) async for line in analyze_batch(items)]
+
+def test_zip_members_become_items_and_unsupported_ones_error_lines(tmp_path):
+    path = make_zip(tmp_path, {"a.txt": "uno", "docs/b.md": "dos", "c.docx": "x", "__MACOSX/a.txt": "", ".hidden.txt": ""})
+    items = expand_upload("contracts.zip", path)
+    try:
+        assert [item.filename for item in items] == ["a.txt", "docs/b.md", "c.docx"]
+        assert items[2].error == "Unsupported file type: .docx" and items[2].path is None
+        assert all(os.path.exists(item.path) for item in items[:2])
+        assert not os.path.exists(path)
+    finally:
+        batch.discard_items(items)
+
+def test_oversized_zip_is_rejected_before_anything_is_spooled(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch.settings, "BATCH_MAX_FILES", 3)
+    spools = []
+    monkeypatch.setattr(batch, "spool_to_tempfile", lambda *args, **kwargs: spools.append(args))
+    path = make_zip(tmp_path, {f"c{i}.txt": "x" for i in range(3)})
+
+    with pytest.raises(BatchTooLargeError):
+        expand_upload("contracts.zip", path, already=1)
+    assert spools == [] and not os.path.exists(path)
+
+def test_failed_item_is_an_error_line_and_the_batch_continues(tmp_path, jobs, monkeypatch):
+    pipeline = FakePipeline()
+    monkeypatch.setattr(batch, "analyze_spooled_document", pipeline)
+    items = spooled(tmp_path, ["a.txt", "bad.txt", "c.txt"]) + [BatchItem("d.docx", error="Unsupported file type: .docx")]
+
+    lines = sorted(asyncio.run(collect(items)), key=lambda line: line["index"])
+
+    assert [line["status"] for line in lines] == ["ok", "error", "ok", "error"]
+    assert lines[0]["result"]["contract_id"] == "a"
+    assert lines[1]["error"] == "unreadable contract"
+
+def test_concurrent_batches_share_the_analysis_pool(tmp_path, jobs, monkeypatch):
+    pipeline = FakePipeline()
+    monkeypatch.setattr(batch, "analyze_spooled_document", pipeline)
+    first = spooled(tmp_path, [f"a{i}.txt" for i in range(5)])
+    second = spooled(tmp_path, [f"b{i}.txt" for i in range(5)])
+
+    async def both():
+        return await asyncio.gather(collect(first), collect(second))
+
+    results = asyncio.run(both())
+    assert [len(lines) for lines in results] == [5, 5]
+    assert all(line["status"] == "ok" for lines in results for line in lines)
+    # Two batches with BATCH_CONCURRENCY=4 each never exceed the pool's 2 workers
+    assert pipeline.peak == 2
+    assert jobs.stats()["outstanding"] == 0
+
+def test_disconnect_deletes_only_files_of_items_that_never_started(tmp_path, monkeypatch):
+    manager = JobManager(max_workers=1, queue_depth=1, result_ttl=60)
+    monkeypatch.setattr(batch, "job_manager", manager)
+    monkeypatch.setattr(batch, "QUEUE_RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(batch.settings, "BATCH_CONCURRENCY", 4)
+    pipeline = FakePipeline()
+    pipeline.gate.clear()
+    monkeypatch.setattr(batch, "analyze_spooled_document", pipeline)
+    items = spooled(tmp_path, [f"c{i}.txt" for i in range(6)])
+
+    async def disconnect():
+        stream = analyze_batch(items)
+        reading = asyncio.create_task(stream.__anext__())
+        while pipeline.running == 0:
+            await asyncio.sleep(0.01)
+        reading.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await reading
+        await stream.aclose()
+
+    try:
+        asyncio.run(disconnect())
+        # c0 is running and still owns its file; the queued job and the items waiting behind it are gone
+        assert os.path.exists(items[0].path)
+        assert not any(os.path.exists(item.path) for item in items[1:])
+        pipeline.gate.set()
+        deadline = time.time() + 10
+        while manager.stats()["outstanding"] and time.time() < deadline:
+            time.sleep(0.01)
+        assert manager.stats()["outstanding"] == 0
+        assert not os.path.exists(items[0].path)
+    finally:
+        pipeline.gate.set()
+        manager.shutdown()
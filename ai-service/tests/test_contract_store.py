@@ -0,0 +1,118 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from app import main
+from app.services import pipeline
+from app.services.contract_store import ContractStore, VersionConflict
+from app.services.extractor import FALLBACK_CONTRACT_ID
+from tests.helpers import make_contract
+
+def test_add_returns_the_stored_contract_for_a_reupload(tmp_path):
+    store = ContractStore(str(tmp_path))
+    stored, created = store.add(make_contract(), baseline={"clauses": ["a", "b"], "actions": {}})
+    assert created
+    with stored.lock:
+        stored.set_action_status("M1-C1", "completed")
+    store.commit(stored)
+
+    again, created = store.add(make_contract(), baseline={"clauses": ["a", "b"], "actions": {}})
+    assert not created and again is stored
+    assert again.version == 2
+    assert again.locate("M1-C1")[1].status == "completed"
+
+    # Same after a restart: the persisted contract and baseline are found on disk
+    reloaded, created = ContractStore(str(tmp_path)).add(make_contract(), baseline={"clauses": ["a", "b"], "actions": {}})
+    assert not created and reloaded.locate("M1-C1")[1].status == "completed"
+
+def test_add_never_replaces_a_different_document_with_the_same_id():
+    store = ContractStore()
+    first, _ = store.add(make_contract(), baseline={"clauses": ["a"], "actions": {}})
+    second, created = store.add(make_contract(), baseline={"clauses": ["z"], "actions": {}})
+    third, _ = store.add(make_contract(), baseline={"clauses": ["y"], "actions": {}})
+
+    assert created
+    assert [first.contract.contract_id, second.contract.contract_id, third.contract.contract_id] == ["T-001", "T-001-2", "T-001-3"]
+    assert store.get("T-001") is first and first.version == 1
+
+def test_put_replaces_and_keeps_the_baseline():
+    store = ContractStore()
+    store.add(make_contract(), baseline={"clauses": ["a"], "actions": {}})
+    replaced = store.put(make_contract(), expected_version=1)
+    assert replaced.version == 2
+    assert replaced.baseline == {"clauses": ["a"], "actions": {}}
+
+def test_fallback_contract_is_not_stored(tmp_path, monkeypatch):
+    store = ContractStore()
+    monkeypatch.setattr(pipeline, "contract_store", store)
+    monkeypatch.setattr(pipeline, "extract_contract_data", lambda text: make_contract(FALLBACK_CONTRACT_ID))
+    path = tmp_path / "contract.txt"
+    path.write_text("CLÁUSULA 1. OBJETO: obra.", encoding="utf-8")
+
+    contract = pipeline.analyze_document("contract.txt", str(path))
+    assert contract.contract_id == FALLBACK_CONTRACT_ID
+    assert store.get(FALLBACK_CONTRACT_ID) is None
+
+def test_analysis_of_a_reupload_keeps_recorded_statuses(tmp_path, monkeypatch):
+    store = ContractStore()
+    monkeypatch.setattr(pipeline, "contract_store", store)
+    monkeypatch.setattr(pipeline, "extract_contract_data", lambda text: make_contract("T-REUP"))
+    path = tmp_path / "contract.txt"
+    path.write_text("CLÁUSULA 1. OBJETO: obra.\n\nCLÁUSULA 2. PAGOS: pago.", encoding="utf-8")
+
+    pipeline.analyze_document("contract.txt", str(path))
+    stored = store.get("T-REUP")
+    with stored.lock:
+        stored.set_action_status("M2-C1", "completed")
+    store.commit(stored)
+
+    contract = pipeline.analyze_document("contract.txt", str(path))
+    assert contract.contract_id == "T-REUP"
+    assert contract.phases[1].actions[0].status == "completed"
+    assert store.get("T-REUP").version == 2
+
+def test_fallback_contract_is_not_persisted(tmp_path, monkeypatch):
+    persisted = []
+    monkeypatch.setattr(pipeline.settings, "PERSIST_ANALYZED_CONTRACTS", True)
+    monkeypatch.setattr(pipeline, "contract_repository", SimpleNamespace(enabled=True, save_contract=persisted.append))
+    monkeypatch.setattr(pipeline, "extract_contract_data", lambda text: make_contract(FALLBACK_CONTRACT_ID))
+    monkeypatch.setattr(pipeline, "contract_store", ContractStore())
+
+    path = tmp_path / "contract.txt"
+    path.write_text("CLÁUSULA 1. OBJETO: obra.", encoding="utf-8")
+
+    pipeline.analyze_document("contract.txt", str(path))
+    assert persisted == []
+
+    monkeypatch.setattr(pipeline, "extract_contract_data", lambda text: make_contract())
+    pipeline.analyze_document("contract.txt", str(path))
+    assert [contract.contract_id for contract in persisted] == ["T-001"]
+
+def test_put_of_a_stale_contract_leaves_the_stored_one_untouched():
+    store = ContractStore()
+    stored, _ = store.add(make_contract(), baseline={"clauses": ["a"], "actions": {}})
+    with stored.lock:
+        before = stored.capture(["M1-C1"])
+        stored.set_action_status("M1-C1", "completed")
+        store.commit(stored, stored.changes_since(before))
+
+    for expected_version in (None, 1):
+        with pytest.raises(VersionConflict) as error:
+            store.put(make_contract(), expected_version=expected_version)
+        assert error.value.version == 2
+    assert store.get("T-001") is stored and stored.version == 2
+    assert stored.patch_since(1) == [{"op": "replace", "path": "/phases/0/actions/0/status", "value": "completed"}]
+
+    replaced = store.put(make_contract(), expected_version=2)
+    assert replaced.version == 3 and store.get("T-001") is replaced
+
+def test_check_milestone_with_a_mismatched_inline_contract_is_rejected(monkeypatch):
+    store = ContractStore()
+    monkeypatch.setattr(main, "contract_store", store)
+    stored, _ = store.add(make_contract(), baseline={"clauses": ["a"], "actions": {}})
+    request = main.MilestoneCheckRequest(contract=make_contract(), action_id="M1-C1", evidence_text="done", expected_version=7)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.check_milestone(request))
+    assert error.value.status_code == 409
+    assert store.get("T-001") is stored and stored.version == 1
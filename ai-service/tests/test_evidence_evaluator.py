@@ -0,0 +1,64 @@
+import pytest
+from app.services import evidence_evaluator as module
+from app.services.cache import LRUCache
+from app.services.evidence_evaluator import EvidenceEvaluator, local_assessment
+from tests.helpers import make_action
+
+ACTION = make_action("M1-C1", "Firma del acta de inicio", criteria="Acta de inicio firmada por ambas partes",
+                     deliverables=["Acta de inicio firmada"])
+THRESHOLD = 0.6
+
+@pytest.mark.parametrize("evidence", [
+    "done",
+    "https://drive.example.com/acta-inicio.pdf",
+    "Acta de inicio firmada por ambas partes: https://drive.example.com/acta.pdf",
+    "Entregado y aprobado por la interventoría",
+])
+def test_clear_completion_is_decided_locally(evidence):
+    verdict = local_assessment(ACTION, evidence)
+    assert verdict.met and verdict.confidence >= THRESHOLD
+
+@pytest.mark.parametrize("evidence", [
+    "El acta de inicio no ha sido firmada",
+    "Pendiente de firma https://drive.example.com/borrador.pdf",
+    "Firmada por el contratista, falta la firma de BARI",
+])
+def test_clear_failure_is_decided_locally(evidence):
+    verdict = local_assessment(ACTION, evidence)
+    assert not verdict.met and verdict.confidence >= THRESHOLD
+
+def test_partial_overlap_without_keyword_is_escalated():
+    verdict = local_assessment(ACTION, "Reunión con ambas partes para revisar el acta")
+    assert verdict.confidence < THRESHOLD
+
+class FakeEvaluator(EvidenceEvaluator):
+    def __init__(self):
+        super().__init__(THRESHOLD, llm_enabled=True, llm_concurrency=1, cache=LRUCache(100, 60))
+        self.asked = []
+
+    def _ask_llm(self, items):
+        self.asked.extend(items)
+        return [None] * len(items)
+
+AMBIGUOUS = "Reunión con ambas partes para revisar el acta"
+
+def test_escalates_only_ambiguous_evidence(monkeypatch):
+    monkeypatch.setattr(module.settings, "GOOGLE_API_KEY", "a-real-looking-key")
+    evaluator = FakeEvaluator()
+    evaluator.evaluate_many([(ACTION, "done"), (ACTION, "https://x.example.com/acta.pdf"), (ACTION, AMBIGUOUS)])
+    assert [evidence for _, evidence in evaluator.asked] == [AMBIGUOUS]
+    assert evaluator.stats()["escalations"] == 1
+
+@pytest.mark.parametrize("key", ["", "your-gemini-api-key-here"])
+def test_no_escalation_without_an_api_key(monkeypatch, key):
+    monkeypatch.setattr(module.settings, "GOOGLE_API_KEY", key)
+    evaluator = FakeEvaluator()
+    verdict = evaluator.evaluate(ACTION, AMBIGUOUS)
+
+    assert evaluator.asked == [] and verdict.tier == "local"
+    stats = evaluator.stats()
+    assert stats["escalations"] == 0 and stats["escalations_skipped"] == 1 and not stats["llm_configured"]
+    # Not cached, so the item is escalated once a key is configured
+    monkeypatch.setattr(module.settings, "GOOGLE_API_KEY", "a-real-looking-key")
+    evaluator.evaluate(ACTION, AMBIGUOUS)
+    assert len(evaluator.asked) == 1
@@ -0,0 +1,49 @@
+import os
+import shutil
+import pytest
+from app.services import chroma_service, kb_sync
+from app.services.kb_snapshot import SnapshotStore, SnapshotUnavailable
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "data")
+
+@pytest.fixture
+def kb_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(chroma_service.settings, "KB_MODE", "snapshot")
+    monkeypatch.setattr(chroma_service.settings, "EMBEDDING_BACKEND", "local")
+    monkeypatch.setattr(chroma_service.settings, "EMBEDDING_CACHE_ENABLED", False)
+    monkeypatch.setattr(chroma_service.settings, "KB_SNAPSHOT_POLL_SECONDS", 0.0)
+    monkeypatch.setattr(chroma_service, "CHROMA_PATH", str(tmp_path / "chroma"))
+    monkeypatch.setattr(kb_sync, "MASTER_DATA_PATH", str(tmp_path / "master_data.json"))
+    monkeypatch.setattr(kb_sync, "POLICIES_PATH", str(tmp_path / "policies.txt"))
+    shutil.copy(os.path.join(DATA, "bari_master_data.json"), tmp_path / "master_data.json")
+    shutil.copy(os.path.join(DATA, "bari_policies.txt"), tmp_path / "policies.txt")
+    chroma_service.reset_chroma()
+    yield tmp_path
+    chroma_service.reset_chroma()
+
+def test_first_query_builds_then_workers_swap_to_a_new_snapshot(kb_dir):
+    builder, worker = SnapshotStore(str(kb_dir / "snapshots")), SnapshotStore(str(kb_dir / "snapshots"))
+    assert builder.current() is None
+
+    hits = builder.query(["proveedor de obra civil"], 3, ["documents"])
+    first = builder.current().name
+    assert builder.builds == 1 and len(hits["documents"][0]) == 3
+
+    # A second worker opens the published snapshot without building
+    worker.query(["proveedor de obra civil"], 3, ["documents"])
+    assert worker.builds == 0 and worker.current().name == first
+
+    with open(kb_dir / "policies.txt", "a", encoding="utf-8") as f:
+        f.write("\n\nPolítica de prueba: los anticipos se amortizan en cada estimación.\n")
+    report = builder.sync()
+    assert report["snapshot"] != first
+
+    hits = worker.query(["anticipos amortizados en cada estimación"], 1, ["documents"])
+    assert worker.current().name == report["snapshot"] and worker.swaps == 2
+    assert "anticipos" in hits["documents"][0][0]
+
+def test_query_raises_a_clear_error_when_no_snapshot_can_be_opened(kb_dir, monkeypatch):
+    store = SnapshotStore(str(kb_dir / "snapshots"))
+    monkeypatch.setattr(store, "ensure", lambda force=False: {})
+    with pytest.raises(SnapshotUnavailable, match="No KB snapshot"):
+        store.query(["proveedor"], 3, ["documents"])
@@ -0,0 +1,61 @@
+import pytest
+from google.genai import errors
+from langchain_google_genai.chat_models import ChatGoogleGenerativeAIError
+from app.services.llm_gateway import GatewayDeadlineExceeded, LLMGateway, is_retryable
+
+def api_error(code: int, status: str) -> errors.APIError:
+    error_type = errors.ClientError if code < 500 else errors.ServerError
+    return error_type(code, {"error": {"code": code, "message": "upstream said no", "status": status}})
+
+def wrapped(error: Exception) -> ChatGoogleGenerativeAIError:
+    # How langchain-google-genai surfaces google.genai errors: a generic wrapper raised from the cause
+    try:
+        raise ChatGoogleGenerativeAIError(f"Error calling model: {error}") from error
+    except ChatGoogleGenerativeAIError as e:
+        return e
+
+@pytest.mark.parametrize("code,status", [(429, "RESOURCE_EXHAUSTED"), (503, "UNAVAILABLE"), (504, "DEADLINE_EXCEEDED")])
+def test_quota_and_availability_errors_are_retried(code, status):
+    assert is_retryable(api_error(code, status))
+    assert is_retryable(wrapped(api_error(code, status)))
+
+@pytest.mark.parametrize("code,status", [(400, "INVALID_ARGUMENT"), (403, "PERMISSION_DENIED"), (500, "INTERNAL")])
+def test_other_status_codes_are_not_retried(code, status):
+    assert not is_retryable(api_error(code, status))
+    assert not is_retryable(wrapped(api_error(code, status)))
+
+def test_classification_ignores_the_message():
+    assert not is_retryable(ChatGoogleGenerativeAIError("Unknown error converting content to parts"))
+    assert not is_retryable(ValueError("invoice total 5000 exceeds quota; service unavailable"))
+    assert not is_retryable(wrapped(api_error(400, "INVALID_ARGUMENT: mentions 429 and 503")))
+
+def test_timeouts_are_retried_but_not_the_gateway_deadline():
+    assert is_retryable(TimeoutError("read timed out"))
+    assert is_retryable(ConnectionResetError("connection reset by peer"))
+    assert not is_retryable(GatewayDeadlineExceeded("deadline"))
+
+def make_gateway(max_retries: int = 3) -> LLMGateway:
+    return LLMGateway("test", rate_per_minute=6000, burst=10, max_in_flight=2, max_retries=max_retries,
+                      backoff_base=0.001, backoff_max=0.01, deadline=5)
+
+def test_gateway_retries_only_retryable_failures():
+    gateway = make_gateway()
+    failures = [wrapped(api_error(429, "RESOURCE_EXHAUSTED"))]
+
+    def flaky():
+        if failures:
+            raise failures.pop()
+        return "ok"
+
+    assert gateway.call(flaky) == "ok"
+    assert gateway.stats()["retries"] == 1
+
+    calls = []
+
+    def invalid():
+        calls.append(1)
+        raise wrapped(api_error(400, "INVALID_ARGUMENT"))
+
+    with pytest.raises(ChatGoogleGenerativeAIError):
+        gateway.call(invalid)
+    assert len(calls) == 1
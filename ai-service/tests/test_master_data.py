@@ -0,0 +1,95 @@
+import json
+import os
+from pathlib import Path
+import pytest
+from app.services import master_data
+from app.services.master_data import MasterDataIndex
+from tests.helpers import make_contract
+
+MASTER_DATA = {
+    "organization": "BARI Infraestructuras S.A.S.",
+    "purchasing_org": "1000",
+    "vendors": [
+        {"id": "40001021", "name": "IMPER-SOLUCIONES TÉCNICAS S.A.S.", "tax_id": "901.234.567-8"},
+        {"id": "40001022", "name": "CONSTRUCCIONES Y CUBIERTAS BOGOTÁ", "tax_id": "800.111.222-3"},
+    ],
+    "cost_centers": [
+        {"id": "500-1010", "description": "Mantenimiento Preventivo de Sedes"},
+        {"id": "500-2020", "description": "Proyectos de Infraestructura - Ciudadela"},
+    ],
+    "material_groups": [{"code": "OBR-IMP-01", "description": "Servicio de Impermeabilización Profesional"}],
+}
+
+def write(path, data):
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(master_data.settings, "MASTER_DATA_RELOAD_INTERVAL_SECONDS", 0)
+    path = tmp_path / "master_data.json"
+    write(path, MASTER_DATA)
+    return MasterDataIndex(str(path))
+
+def corrected(corrections) -> dict:
+    return {item["field"]: (item["to"], item["method"]) for item in corrections}
+
+def test_hallucinated_vendor_is_replaced_by_the_party_tax_id(index):
+    contract = make_contract(parties=["BARI Infraestructuras S.A.S.", "Contratista NIT 800.111.222-3"],
+                             erp_vendor_id="99999999")
+    fixes = corrected(index.resolve(contract))
+    assert contract.erp_vendor_id == "40001022"
+    assert fixes["erp_vendor_id"] == ("40001022", "tax_id")
+
+def test_vendor_matched_by_name_ignoring_suffix_and_accents(index):
+    contract = make_contract(parties=["BARI Infraestructuras S.A.S.", "Imper Soluciones Tecnicas SAS"])
+    assert corrected(index.resolve(contract))["erp_vendor_id"] == ("40001021", "exact_name")
+
+def test_valid_vendor_id_is_not_overridden_by_a_fuzzy_name(index):
+    contract = make_contract(parties=["BARI Infraestructuras S.A.S.", "Construcciones y Cubierta de Bogota"],
+                             erp_vendor_id="40001021")
+    index.resolve(contract)
+    assert contract.erp_vendor_id == "40001021"
+
+def test_unknown_ids_without_a_match_are_cleared(index):
+    contract = make_contract(parties=["BARI Infraestructuras S.A.S.", "Proveedor Desconocido"], title="Contrato",
+                             erp_vendor_id="99999999", erp_cost_center="XXX-1")
+    fixes = corrected(index.resolve(contract))
+    assert contract.erp_vendor_id is None and contract.erp_cost_center is None
+    assert fixes["erp_vendor_id"] == (None, "unknown_id")
+
+def test_the_organization_is_never_taken_as_the_vendor(index):
+    contract = make_contract(parties=["BARI Infraestructuras S.A.S.", "BARI Infraestructuras"])
+    assert "erp_vendor_id" not in corrected(index.resolve(contract))
+
+def test_cost_center_and_purchasing_org_are_filled(index):
+    contract = make_contract(title="Mantenimiento preventivo de sedes")
+    fixes = corrected(index.resolve(contract))
+    assert contract.erp_cost_center == "500-1010"
+    assert contract.erp_purchasing_org == "1000" and fixes["erp_purchasing_org"] == ("1000", "master_data")
+
+def test_reload_builds_in_the_background_and_swaps_atomically(index):
+    first = index.current()
+    data = dict(MASTER_DATA, vendors=MASTER_DATA["vendors"] + [{"id": "40001099", "name": "Nuevo Proveedor S.A.S."}])
+    write(Path(index.path), data)
+    bump_mtime(index.path)
+
+    assert index.current() is first  # the request is served from the previous snapshot
+    index._builder.join(timeout=10)
+    assert index.current() is not first
+    assert index.current().vendors.get("40001099") is not None
+    assert index.reloads == 2
+
+def test_broken_file_keeps_the_previous_snapshot(index):
+    first = index.current()
+    with open(index.path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    bump_mtime(index.path)
+
+    index.current()
+    index._builder.join(timeout=10)
+    assert index.current() is first
+    assert index.reload_errors == 1
+
+def bump_mtime(path: str):
+    mtime = os.path.getmtime(path) + 5
+    os.utime(path, (mtime, mtime))
@@ -0,0 +1,56 @@
+import asyncio
+import json
+import pytest
+from fastapi import HTTPException
+from app import main
+from app.services.contract_store import ContractStore
+from tests.helpers import make_action, make_contract
+
+@pytest.fixture
+def store(monkeypatch):
+    store = ContractStore()
+    monkeypatch.setattr(main, "contract_store", store)
+    contract = make_contract(phases={
+        "INICIO": [make_action("M1-C1"), make_action("M1-C2")],
+        "EJECUCION": [make_action("M2-C1"), make_action("M2-C2")],
+    })
+    store.add(contract, baseline={"clauses": ["a"], "actions": {}})
+    return store
+
+def check(*items, **fields):
+    request = main.MilestoneBatchRequest(
+        contract_id="T-001", items=[main.MilestoneEvidence(action_id=a, evidence_text=e) for a, e in items], **fields,
+    )
+    response = asyncio.run(main.check_milestones(request))
+    body = json.loads(response.body)
+    assert response.headers["etag"] == main._etag("T-001", body["version"])
+    return body
+
+def test_unknown_action_ids_are_reported_per_item(store):
+    response = check(("M1-C1", "done"), ("X-99", "done"), ("M1-C2", "El acta de inicio no ha sido firmada"))
+
+    assert [r["action_id"] for r in response["results"]] == ["M1-C1", "X-99", "M1-C2"]
+    assert [r["met"] for r in response["results"]] == [True, False, False]
+    assert response["results"][1]["agent_response"] == "Action ID not found in contract"
+    assert response["results"][1]["action"] is None
+    assert response["current_phase"] == "INICIO" and response["version"] == 2
+
+def test_phase_advances_mid_batch(store):
+    # The last INICIO action and a first EJECUCION action in one batch: one transition, one commit
+    check(("M1-C1", "done"))
+    response = check(("M1-C2", "done"), ("M2-C1", "done"), ("M2-C2", "El acta de inicio no ha sido firmada"))
+
+    assert [r["met"] for r in response["results"]] == [True, True, False]
+    assert response["current_phase"] == "EJECUCION"
+    assert response["version"] == 3
+    stored = store.get("T-001")
+    assert stored.contract.phases[0].status == "COMPLETED"
+    assert stored.completed == {"INICIO": 2, "EJECUCION": 1}
+
+def test_batch_size_is_bounded(store, monkeypatch):
+    monkeypatch.setattr(main.settings, "MILESTONE_BATCH_MAX_ITEMS", 2)
+    for items, status in ((("M1-C1", "done"),) * 3, 413), ((), 400):
+        with pytest.raises(HTTPException) as error:
+            check(*items)
+        assert error.value.status_code == status
+    assert store.get("T-001").version == 1
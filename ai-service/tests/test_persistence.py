@@ -0,0 +1,86 @@
+import sqlite3
+import pytest
+from app.services.persistence import ContractRepository, milestone_id, sqlite_schema
+from tests.helpers import make_action, make_contract
+
+def make_repository(tmp_path) -> ContractRepository:
+    return ContractRepository(f"sqlite:///{tmp_path / 'contracts.sqlite3'}", pool_size=1)
+
+def query(repository: ContractRepository, sql: str, *params) -> list:
+    with repository._get_pool().connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+def test_save_contract_upserts_contract_and_milestones(tmp_path):
+    repository = make_repository(tmp_path)
+    contract = make_contract()
+    assert repository.save_contract(contract)["milestones"] == 2
+
+    contract.title = "Contrato modificado"
+    contract.phases[0].actions[0].description = "Tarea revisada"
+    result = repository.save_contract(contract)
+
+    assert result["deleted"] == 0
+    assert query(repository, "SELECT title FROM contracts WHERE id = 'T-001'") == [("Contrato modificado",)]
+    assert query(repository, "SELECT id, name FROM milestones WHERE contract_id = 'T-001' ORDER BY id") == [
+        ("T-001-M1-C1", "Tarea revisada"), ("T-001-M2-C1", "Tarea"),
+    ]
+
+def test_reanalysis_keeps_statuses_recorded_by_the_app(tmp_path):
+    repository = make_repository(tmp_path)
+    repository.save_contract(make_contract())
+    # Progress recorded after the first analysis (frontend or /check-milestone)
+    with repository._get_pool().connection() as conn, conn:
+        conn.execute("UPDATE milestones SET status = 'completed' WHERE id = ?", (milestone_id("T-001", "M1-C1"),))
+        conn.execute("UPDATE contracts SET status = 'at-risk', progress = 40 WHERE id = 'T-001'")
+
+    contract = make_contract()
+    contract.phases[1].actions[0].status = "in-progress"
+    repository.save_contract(contract)
+
+    assert dict(query(repository, "SELECT id, status FROM milestones WHERE contract_id = 'T-001'")) == {
+        "T-001-M1-C1": "completed", "T-001-M2-C1": "in-progress",
+    }
+    assert query(repository, "SELECT status, progress FROM contracts WHERE id = 'T-001'") == [("at-risk", 40)]
+
+def test_reanalysis_deletes_stale_milestones(tmp_path):
+    repository = make_repository(tmp_path)
+    repository.save_contract(make_contract(phases={"INICIO": [make_action("M1-C1"), make_action("M1-C2")]}))
+
+    result = repository.save_contract(make_contract(phases={"INICIO": [make_action("M1-C2")]}))
+
+    assert result["deleted"] == 1
+    assert query(repository, "SELECT id FROM milestones WHERE contract_id = 'T-001'") == [("T-001-M1-C2",)]
+    assert repository.stats()["milestones_deleted"] == 1
+
+def test_unknown_project_manager_is_rejected_like_in_postgres(tmp_path):
+    repository = make_repository(tmp_path)
+    with pytest.raises(sqlite3.IntegrityError):
+        repository.save_contract(make_contract(), project_manager_id="no-such-user")
+    assert query(repository, "SELECT COUNT(*) FROM contracts WHERE id = 'T-001'") == [(0,)]
+
+def test_failed_write_replaces_the_pooled_connection(tmp_path):
+    repository = make_repository(tmp_path)
+    pool = repository._get_pool()
+    with pool.connection() as conn:
+        first = conn
+
+    with pytest.raises(sqlite3.IntegrityError):
+        repository.save_contract(make_contract(), project_manager_id="no-such-user")
+    assert pool._created == 0 and repository.stats()["errors"] == 1
+    with pytest.raises(sqlite3.ProgrammingError):
+        first.execute("SELECT 1")  # closed, not handed out again
+
+    repository.save_contract(make_contract())
+    with pool.connection() as conn:
+        assert conn is not first
+    assert pool._created == 1
+    assert query(repository, "SELECT COUNT(*) FROM milestones WHERE contract_id = 'T-001'") == [(2,)]
+
+def test_sqlite_schema_matches_schema_sql(tmp_path):
+    repository = make_repository(tmp_path)
+    repository.save_contract(make_contract())
+    tables = {row[0] for row in query(repository, "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert tables == {"users", "contracts", "contract_team_members", "milestones", "documents"}
+    foreign_keys = query(repository, "SELECT \"table\", \"from\", \"to\", on_delete FROM pragma_foreign_key_list('contracts')")
+    assert foreign_keys == [("users", "project_manager_id", "id", "SET NULL")]
+    assert "NOW()" not in sqlite_schema() and "::jsonb" not in sqlite_schema()
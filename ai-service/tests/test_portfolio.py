@@ -0,0 +1,85 @@
+import random
+from collections import Counter
+from app.services import contract_store as store_module
+from app.services.contract_store import ContractStore, is_completed
+from app.services.portfolio import Portfolio
+from tests.helpers import make_action, make_contract
+
+# Due dates in every format the parser knows, and whether an open action with that date is overdue
+DUE_DATES = {"2020-01-05": True, "3 de marzo de 2021": True, "15 Ene 2099": False, "2099-12-31": False, "Mes 3": False, "": False}
+STATUSES = ["pending", "in-progress", "completed", "delayed"]
+PHASES = ["INICIO", "EJECUCION", "CIERRE"]
+
+def random_contract(rng: random.Random, contract_id: str):
+    phases = {}
+    for name in PHASES[: rng.randint(1, 3)]:
+        phases[name] = [
+            make_action(f"{contract_id}-{name}-{i}", status=rng.choice(STATUSES), due_date=rng.choice(list(DUE_DATES)))
+            for i in range(rng.randint(0, 4))
+        ]
+    return make_contract(contract_id, phases, risk_level=rng.choice(["bajo", "medio", "alto"]),
+                         health=rng.randint(0, 100), current_phase=rng.choice(list(phases)))
+
+def recompute(contracts) -> dict:
+    # The portfolio snapshot, recomputed by scanning every contract
+    completed, total = Counter(), Counter()
+    overdue = done = 0
+    for contract in contracts:
+        for phase in contract.phases:
+            total[phase.name] += len(phase.actions)
+            completed[phase.name] += sum(is_completed(a.status) for a in phase.actions)
+            overdue += sum(DUE_DATES[a.due_date] for a in phase.actions if not is_completed(a.status))
+        done += all(is_completed(a.status) for phase in contract.phases for a in phase.actions)
+    count, all_total, all_completed = len(contracts), sum(total.values()), sum(completed.values())
+    return {
+        "contracts": count,
+        "contracts_completed": done,
+        "average_health": round(sum(c.health for c in contracts) / count, 1) if count else None,
+        "risk_levels": dict(Counter(c.risk_level for c in contracts)),
+        "current_phases": dict(Counter(c.current_phase for c in contracts)),
+        "milestones": {
+            "total": all_total,
+            "completed": all_completed,
+            "progress": round(all_completed / all_total, 4) if all_total else 0.0,
+            "overdue": overdue,
+        },
+        "phases": {
+            name: {"completed": completed[name], "total": total[name], "progress": round(completed[name] / total[name], 4)}
+            for name in total if total[name]
+        },
+    }
+
+def test_running_totals_match_a_full_recomputation(monkeypatch):
+    portfolio = Portfolio()
+    monkeypatch.setattr(store_module, "portfolio", portfolio)
+    store, rng = ContractStore(), random.Random(11)
+    live, removed, next_id = [], set(), 0
+
+    for step in range(600):
+        operation = rng.random()
+        if operation < 0.2 or not live:
+            next_id += 1
+            store.add(random_contract(rng, f"C-{next_id}"))
+            live.append(f"C-{next_id}")
+        elif operation < 0.8:
+            # Status changes by id: only the touched actions are re-reported
+            stored = store.get(rng.choice(live))
+            with stored.lock:
+                before = stored.capture(stored.action_index)
+                for action_id in rng.sample(list(stored.action_index), min(3, len(stored.action_index))):
+                    stored.set_action_status(action_id, rng.choice(STATUSES))
+                stored.contract.current_phase = rng.choice([phase.name for phase in stored.contract.phases])
+            store.commit(stored, stored.changes_since(before))
+        elif operation < 0.9:
+            contract_id = rng.choice(live)
+            store.put(random_contract(rng, contract_id), expected_version=store.get(contract_id).version)
+        else:
+            contract_id = live.pop(rng.randrange(len(live)))
+            removed.add(contract_id)
+            portfolio.remove(contract_id)
+
+        if step % 50 == 49:
+            contracts = [store.get(contract_id).contract for contract_id in live]
+            assert portfolio.snapshot() == recompute(contracts), f"diverged at step {step}"
+
+    assert removed and portfolio.updates > 500
@@ -0,0 +1,55 @@
+from app.models import ActionItem, ContractSchema, Phase
+from app.services.preprocess import preprocess_pages, restore_citations
+
+HEADER = "BARI INFRAESTRUCTURAS S.A.S. - CONTRATO DE OBRA No. 2024-117"
+
+def _page(number: int, body: str, last_line: str) -> str:
+    return "\n".join([HEADER, body, last_line, f"Documento confidencial - Página {number} de 6"])
+
+def test_repeated_header_and_page_footer_are_removed():
+    pages = [_page(n, f"CLÁUSULA {n}. OBJETO: Obras del bloque {n}.", "Firmas al final del documento.") for n in range(1, 7)]
+    document = preprocess_pages(pages)
+
+    # First occurrence kept (the header names the contract), the other five of each dropped:
+    # header, the exact repeated last line and the page footer (digits folded on page counters)
+    assert document.text.count(HEADER) == 1
+    assert document.text.count("Documento confidencial") == 1
+    assert document.text.count("Firmas al final") == 1
+    assert document.removed_lines == 5 + 5 + 5
+    for n in range(1, 7):
+        assert f"CLÁUSULA {n}. OBJETO" in document.text
+
+def test_body_lines_near_the_page_edge_that_differ_by_a_number_survive():
+    pages = [
+        _page(n, f"CLÁUSULA {n}. PÓLIZAS: Garantías del frente {n}.", f"El CONTRATISTA deberá entregar la póliza {n}.")
+        for n in range(1, 7)
+    ]
+    document = preprocess_pages(pages)
+
+    for n in range(1, 7):
+        assert f"deberá entregar la póliza {n}." in document.text
+    assert document.find_original("El CONTRATISTA deberá entregar la póliza 4.") == "El CONTRATISTA deberá entregar la póliza 4."
+
+def test_citations_are_restored_to_the_original_wording():
+    pages = ["CLÁUSULA 1. PAGOS: el pago se hará con-\ntra entrega del informe.\n\n\n\nCLÁUSULA 2. OBJETO: obra."]
+    document = preprocess_pages(pages)
+    assert "contra entrega" in document.text
+
+    action = ActionItem(
+        id="M2-C1", description="Pago", criteria="Informe", citation="el pago se hará contra entrega del informe",
+        due_date="15 Ene 2026", milestone_value="100%",
+    )
+    contract = ContractSchema(
+        contract_id="T-1", title="t", summary="s", thought_process="t", parties=["BARI"],
+        phases=[Phase(name="EJECUCION", description="e", actions=[action])], audit_summary="a", audit_insights=[],
+        client="BARI", type="obra", value="$1M", start_date="01 Ene 2026", end_date="31 Dic 2026",
+        location="Bogotá", risk_level="bajo",
+    )
+    assert restore_citations(contract, document) == 1
+    assert action.citation == "el pago se hará con-\ntra entrega del informe"
+
+def test_verbatim_duplicate_clauses_are_collapsed():
+    boilerplate = "CLÁUSULA 9. CONFIDENCIALIDAD: " + "Las partes guardarán reserva sobre la información. " * 6
+    document = preprocess_pages([boilerplate + "\n\nCLÁUSULA 10. OBJETO: obra.\n\n" + boilerplate])
+    assert document.duplicate_blocks == 1
+    assert document.text.count("CONFIDENCIALIDAD") == 1
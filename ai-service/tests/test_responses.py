@@ -0,0 +1,40 @@
+import asyncio
+import gzip
+import brotli
+import pytest
+from app.core.responses import CompressionMiddleware, FastJSONResponse, accepted_encodings
+
+PAYLOAD = {"items": [{"id": i, "text": "cláusula de prueba " * 4} for i in range(200)]}
+
+async def app(scope, receive, send):
+    await FastJSONResponse(PAYLOAD)(scope, receive, send)
+
+def request(accept_encoding: str):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=500)(scope, receive, send))
+    headers = {k.decode(): v.decode() for k, v in messages[0]["headers"]}
+    return headers.get("content-encoding"), b"".join(m.get("body", b"") for m in messages[1:])
+
+@pytest.mark.parametrize("header, encoding", [
+    ("gzip, deflate, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("*", "br"),
+    ("identity", None),
+])
+def test_encoding_follows_accept_encoding(header, encoding):
+    used, body = request(header)
+    assert used == encoding
+    decoded = {"br": brotli.decompress, "gzip": gzip.decompress, None: lambda b: b}[encoding](body)
+    assert decoded == FastJSONResponse(PAYLOAD).body
+
+def test_accepted_encodings_parses_q_values():
+    assert accepted_encodings("br;q=1.0, gzip;q=0.8, bogus;q=x") == {"br": 1.0, "gzip": 0.8}
+    assert accepted_encodings(None) == {}
@@ -0,0 +1,68 @@
+import math
+import random
+from app.services.retrieval import estimate_tokens, mmr_select
+
+def candidate(name: str, relevance: float, embedding, tokens: int = 10) -> dict:
+    return {"document": name.ljust(tokens * 4, "."), "relevance": relevance, "embedding": embedding}
+
+def names(selected):
+    return [c["document"].rstrip(".") for c in selected]
+
+def reference_mmr(candidates, lambda_mult, token_budget, max_results):
+    # The pair-by-pair version mmr_select replaced, kept as the oracle
+    def cosine(a, b):
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return sum(x * y for x, y in zip(a, b)) / norm if norm else 0.0
+
+    top = max(c["relevance"] for c in candidates) or 1.0
+    remaining, selected, used = list(candidates), [], 0
+    while remaining and len(selected) < max_results:
+        best, best_score = None, -math.inf
+        for c in remaining:
+            redundancy = max((cosine(c["embedding"], s["embedding"]) for s in selected
+                              if c["embedding"] is not None and s["embedding"] is not None), default=0.0)
+            score = lambda_mult * c["relevance"] / top - (1 - lambda_mult) * redundancy
+            if score > best_score:
+                best, best_score = c, score
+        remaining.remove(best)
+        tokens = estimate_tokens(best["document"])
+        if used + tokens > token_budget:
+            continue
+        selected.append(best)
+        used += tokens
+    return selected
+
+def test_near_duplicates_are_demoted_below_diverse_hits():
+    candidates = [
+        candidate("a", 1.0, [1.0, 0.0]),
+        candidate("a-copy", 0.95, [0.99, 0.01]),
+        candidate("b", 0.6, [0.0, 1.0]),
+    ]
+    assert names(mmr_select(candidates, 0.5, 1000, 3)) == ["a", "b", "a-copy"]
+    # Pure relevance ordering when diversity is switched off
+    assert names(mmr_select(candidates, 1.0, 1000, 3)) == ["a", "a-copy", "b"]
+
+def test_token_budget_and_max_results_are_respected():
+    candidates = [
+        candidate("big", 1.0, [1.0, 0.0, 0.0], tokens=80),
+        candidate("small", 0.9, [0.0, 1.0, 0.0], tokens=15),
+        candidate("medium", 0.8, [0.0, 0.0, 1.0], tokens=30),
+        candidate("tiny", 0.1, None, tokens=5),
+    ]
+    selected = mmr_select(candidates, 0.7, 100, 10)
+    # "medium" would overflow the budget after "big" and "small" and is skipped, not truncated
+    assert names(selected) == ["big", "small", "tiny"]
+    assert sum(estimate_tokens(c["document"]) for c in selected) <= 100
+    assert names(mmr_select(candidates, 0.7, 100, 1)) == ["big"]
+    assert mmr_select([], 0.7, 100, 10) == []
+
+def test_matches_the_pairwise_implementation():
+    rng = random.Random(7)
+    for _ in range(20):
+        candidates = [
+            candidate(f"c{i}", rng.random(), None if rng.random() < 0.1 else [rng.uniform(-1, 1) for _ in range(16)],
+                      tokens=rng.randint(5, 60))
+            for i in range(rng.randint(1, 30))
+        ]
+        args = (rng.choice([0.0, 0.3, 0.7, 1.0]), rng.randint(50, 400), rng.randint(1, 12))
+        assert names(mmr_select(candidates, *args)) == names(reference_mmr(candidates, *args))
@@ -0,0 +1,119 @@
+from app.models import AnalysisJob, Evidence, Phase, RevisionReport, SectionExtraction
+from app.services import pipeline
+from app.services.contract_store import ContractStore
+from app.services.jobs import JobManager
+from app.services.retrieval import split_clauses
+from app.services.revisions import ClauseDiff, apply_revision, clause_baseline, fingerprint
+from tests.helpers import make_action, make_contract
+
+CLAUSES = [
+    "CLÁUSULA PRIMERA. OBJETO: El contratista ejecutará la obra civil del puente vehicular.",
+    "CLÁUSULA SEGUNDA. INICIO: El contratista entregará el acta de inicio firmada dentro de los diez días.",
+    "CLÁUSULA TERCERA. INFORMES: El contratista presentará informes mensuales de avance de obra.",
+    "CLÁUSULA CUARTA. PÓLIZAS: El contratista mantendrá vigente la póliza de cumplimiento.",
+    "CLÁUSULA QUINTA. LIQUIDACIÓN: Las partes suscribirán el acta de liquidación al finalizar.",
+]
+# Otrosí: the start deadline changes, the policy clause is dropped and a safety clause is added
+REVISED = [
+    CLAUSES[0],
+    "CLÁUSULA SEGUNDA. INICIO: El contratista entregará el acta de inicio firmada dentro de los cinco días.",
+    CLAUSES[2],
+    "CLÁUSULA CUARTA. SEGURIDAD: El contratista implementará el plan de seguridad industrial.",
+    CLAUSES[4],
+]
+
+EVIDENCE = Evidence(description="Informe de enero", timestamp="2026-02-01")
+
+def contract_text(clauses) -> str:
+    return "\n\n".join(clauses)
+
+def make_amendable_contract():
+    return make_contract("T-REV", phases={
+        "INICIO": [make_action("M1-C1", "Entregar el acta de inicio firmada", citation=CLAUSES[1],
+                               criteria="Acta firmada en diez días", milestone_value="25%", status="completed")],
+        "EJECUCION": [
+            make_action("M2-C1", "Presentar informes mensuales de avance", citation=CLAUSES[2],
+                        milestone_value="25%", status="in-progress", evidence=[EVIDENCE]),
+            make_action("M2-C2", "Mantener vigente la póliza de cumplimiento", citation=CLAUSES[3], milestone_value="25%"),
+        ],
+        "CIERRE": [make_action("M3-C1", "Suscribir el acta de liquidación", citation=CLAUSES[4], milestone_value="25%")],
+    }, current_phase="EJECUCION")
+
+def revised_extractions():
+    return [SectionExtraction(phases=[
+        Phase(name="INICIO", description="Inicio", actions=[make_action(
+            "M1-C1", "Entregar el acta de inicio firmada", citation=REVISED[1], criteria="Acta firmada en cinco días",
+        )]),
+        Phase(name="EJECUCION", description="Ejecución", actions=[make_action(
+            "M2-C1", "Implementar el plan de seguridad industrial", citation=REVISED[3],
+        )]),
+    ])]
+
+def test_clause_diff_keeps_unchanged_clauses_and_reports_the_rest():
+    diff = ClauseDiff(["a", "b", "c", "d"], ["a", "c", "x", "d"])
+    assert diff.moved == {0: 0, 2: 1, 3: 3}
+    assert diff.removed == {1} and diff.added == [2]
+    assert diff.changed
+    assert not ClauseDiff(["a", "b"], ["a", "b"]).changed
+
+def test_clause_fingerprints_ignore_case_accents_and_spacing():
+    assert fingerprint("CLÁUSULA  Primera.\nObjeto") == fingerprint("clausula primera. objeto")
+    assert fingerprint("dentro de diez días") != fingerprint("dentro de cinco días")
+
+def test_apply_revision_touches_only_actions_of_changed_clauses():
+    contract = make_amendable_contract()
+    baseline = clause_baseline(contract_text(CLAUSES), contract)
+    clauses = split_clauses(contract_text(REVISED))
+    diff = ClauseDiff(baseline["clauses"], [fingerprint(clause) for clause in clauses])
+    assert diff.added == [1, 3]
+
+    new_baseline, report = apply_revision(contract, baseline, diff, clauses, revised_extractions())
+
+    assert report["changed"] == [{"id": "M1-C1", "fields": ["criteria"]}]
+    assert report["reopened"] == ["M1-C1"]
+    assert report["removed"] == ["M2-C2"]
+    # Fresh ids continue after the highest used: M2-C2 is never handed to another action
+    assert report["added"] == ["M2-C3"]
+    assert report["reweighted"]
+
+    actions = {action.id: action for phase in contract.phases for action in phase.actions}
+    assert set(actions) == {"M1-C1", "M2-C1", "M2-C3", "M3-C1"}
+    assert actions["M2-C1"].status == "in-progress" and actions["M2-C1"].evidence == [EVIDENCE]
+    assert actions["M1-C1"].status == "in-progress" and actions["M1-C1"].criteria == "Acta firmada en cinco días"
+    assert actions["M2-C3"].status == "pending"
+    assert sum(int(action.milestone_value.rstrip("%")) for action in actions.values()) == 100
+    # The reopened action moves the contract back to its phase
+    assert contract.current_phase == "INICIO"
+    assert new_baseline["numbers"]["2"] == 3
+    assert new_baseline["actions"]["M2-C3"] == 3 and new_baseline["actions"]["M2-C1"] == 2
+
+def test_revise_document_runs_as_a_job_with_a_typed_report(tmp_path, monkeypatch):
+    store = ContractStore()
+    contract = make_amendable_contract()
+    store.add(contract, baseline=clause_baseline(contract_text(CLAUSES), contract))
+    monkeypatch.setattr(pipeline, "contract_store", store)
+    sent = []
+
+    def extract(text):
+        sent.append(text)
+        return revised_extractions()
+
+    monkeypatch.setattr(pipeline, "extract_revised_clauses", extract)
+    path = tmp_path / "otrosi.txt"
+    path.write_text(contract_text(REVISED), encoding="utf-8")
+
+    jobs = JobManager(max_workers=1, queue_depth=1, result_ttl=60)
+    try:
+        job = jobs.submit(pipeline.revise_document, "T-REV", "otrosi.txt", str(path), filename="otrosi.txt")
+        jobs.future(job.job_id).result(timeout=30)
+    finally:
+        jobs.shutdown()
+
+    # Only the changed clauses went to the model
+    assert sent == [REVISED[1] + "\n\n" + REVISED[3]]
+    assert job.status == "completed" and job.result is None
+    assert isinstance(job.revision, RevisionReport)
+    assert job.revision.version == 2 and job.revision.base_version == 1
+    assert job.revision.clauses.added == 2 and job.revision.milestones.added == ["M2-C3"]
+    # What GET /analyze-contract/jobs/{job_id} sends back
+    assert AnalysisJob.model_validate_json(job.model_dump_json()).revision == job.revision
@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app import main
+from app.services.tracing import TraceSink, request_context, server_request_id
+
+def make_sink(tmp_path) -> TraceSink:
+    return TraceSink(str(tmp_path), sample_rate=1.0, max_bytes=10 ** 6, backups=1, queue_size=100,
+                     max_field_chars=1000, recent_requests=1)
+
+def test_request_ids_are_generated_by_the_server():
+    first, second = server_request_id("checkout-42"), server_request_id("checkout-42")
+    assert first != second
+    assert first.startswith("checkout-42.") and second.startswith("checkout-42.")
+    for malformed in ("", "a" * 65, 'x", "kind', "../etc"):
+        request_id = server_request_id(malformed)
+        assert "." not in request_id and len(request_id) == 32
+
+def test_get_matches_the_exact_request_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.settings, "TRACE_ENABLED", True)
+    sink = make_sink(tmp_path)
+    for request_id in ("abc", "abc.1", "xabc"):
+        with request_context(request_id):
+            sink.record("extraction", prompt=f'"request_id": "abc" quoted by {request_id}')
+    sink.flush()
+    # The in-memory cache only holds the last request, so these are read back from the file
+    assert [entry["request_id"] for entry in sink.get("abc")] == ["abc"]
+    assert sink.get('abc" quoted by') == []
+
+def test_traces_endpoint_does_not_exist_without_an_admin_token(monkeypatch):
+    monkeypatch.setattr(main.settings, "ADMIN_TOKEN", "")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.get_traces("abc", None))
+    assert error.value.status_code == 404
+
+    monkeypatch.setattr(main.settings, "ADMIN_TOKEN", "s3cret")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.get_traces("abc", "wrong"))
+    assert error.value.status_code == 403
+
+def test_kb_sync_is_refused_without_an_admin_token(monkeypatch):
+    synced = []
+    monkeypatch.setattr(main, "sync_knowledge_base", lambda *args: synced.append(args))
+    monkeypatch.setattr(main.kb_snapshots, "sync", lambda *args: synced.append(args))
+    for configured, sent in (("", None), ("", ""), ("s3cret", None), ("s3cret", "wrong")):
+        monkeypatch.setattr(main.settings, "ADMIN_TOKEN", configured)
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(main.admin_kb_sync(False, sent))
+        assert error.value.status_code == 403
+    assert synced == []
+
+    monkeypatch.setattr(main.settings, "ADMIN_TOKEN", "s3cret")
+    asyncio.run(main.admin_kb_sync(True, "s3cret"))
+    assert len(synced) == 1
@@ -14,6 +14,7 @@ CREATE TABLE users (
 CREATE TABLE contracts (
     id TEXT PRIMARY KEY,
     title TEXT NOT NULL,
+    summary TEXT, -- audit summary + insights
     client TEXT NOT NULL,
     type TEXT NOT NULL, -- perforacion, construccion, etc.
     status TEXT NOT NULL, -- active, completed, at-risk
@@ -26,6 +27,7 @@ CREATE TABLE contracts (
     health INTEGER DEFAULT 100,
     risk_level TEXT NOT NULL, -- bajo, medio, alto
     project_manager_id TEXT REFERENCES users(id) ON DELETE SET NULL,
+    pdf_url TEXT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -61,6 +63,15 @@ CREATE TABLE documents (
     status TEXT NOT NULL -- approved, pending, review
 );
 
+-- Indexes (IF NOT EXISTS: safe to run again on an existing database)
+-- Foreign keys are not indexed automatically in PostgreSQL; every contract detail view and
+-- ON DELETE CASCADE filters milestones/documents by contract_id.
+CREATE INDEX IF NOT EXISTS idx_milestones_contract_id ON milestones (contract_id);
+CREATE INDEX IF NOT EXISTS idx_documents_contract_id ON documents (contract_id);
+CREATE INDEX IF NOT EXISTS idx_contract_team_members_user_id ON contract_team_members (user_id);
+-- Dashboard filters (status, then risk level)
+CREATE INDEX IF NOT EXISTS idx_contracts_status_risk_level ON contracts (status, risk_level);
+
 -- SEED DATA -----------------------------------------------
 
 -- Users